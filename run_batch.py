@@ -0,0 +1,120 @@
+# run_batch.py — traitement par lot (dossier ou manifeste JSONL) avec un pool de workers « chauds »
+import os, re, sys, json, time, argparse, multiprocessing as mp
+from functools import partial
+
+from run_all import add_pipeline_args, build_engine, engine_config
+from archive import Archive, ARCHIVE_PATH
+
+VIDEO_EXTS = (".mp4", ".mov", ".mkv", ".webm", ".avi", ".m4v")
+JOB_ID = re.compile(r"^[A-Za-z0-9._-]+$")  # id = nom du sous-dossier de sortie
+
+def _valid_id(job_id):
+    return bool(JOB_ID.match(job_id)) and set(job_id) != {"."}  # ni "." ni ".." : sortie hors du dossier du lot
+
+def load_jobs(source):
+    """
+    Dossier → une tâche par vidéo ; fichier .jsonl → une tâche par ligne
+    ({"video": "...", "id": "..." (optionnel), "options": {...} (optionnel)}).
+    """
+    if os.path.isdir(source):
+        raw = [{"video": os.path.join(source, f)} for f in sorted(os.listdir(source))
+               if f.lower().endswith(VIDEO_EXTS)]
+    else:
+        with open(source, encoding="utf-8") as f:
+            raw = [json.loads(line) for line in f if line.strip()]
+
+    jobs, seen = [], set()
+    for i, job in enumerate(raw):
+        if "video" not in job:
+            raise ValueError(f"{source}: ligne {i + 1} sans champ 'video'")
+        if job.get("id"):
+            job_id = str(job["id"])
+            if not _valid_id(job_id):
+                raise ValueError(f"{source}: ligne {i + 1} : id invalide {job_id!r} (lettres, chiffres, . _ -)")
+        else:  # id dérivé du nom de fichier : caractères hors liste remplacés
+            job_id = re.sub(r"[^A-Za-z0-9._-]", "_", os.path.splitext(os.path.basename(job["video"]))[0])
+            if not _valid_id(job_id):
+                job_id = f"video-{i}"
+        base, n = job_id, 1
+        while job_id in seen:
+            n += 1
+            job_id = f"{base}-{n}"
+        seen.add(job_id)
+        jobs.append({"id": job_id, "video": job["video"], "options": job.get("options") or {}})
+    return jobs
+
+# --- worker : un moteur par process, modèles chargés une fois ---
+_ENGINE = None
+
+def _init_worker(config, threads):
+    global _ENGINE
+    _ENGINE = build_engine(config, threads=threads).warmup()
+
+def _run_job(job, outroot):
+    outdir = os.path.join(outroot, job["id"])
+    t0, c0 = time.perf_counter(), time.process_time()
+    try:
+        report = _ENGINE.run(job["video"], outdir=outdir, **job["options"])
+        status, error = "done", None
+        audio_sec = float((report.get("speech") or {}).get("duration_sec") or 0.0)
+    except Exception as e:
+        status, error, audio_sec = "failed", f"{type(e).__name__}: {e}", 0.0
+        os.makedirs(outdir, exist_ok=True)
+        with open(os.path.join(outdir, "error.txt"), "w", encoding="utf-8") as f:
+            f.write(error)
+    return {"id": job["id"], "status": status, "error": error, "audio_sec": audio_sec,
+            "wall_sec": round(time.perf_counter() - t0, 3), "cpu_sec": round(time.process_time() - c0, 3)}
+
+def is_done(outroot, job):
+    return os.path.exists(os.path.join(outroot, job["id"], "report.json"))
+
+def run_batch(jobs, outroot, config, workers=1, resume=True):
+    os.makedirs(outroot, exist_ok=True)
+    todo = [j for j in jobs if not (resume and is_done(outroot, j))]
+    skipped = len(jobs) - len(todo)
+    # threads par worker : --threads si fourni, sinon cœurs / workers (pas de sursouscription)
+    threads = config.get("threads") or max(1, (os.cpu_count() or 1) // max(1, workers))
+
+    t0, results = time.perf_counter(), []
+    if todo:
+        ctx = mp.get_context("spawn")  # même comportement Windows/Linux, pas de fork de threads natifs
+        with ctx.Pool(min(workers, len(todo)), initializer=_init_worker, initargs=(config, threads)) as pool:
+            for res in pool.imap_unordered(partial(_run_job, outroot=outroot), todo):
+                results.append(res)
+                print(f"[{len(results)}/{len(todo)}] {res['id']}: {res['status']} ({res['wall_sec']:.1f}s)",
+                      file=sys.stderr)
+    wall = time.perf_counter() - t0
+
+    done = [r for r in results if r["status"] == "done"]
+    audio_min = sum(r["audio_sec"] for r in done) / 60.0
+    cpu_min = sum(r["cpu_sec"] for r in results) / 60.0
+    summary = {
+        "jobs": len(jobs), "done": len(done), "failed": len(results) - len(done), "skipped": skipped,
+        "workers": workers, "threads_per_worker": threads,
+        "wall_sec": round(wall, 2),
+        "videos_per_hour": round(len(done) / wall * 3600.0, 1) if wall > 0 else 0.0,
+        "audio_minutes": round(audio_min, 2),
+        "cpu_minutes": round(cpu_min, 2),
+        "audio_min_per_cpu_min": round(audio_min / cpu_min, 3) if cpu_min > 0 else 0.0,
+        "failures": {r["id"]: r["error"] for r in results if r["status"] != "done"},
+    }
+    with open(os.path.join(outroot, "batch_summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    return summary
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--input", required=True, help="Dossier de vidéos ou manifeste .jsonl")
+    ap.add_argument("--outdir", default="outputs/batch", help="Un sous-dossier par entretien")
+    ap.add_argument("--workers", type=int, default=int(os.getenv("BATCH_WORKERS", "2")))
+    ap.add_argument("--no-resume", action="store_true", help="retraite aussi les entretiens déjà faits")
+    ap.add_argument("--archive", nargs="?", const=ARCHIVE_PATH, default=None, metavar="DB",
+                    help="indexe ensuite les reports dans l'archive SQLite (incrémental, cf. scripts/archive.py)")
+    args = add_pipeline_args(ap).parse_args()
+
+    summary = run_batch(load_jobs(args.input), args.outdir, engine_config(args),
+                        workers=args.workers, resume=not args.no_resume)
+    if args.archive:
+        with Archive(args.archive) as archive:
+            summary["archive"] = {"db": args.archive, **archive.ingest(args.outdir)}
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
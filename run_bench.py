@@ -0,0 +1,198 @@
+# run_bench.py — benchmarks reproductibles sur fixtures synthétiques (hors ligne, CPU uniquement)
+import os, sys, json, time, argparse, itertools, platform, subprocess
+import multiprocessing as mp
+
+# hors ligne et CPU : modèles pris dans les caches locaux, aucun GPU visible
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+from run_all import build_engine, compute_scores
+
+BENCH_DIR = "bench"
+FIXTURE_MINUTES = (1, 5, 10, 30)
+STAGES = ("extract_audio", "transcribe", "speech_metrics", "face_emotions_onnx", "gaze_nods", "compute_scores",
+          "run_all")
+
+BASE = {"sample_fps": 2, "max_width": 960, "beam": 1, "compute": "int8"}
+# grille "quick" : la base puis un paramètre modifié à la fois ; "full" : produit cartésien
+VARIANTS = {"sample_fps": [1, 2], "max_width": [640, 960], "beam": [1, 5], "compute": ["int8", "float32"]}
+
+# --- fixtures ---
+def draw_face(path, size=(720, 960)):
+    """Visage schématique (ovale, yeux, iris, nez, bouche) sur fond uni : de quoi occuper détecteur et FaceMesh."""
+    import cv2
+    import numpy as np
+    h, w = size
+    img = np.full((h, w, 3), (200, 190, 180), np.uint8)
+    cx, cy = w // 2, h // 2
+    cv2.ellipse(img, (cx, cy), (150, 200), 0, 0, 360, (140, 170, 215), -1)
+    for dx in (-60, 60):
+        cv2.ellipse(img, (cx + dx, cy - 50), (32, 16), 0, 0, 360, (255, 255, 255), -1)
+        cv2.circle(img, (cx + dx, cy - 50), 11, (60, 40, 30), -1)
+        cv2.line(img, (cx + dx - 35, cy - 85), (cx + dx + 35, cy - 88), (40, 40, 60), 6)
+    cv2.line(img, (cx, cy - 30), (cx - 12, cy + 40), (110, 130, 180), 4)
+    cv2.ellipse(img, (cx, cy + 100), (55, 20), 0, 0, 180, (70, 70, 170), 6)
+    cv2.imwrite(path, img)
+    return path
+
+def make_fixture(minutes, root=BENCH_DIR):
+    """
+    bench/fixtures/synthetic_<N>min.mp4 (réutilisée si présente) : le visage dérive lentement (recadrage),
+    l'audio alterne 3 s de « voix » (sinusoïde modulée + bruit) et 1 s de silence.
+    """
+    fx = os.path.join(root, "fixtures")
+    os.makedirs(fx, exist_ok=True)
+    out = os.path.join(fx, f"synthetic_{minutes}min.mp4")
+    if os.path.exists(out):
+        return out
+    face = draw_face(os.path.join(fx, "face.png"))
+    sec = int(minutes * 60)
+    voice = ("sine=frequency=160:sample_rate=16000,"
+             "vibrato=f=4:d=0.3,volume='0.5*lt(mod(t,4),3)':eval=frame")
+    noise = "anoisesrc=color=pink:amplitude=0.02:sample_rate=16000"
+    cmd = ["ffmpeg", "-y", "-nostdin", "-loglevel", "error",
+           "-loop", "1", "-framerate", "25", "-i", face,
+           "-f", "lavfi", "-i", voice, "-f", "lavfi", "-i", noise,
+           "-filter_complex",
+           "[0:v]crop=w=880:h=660:x='40+40*sin(t/3)':y='30+30*sin(t/5)',scale=640:480,format=yuv420p[v];"
+           "[1:a][2:a]amix=inputs=2:normalize=0[a]",
+           "-map", "[v]", "-map", "[a]", "-t", str(sec),
+           "-c:v", "libx264", "-preset", "ultrafast", "-c:a", "aac", "-ac", "1", out]
+    subprocess.run(cmd, check=True)
+    return out
+
+# --- grille de réglages ---
+def settings_grid(mode="quick"):
+    if mode == "base":
+        return [dict(BASE)]
+    if mode == "full":
+        keys = list(VARIANTS)
+        return [dict(zip(keys, vals)) for vals in itertools.product(*(VARIANTS[k] for k in keys))]
+    grid = [dict(BASE)]
+    for k, vals in VARIANTS.items():
+        grid += [{**BASE, k: v} for v in vals if v != BASE[k]]
+    return grid
+
+def setting_name(s):
+    return f"fps{s['sample_fps']}-w{s['max_width']}-b{s['beam']}-{s['compute']}"
+
+# --- un cas = (fixture, réglage), exécuté dans un process neuf (modèles et pic RSS non partagés) ---
+def _bench_case(video, setting, stages, threads):
+    from perf import Profiler  # scripts/ déjà dans sys.path (import de run_all)
+    import extract_audio, transcribe, speech_metrics, face_emotions_onnx, gaze_nods
+
+    prof = Profiler()
+    out = {}
+    def timed(name, fn):
+        if name not in stages:
+            return None
+        with prof.span(name):
+            return fn()
+
+    audio = timed("extract_audio", lambda: extract_audio.decode_audio(video))
+    if audio is None:
+        audio = extract_audio.decode_audio(video)
+    media_sec = len(audio) / extract_audio.SR
+    asr = None
+    if "transcribe" in stages or "speech_metrics" in stages:
+        with prof.span("load:whisper", "model_load"):
+            model = transcribe.load_model(compute=setting["compute"], cpu_threads=threads or 0)
+        asr = timed("transcribe", lambda: transcribe.transcribe_audio(model, audio, beam=setting["beam"]))
+    speech = timed("speech_metrics", lambda: speech_metrics.compute_metrics(
+        audio, extract_audio.SR, (asr or {}).get("text", ""), asr))
+    if "face_emotions_onnx" in stages:
+        with prof.span("load:ferplus", "model_load"):
+            sess, det = face_emotions_onnx.load_session(threads=threads), face_emotions_onnx.make_detector()
+        emotions = timed("face_emotions_onnx", lambda: face_emotions_onnx.analyze_emotions(
+            video, setting["sample_fps"], max_width=setting["max_width"], sess=sess, detector=det))
+    else:
+        emotions = None
+    gaze = timed("gaze_nods", lambda: gaze_nods.gaze_nods(video, sample_fps=None, max_width=setting["max_width"]))
+    report = {"transcript": (asr or {}).get("text", ""), "speech": speech or {},
+              "nonverbal": {**(gaze or {}), "emotions": emotions or {}}}
+    timed("compute_scores", lambda: compute_scores(report))
+
+    if "run_all" in stages:
+        cfg = {"stt_compute": setting["compute"], "stt_beam": setting["beam"], "sample_fps": setting["sample_fps"],
+               "emo_max_width": setting["max_width"],
+               "cache": {"enabled": False}}
+        outdir = os.path.join(BENCH_DIR, "runs", os.path.splitext(os.path.basename(video))[0], setting_name(setting))
+        with prof.span("run_all"):
+            with build_engine(cfg, threads=threads) as engine:
+                rep = engine.run(video, outdir=outdir)
+        out["run_all_perf"] = {k: rep["perf"][k] for k in ("wall_sec", "peak_rss_mb", "realtime_factor")}
+
+    summary = prof.summary()
+    prof.close()
+    for name, st in summary["stages"].items():
+        st["x_realtime"] = round(media_sec / st["wall_sec"], 2) if st["wall_sec"] > 0 else None
+    out.update({"media_sec": round(media_sec, 2), "stages": summary["stages"], "models": summary["models"],
+                "peak_rss_mb": summary["peak_rss_mb"]})
+    return out
+
+def run_suite(minutes=FIXTURE_MINUTES, grid="quick", stages=STAGES, threads=None):
+    ctx = mp.get_context("spawn")
+    results = {}
+    for m in minutes:
+        video = make_fixture(m)
+        for setting in settings_grid(grid):
+            case = f"{m}min/{setting_name(setting)}"
+            print(f"[bench] {case}", flush=True)
+            with ctx.Pool(1) as pool:
+                results[case] = {"setting": setting,
+                                 **pool.apply(_bench_case, (video, setting, tuple(stages), threads))}
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                    "cpus": os.cpu_count(), "threads": threads},
+        "cases": results,
+    }
+
+def compare(current, baseline, threshold=0.15, metrics=("wall_sec", "peak_rss_mb")):
+    """Régressions : métrique d'étape > baseline × (1 + threshold), cas et étapes communs uniquement."""
+    regressions = []
+    for case, cur in current["cases"].items():
+        base = baseline.get("cases", {}).get(case)
+        if not base:
+            continue
+        for stage, st in cur["stages"].items():
+            ref = base["stages"].get(stage)
+            if not ref:
+                continue
+            for k in metrics:
+                if st.get(k) and ref.get(k) and st[k] > ref[k] * (1 + threshold):
+                    regressions.append({"case": case, "stage": stage, "metric": k, "baseline": ref[k],
+                                        "current": st[k], "ratio": round(st[k] / ref[k], 3)})
+    return regressions
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmarks sur vidéos synthétiques (hors ligne, CPU)")
+    ap.add_argument("--minutes", type=int, nargs="+", default=list(FIXTURE_MINUTES), help="durées des fixtures")
+    ap.add_argument("--grid", choices=["base", "quick", "full"], default="quick",
+                    help="base = réglage par défaut ; quick = un paramètre varié à la fois ; full = produit cartésien")
+    ap.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    ap.add_argument("--threads", type=int, default=None)
+    ap.add_argument("--out", default=None, help="résultats JSON (défaut : bench/results/<date>.json)")
+    ap.add_argument("--save-baseline", action="store_true", help="écrit aussi les résultats dans --baseline")
+    ap.add_argument("--baseline", default=os.path.join(BENCH_DIR, "baseline.json"))
+    ap.add_argument("--threshold", type=float, default=0.15, help="régression si > baseline × (1 + seuil)")
+    args = ap.parse_args()
+
+    res = run_suite(args.minutes, args.grid, args.stages, args.threads)
+    out = args.out or os.path.join(BENCH_DIR, "results", time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(res, f, indent=2)
+    print(out)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(res, f, indent=2)
+        print(f"baseline → {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(res, json.load(f), args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {r['case']} {r['stage']} {r['metric']}: {r['baseline']} → {r['current']} (×{r['ratio']})")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,364 @@
+# run_server.py — serveur d'analyse local : API HTTP, file de jobs SQLite, workers « chauds », backpressure
+import os, re, sys, json, time, uuid, math, argparse, threading, multiprocessing as mp
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing.connection import wait
+from urllib.parse import urlparse, parse_qs
+
+from run_all import add_pipeline_args, build_engine, engine_config
+from engine import DEFAULT_OPTIONS
+from job_store import FINAL, JobStore
+
+JOB_ID = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,63}$")  # commence par un alphanumérique : ni "." ni ".."
+
+class Busy(Exception):
+    """File pleine : le client doit réessayer plus tard (HTTP 503 + Retry-After)."""
+
+    def __init__(self, retry_after):
+        super().__init__("busy")
+        self.retry_after = retry_after
+
+# --- worker : un process, un moteur chaud, un job à la fois ; messages par pipe (un par worker) ---
+def _worker_main(conn, config, threads):
+    engine = build_engine(config, threads=threads).warmup()
+    lock = threading.Lock()  # progression envoyée depuis les threads des étapes
+
+    def send(*msg):
+        with lock:
+            conn.send(msg)
+    send("ready", None, None)
+    while True:
+        job = conn.recv()
+        if job is None:
+            break
+        t0 = time.perf_counter()
+        try:
+            report = engine.run(job["video"], outdir=job["outdir"],
+                                progress=lambda ev, i=job["id"]: send("progress", i, ev), **job["options"])
+            send("done", job["id"], {"wall_sec": round(time.perf_counter() - t0, 2), "scores": report.get("scores")})
+        except Exception as e:
+            send("failed", job["id"], f"{type(e).__name__}: {e}")
+    engine.close()
+
+class Slot:
+    def __init__(self, wid):
+        self.wid, self.proc, self.conn = wid, None, None
+        self.ready, self.job = False, None
+        self.failures, self.retry_at = 0, None  # morts avant "ready" d'affilée → redémarrage différé
+
+class AnalysisServer:
+    """
+    `workers` process chauds (modèles chargés une fois) servent la file SQLite par priorité puis ancienneté.
+    Au-delà de `max_queue` jobs en attente, submit() lève Busy (le serveur répond 503 au lieu de surcharger la machine).
+    Annuler un job en cours tue son worker, remplacé aussitôt par un worker neuf (rechargement des modèles).
+    """
+
+    def __init__(self, store, config, workers=1, max_queue=16, outroot="outputs/jobs", threads=None):
+        self.store, self.config = store, config
+        self.max_queue, self.outroot = max_queue, outroot
+        # threads par worker : --threads si fourni, sinon cœurs / workers (comme run_batch)
+        self.threads = config.get("threads") or max(1, (os.cpu_count() or 1) // max(1, workers))
+        self.slots = [Slot(i) for i in range(workers)]
+        self.ctx = mp.get_context("spawn")
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self.job_sec = None  # durée moyenne (EMA) d'un job, pour Retry-After
+
+    # --- workers ---
+    def _spawn(self, slot):
+        parent, child = self.ctx.Pipe()
+        slot.proc = self.ctx.Process(target=_worker_main, args=(child, self.config, self.threads), daemon=True)
+        slot.proc.start()
+        child.close()
+        slot.conn, slot.ready, slot.job, slot.retry_at = parent, False, None, None
+
+    def _kill(self, slot):
+        slot.proc.terminate()
+        slot.proc.join(5)
+        slot.conn.close()
+
+    def start(self):
+        os.makedirs(self.outroot, exist_ok=True)
+        for job_id in self.store.requeue_running():
+            print(f"[server] remis en file : {job_id}", file=sys.stderr)
+        for slot in self.slots:
+            self._spawn(slot)
+        threading.Thread(target=self._loop, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            for slot in self.slots:
+                try:
+                    slot.conn.send(None)
+                except (AttributeError, OSError):
+                    pass
+            for slot in self.slots:
+                if slot.conn is None:
+                    continue
+                slot.proc.join(2 if slot.job is None else 0)
+                if slot.proc.is_alive():
+                    self._kill(slot)
+        self.store.requeue_running()  # jobs interrompus : repris au prochain démarrage
+
+    def _dispatch(self):
+        with self._lock:
+            for slot in self.slots:
+                if slot.ready and slot.job is None:
+                    job = self.store.claim(slot.wid)
+                    if job is None:
+                        return
+                    slot.job = job["id"]
+                    slot.conn.send({k: job[k] for k in ("id", "video", "outdir", "options")})
+
+    def _loop(self):
+        """Messages des workers (progression, fin de job) et morts de process ; un seul thread."""
+        while not self._stop.is_set():
+            with self._lock:
+                for s in self.slots:
+                    if s.conn is None and time.time() >= s.retry_at:
+                        self._spawn(s)
+                live = [s for s in self.slots if s.conn is not None]
+                waitables = {s.conn: s for s in live}
+                waitables.update({s.proc.sentinel: s for s in live})
+            try:
+                ready = wait(list(waitables), timeout=1.0)
+            except (OSError, ValueError):  # pipe fermé entre-temps (annulation) : on recommence
+                continue
+            for obj in ready:
+                slot = waitables[obj]
+                with self._lock:
+                    if slot.conn is None or obj is not slot.conn:  # sentinel, ou worker déjà remplacé / mort
+                        if slot.conn is not None and obj is slot.proc.sentinel and not slot.proc.is_alive():
+                            self._on_death(slot)
+                        continue
+                    try:
+                        kind, job_id, data = slot.conn.recv()
+                    except (EOFError, OSError):
+                        self._on_death(slot)
+                        continue
+                    self._on_message(slot, kind, job_id, data)
+            self._dispatch()
+
+    def _on_message(self, slot, kind, job_id, data):
+        if kind == "ready":
+            slot.ready = True
+        elif kind == "progress":
+            self.store.event(job_id, data)
+            if data["event"] == "start" and data["cat"] in ("stage", "cached"):
+                self.store.set_stage(job_id, data["name"])
+        elif kind in ("done", "failed") and job_id == slot.job:
+            slot.job = None
+            if kind == "done":
+                self.store.finish(job_id, "done", only_if=("running",))
+                self.store.event(job_id, {"event": "result", **data})
+                self.job_sec = data["wall_sec"] if self.job_sec is None else 0.8 * self.job_sec + 0.2 * data["wall_sec"]
+            else:
+                self.store.finish(job_id, "failed", error=data, only_if=("running",))
+        self._changed.notify_all()
+
+    def _on_death(self, slot):
+        if self._stop.is_set():
+            return
+        slot.proc.join(1)
+        code = slot.proc.exitcode
+        if slot.job is not None:
+            self.store.finish(slot.job, "failed", error=f"worker arrêté (code {code})", only_if=("running",))
+        slot.failures = 0 if slot.ready else slot.failures + 1
+        delay = min(60, 2 ** slot.failures) if slot.failures else 0
+        print(f"[server] worker {slot.wid} arrêté (code {code}) : redémarrage dans {delay} s", file=sys.stderr)
+        slot.conn.close()
+        slot.conn, slot.ready, slot.job, slot.retry_at = None, False, None, time.time() + delay
+        self._changed.notify_all()
+
+    # --- API ---
+    def submit(self, video, job_id=None, priority=0, options=None):
+        options = options or {}
+        unknown = set(options) - set(DEFAULT_OPTIONS)
+        if unknown:
+            raise ValueError(f"Options inconnues: {sorted(unknown)}")
+        if not os.path.isfile(video):
+            raise ValueError(f"Vidéo introuvable: {video}")
+        job_id = str(job_id) if job_id else uuid.uuid4().hex[:12]
+        if not JOB_ID.match(job_id):
+            raise ValueError(f"id invalide: {job_id}")
+        with self._lock:
+            queued = self.store.count("queued")
+            if queued >= self.max_queue:
+                raise Busy(self.retry_after(queued))
+            job = self.store.add(job_id, os.path.abspath(video), os.path.join(self.outroot, job_id),
+                                 options, priority)
+        self._dispatch()
+        return job
+
+    def retry_after(self, queued):
+        # temps estimé pour écouler la file actuelle (au moins 5 s)
+        per_job = self.job_sec or 60.0
+        return max(5, math.ceil(per_job * (queued + 1) / len(self.slots)))
+
+    def cancel(self, job_id):
+        """Annule un job en attente ou en cours ; False s'il est déjà terminé (ou inconnu)."""
+        with self._lock:
+            if self.store.finish(job_id, "cancelled", only_if=("queued",)):
+                return True
+            slot = next((s for s in self.slots if s.job == job_id), None)
+            if slot is None or not self.store.finish(job_id, "cancelled", only_if=("running",)):
+                return False
+            self._kill(slot)
+            self._spawn(slot)
+            self._changed.notify_all()
+        return True
+
+    def wait_events(self, job_id, since=0, timeout=0.0):
+        """Événements après `since` ; attente (long polling) jusqu'à `timeout` s s'il n'y en a pas encore."""
+        deadline = time.time() + timeout
+        while True:
+            events = self.store.events(job_id, since)
+            job = self.store.get(job_id)
+            remaining = deadline - time.time()
+            if events or job is None or job["status"] in FINAL or remaining <= 0:
+                return events
+            with self._changed:
+                self._changed.wait(min(remaining, 1.0))
+
+    def health(self):
+        with self._lock:
+            workers = [{"id": s.wid, "pid": s.proc.pid if s.conn is not None else None, "ready": s.ready, "job": s.job}
+                       for s in self.slots]
+        return {"workers": workers, "queued": self.store.count("queued"), "running": self.store.count("running"),
+                "max_queue": self.max_queue, "threads_per_worker": self.threads, "avg_job_sec": self.job_sec}
+
+# --- HTTP ---
+def make_handler(server):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code, obj, headers=None):
+            body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, str(v))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _route(self):
+            url = urlparse(self.path)
+            return [p for p in url.path.split("/") if p], {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        @staticmethod
+        def _num(q, name, default, cast=int, lo=0):
+            """Paramètre numérique de la query string, borné ; ValueError (→ 400) s'il est invalide."""
+            try:
+                v = cast(q.get(name, default))
+            except ValueError:
+                raise ValueError(f"{name} invalide: {q[name]!r}") from None
+            if not lo <= v:  # NaN compris
+                raise ValueError(f"{name} hors bornes: {q[name]!r}")
+            return v
+
+        def _job(self, job_id):
+            job = server.store.get(job_id)
+            if job is None:
+                self._send(404, {"error": "job inconnu"})
+            return job
+
+        def do_GET(self):
+            parts, q = self._route()
+            if parts == ["health"]:
+                return self._send(200, server.health())
+            if parts == ["jobs"]:
+                try:
+                    limit = self._num(q, "limit", 100, lo=1)
+                except ValueError as e:
+                    return self._send(400, {"error": str(e)})
+                return self._send(200, server.store.list(q.get("status"), limit))
+            if len(parts) >= 2 and parts[0] == "jobs":
+                job = self._job(parts[1])
+                if job is None:
+                    return
+                if len(parts) == 2:
+                    return self._send(200, {**job, "position": server.store.position(job["id"])})
+                if parts[2:] == ["events"]:
+                    try:
+                        since, timeout = self._num(q, "since", 0), min(self._num(q, "wait", 0, float), 60.0)
+                    except ValueError as e:
+                        return self._send(400, {"error": str(e)})
+                    return self._send(200, server.wait_events(job["id"], since, timeout))
+                if parts[2:] == ["report"]:
+                    path = os.path.join(job["outdir"], "report.json")
+                    if job["status"] != "done" or not os.path.exists(path):
+                        return self._send(409, {"error": f"job {job['status']}"})
+                    with open(path, encoding="utf-8") as f:
+                        return self._send(200, json.load(f))
+            self._send(404, {"error": "route inconnue"})
+
+        def do_POST(self):
+            parts, _ = self._route()
+            if parts == ["jobs"]:
+                try:
+                    n = int(self.headers.get("Content-Length") or 0)
+                    body = json.loads(self.rfile.read(n) or b"{}")
+                    if "video" not in body:
+                        raise ValueError("champ 'video' manquant")
+                    job = server.submit(body["video"], body.get("id"), int(body.get("priority", 0)),
+                                        body.get("options"))
+                except Busy as e:
+                    return self._send(503, {"error": "busy", "retry_after": e.retry_after},
+                                      {"Retry-After": e.retry_after})
+                except (ValueError, TypeError) as e:
+                    return self._send(400, {"error": str(e)})
+                except Exception as e:  # ex. id déjà utilisé (sqlite3.IntegrityError)
+                    return self._send(409, {"error": f"{type(e).__name__}: {e}"})
+                return self._send(202, {**job, "position": server.store.position(job["id"])})
+            if len(parts) == 3 and parts[0] == "jobs" and parts[2] == "cancel":
+                return self._cancel(parts[1])
+            self._send(404, {"error": "route inconnue"})
+
+        def do_DELETE(self):
+            parts, _ = self._route()
+            if len(parts) == 2 and parts[0] == "jobs":
+                return self._cancel(parts[1])
+            self._send(404, {"error": "route inconnue"})
+
+        def _cancel(self, job_id):
+            job = self._job(job_id)
+            if job is None:
+                return
+            if not server.cancel(job_id):
+                return self._send(409, {"error": f"job {server.store.get(job_id)['status']}"})
+            self._send(200, server.store.get(job_id))
+
+        def log_message(self, fmt, *args):
+            if os.getenv("SERVER_ACCESS_LOG"):
+                super().log_message(fmt, *args)
+
+    return Handler
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Serveur d'analyse local (HTTP + file SQLite + workers chauds)")
+    ap.add_argument("--host", default=os.getenv("SERVER_HOST", "127.0.0.1"))
+    ap.add_argument("--port", type=int, default=int(os.getenv("SERVER_PORT", "8765")))
+    ap.add_argument("--workers", type=int, default=int(os.getenv("SERVER_WORKERS", "1")),
+                    help="process d'analyse chauds (modèles chargés une fois chacun)")
+    ap.add_argument("--max-queue", type=int, default=int(os.getenv("SERVER_MAX_QUEUE", "16")),
+                    help="jobs en attente au-delà desquels POST /jobs répond 503 busy")
+    ap.add_argument("--db", default=os.getenv("SERVER_DB", "outputs/jobs.sqlite"))
+    ap.add_argument("--outroot", default="outputs/jobs", help="un dossier <id>/ par job")
+    add_pipeline_args(ap)
+    args = ap.parse_args()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.db)), exist_ok=True)
+    store = JobStore(args.db)
+    server = AnalysisServer(store, engine_config(args), args.workers, args.max_queue, args.outroot).start()
+    httpd = ThreadingHTTPServer((args.host, args.port), make_handler(server))
+    print(f"[server] http://{args.host}:{args.port} — {args.workers} worker(s), file max {args.max_queue}",
+          file=sys.stderr)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        server.stop()
+        store.close()
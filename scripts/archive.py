@@ -0,0 +1,339 @@
+# scripts/archive.py — archive indexée des report.json (SQLite) : métriques en colonnes, FTS5, timelines, requêtes de cohorte
+import os, re, sys, glob, json, time, sqlite3, argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from scoring import features, EMOTION_LABELS, CATEGORIES, _cohort
+
+ARCHIVE_PATH = os.getenv("ARCHIVE_PATH", os.path.join("outputs", "archive.sqlite"))
+
+# colonnes métriques (une ligne par entretien) ; features() de scoring + scores, émotions, run
+FEATURES = ["duration_sec", "wpm", "silence_sec", "silence_ratio", "fillers", "fillers_per_min", "eye_contact_ratio",
+            "nods", "nods_per_min", "word_count", "summary_len", "sentiment_label", "sentiment_score",
+            "emotion_entropy"]
+METRICS = {
+    **{c: "TEXT" if c == "sentiment_label" else "REAL" for c in FEATURES},
+    "dominant_emotion": "TEXT",
+    **{f"emo_{k}": "REAL" for k in EMOTION_LABELS},
+    **{f"score_{k}": "REAL" for k in (*CATEGORIES, "total")},
+    "score_profile": "TEXT",
+    "language": "TEXT",
+    "tier": "TEXT",
+    "wall_sec": "REAL",
+}
+INDEXED = ("cohort", "wpm", "eye_contact_ratio", "duration_sec", "sentiment_label", "dominant_emotion", "score_total")
+COLUMNS = ("id", "cohort", "path", *METRICS)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS interviews (
+    rid INTEGER PRIMARY KEY,
+    id TEXT NOT NULL,
+    cohort TEXT NOT NULL,
+    path TEXT NOT NULL UNIQUE,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    ingested REAL NOT NULL,
+    {", ".join(f"{c} {t}" for c, t in METRICS.items())}
+);
+{"".join(f"CREATE INDEX IF NOT EXISTS interviews_{c} ON interviews ({c});" for c in INDEXED)}
+CREATE VIRTUAL TABLE IF NOT EXISTS texts USING fts5(transcript, summary, tokenize='unicode61 remove_diacritics 2');
+CREATE TABLE IF NOT EXISTS timelines (
+    rid INTEGER NOT NULL,
+    grp TEXT NOT NULL,
+    col TEXT NOT NULL,
+    dtype TEXT NOT NULL,
+    shape TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (rid, grp, col)
+);
+"""
+
+COND_RE = re.compile(r"^\s*(\w+)\s*(<=|>=|!=|=|<|>|~)\s*(.+?)\s*$")
+OPS = {"~": "LIKE"}  # "~" : motif LIKE (ex. cohort~poste-x%)
+
+def parse_where(expr):
+    """"eye_contact_ratio < 0.4" → ("eye_contact_ratio", "<", 0.4) ; colonnes et opérateurs en liste blanche."""
+    m = COND_RE.match(expr)
+    if not m or m.group(1) not in COLUMNS:
+        raise ValueError(f"Condition invalide: {expr!r} (colonnes : {', '.join(COLUMNS)})")
+    col, op, value = m.groups()
+    try:
+        value = float(value)
+    except ValueError:
+        value = value.strip("'\"")
+    return col, OPS.get(op, op), value
+
+def _column(name):
+    if name not in COLUMNS:
+        raise ValueError(f"Colonne inconnue: {name} (colonnes : {', '.join(COLUMNS)})")
+    return name
+
+def _row(report):
+    """Valeurs hors features() : scores, émotions, langue, niveau et temps du run."""
+    nonv = report.get("nonverbal") or {}
+    emotions = nonv.get("emotions") or {}
+    dist = emotions.get("distribution") or {}
+    scores = report.get("scores") or {}
+    return {
+        "dominant_emotion": emotions.get("dominant_emotion"),
+        **{f"emo_{k}": dist.get(k) for k in EMOTION_LABELS},
+        **{f"score_{k}": scores.get(k) for k in (*CATEGORIES, "total")},
+        "score_profile": scores.get("profile"),
+        "language": (report.get("asr") or {}).get("language"),
+        "tier": (report.get("budget") or {}).get("tier"),
+        "wall_sec": (report.get("perf") or {}).get("wall_sec"),
+    }
+
+def _sql_value(v):
+    if v is None or (isinstance(v, float) and np.isnan(v)):
+        return None
+    return v.item() if isinstance(v, np.generic) else v
+
+class Archive:
+    """
+    Reports d'entretiens dans une base SQLite : une ligne de métriques par entretien (colonnes indexées),
+    transcript + résumé en FTS5, colonnes de timelines.npz en blobs typés. Ingestion incrémentale
+    (report.json nouveau ou modifié : mtime + taille) ; WAL : lisible pendant une ingestion (ex. Django).
+    """
+
+    def __init__(self, path=ARCHIVE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- ingestion ---
+    def ingest(self, root, workers=8, prune=False, timelines=True, batch=500):
+        """
+        Indexe les */report.json sous `root` (id = dossier relatif, cohorte = premier sous-dossier, cf. scoring) ;
+        seuls les nouveaux / modifiés sont relus. `prune` : retire ceux qui ont disparu. Retourne les compteurs.
+        """
+        paths = sorted(os.path.abspath(p) for p in glob.glob(os.path.join(root, "**", "report.json"), recursive=True))
+        known = {p: (m, s) for p, m, s in self._db.execute("SELECT path, mtime_ns, size FROM interviews")}
+        todo = []
+        for p in paths:
+            st = os.stat(p)
+            if known.get(p) != (st.st_mtime_ns, st.st_size):
+                todo.append((p, st))
+        counts = {"added": 0, "updated": 0, "unchanged": len(paths) - len(todo), "removed": 0}
+
+        def read(item):
+            p, st = item
+            try:
+                if timelines:
+                    from timeline_store import load_report
+                    report, series = load_report(p)
+                else:
+                    with open(p, encoding="utf-8") as f:
+                        report, series = json.load(f), None
+            except (OSError, ValueError):  # report en cours d'écriture ou sidecar absent : repris au prochain passage
+                return None
+            return p, st, report, series
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for i in range(0, len(todo), batch):
+                loaded = [x for x in pool.map(read, todo[i:i + batch]) if x is not None]
+                if loaded:
+                    for p, *_ in loaded:
+                        counts["updated" if p in known else "added"] += 1
+                    self._write(loaded, root)
+        if prune:
+            gone = set(known) - set(paths)
+            self._db.execute("BEGIN")
+            for p in gone:
+                self._delete(p)
+            self._db.execute("COMMIT")
+            counts["removed"] = len(gone)
+        return counts
+
+    def _delete(self, path):
+        row = self._db.execute("SELECT rid FROM interviews WHERE path = ?", (path,)).fetchone()
+        if row is not None:
+            for table, key in (("texts", "rowid"), ("timelines", "rid"), ("interviews", "rid")):
+                self._db.execute(f"DELETE FROM {table} WHERE {key} = ?", row)
+
+    def _write(self, loaded, root):
+        # métriques vectorisées sur tout le lot (mêmes features que le scoring)
+        df = features([r for _, _, r, _ in loaded])
+        cols = ["id", "cohort", "path", "mtime_ns", "size", "ingested", *METRICS]
+        sql = f"INSERT INTO interviews ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})"
+        now = time.time()
+        self._db.execute("BEGIN")
+        try:
+            for (p, st, report, series), (_, feat) in zip(loaded, df.iterrows()):
+                self._delete(p)
+                report_id = os.path.relpath(os.path.dirname(p), os.path.abspath(root)).replace("\\", "/")
+                values = {**{c: feat[c] for c in FEATURES}, **_row(report)}
+                rid = self._db.execute(sql, [report_id, _cohort(report_id, 1), p, st.st_mtime_ns, st.st_size, now,
+                                             *(_sql_value(values[c]) for c in METRICS)]).lastrowid
+                self._db.execute("INSERT INTO texts (rowid, transcript, summary) VALUES (?, ?, ?)",
+                                 (rid, report.get("transcript") or "", (report.get("text") or {}).get("summary") or ""))
+                for grp, arrays in (series or {}).items():
+                    self._db.executemany(
+                        "INSERT INTO timelines (rid, grp, col, dtype, shape, data) VALUES (?, ?, ?, ?, ?, ?)",
+                        [(rid, grp, col, a.dtype.str, json.dumps(a.shape), a.tobytes())
+                         for col, a in arrays.items() if a.dtype.kind != "O"])
+            self._db.execute("COMMIT")
+        except Exception:
+            self._db.execute("ROLLBACK")
+            raise
+
+    def watch(self, root, every=30.0, **kw):
+        """Ingestion continue : un passage incrémental toutes les `every` secondes (nouveaux reports d'un lot)."""
+        while True:
+            counts = self.ingest(root, **kw)
+            if counts["added"] or counts["updated"] or counts["removed"]:
+                yield counts
+            time.sleep(every)
+
+    # --- requêtes ---
+    def _filters(self, where):
+        sql, args = [], []
+        for cond in where or ():
+            col, op, value = parse_where(cond) if isinstance(cond, str) else cond
+            sql.append(f"i.{_column(col)} {op} ?")
+            args.append(value)
+        return sql, args
+
+    def query(self, where=(), match=None, order=None, limit=100, columns=None):
+        """
+        Entretiens filtrés (["wpm > 170", ("eye_contact_ratio", "<", 0.4)], ET logique), éventuellement restreints
+        à une recherche plein texte `match` (syntaxe FTS5) ; `order` : "-score_total" (décroissant) ou "rank"
+        (pertinence FTS5). DataFrame indexé par id.
+        """
+        cols = ["id", *(columns or ("cohort", *METRICS))]
+        select = [f"i.{_column(c)}" for c in cols]
+        conds, args = self._filters(where)
+        join = ""
+        if match:
+            join = "JOIN texts ON texts.rowid = i.rid"
+            conds.insert(0, "texts MATCH ?")
+            args.insert(0, match)
+            select.append("bm25(texts) AS rank")
+        sql = f"SELECT {', '.join(select)} FROM interviews i {join}"
+        if conds:
+            sql += " WHERE " + " AND ".join(conds)
+        if order:
+            name = order.lstrip("-")
+            sql += f" ORDER BY {'rank' if name == 'rank' else 'i.' + _column(name)} {'DESC' if order[0] == '-' else 'ASC'}"
+        elif match:
+            sql += " ORDER BY rank"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return pd.read_sql_query(sql, self._db, params=args, index_col="id")
+
+    def search(self, text, where=(), limit=20, tokens=12):
+        """Recherche plein texte (transcript + résumé) classée par bm25, avec extrait ([mot] trouvé)."""
+        conds, args = self._filters(where)
+        sql = ("SELECT i.id, i.cohort, bm25(texts) AS rank, snippet(texts, -1, '[', ']', '…', ?) AS snippet "
+               "FROM texts JOIN interviews i ON i.rid = texts.rowid WHERE texts MATCH ?")
+        for c in conds:
+            sql += f" AND {c}"
+        sql += f" ORDER BY rank LIMIT {int(limit)}"
+        return pd.read_sql_query(sql, self._db, params=[int(tokens), text, *args], index_col="id")
+
+    def aggregate(self, metrics, by=None, where=(), stats=("avg", "min", "max")):
+        """Agrégats SQL (nombre + avg/min/max par métrique) sur tout l'index ou par `by` (ex. "cohort")."""
+        conds, args = self._filters(where)
+        select = ["COUNT(*) AS n"] + [f"{s.upper()}(i.{_column(m)}) AS {m}_{s}" for m in metrics for s in stats]
+        if by:
+            select.insert(0, f"i.{_column(by)}")
+        sql = f"SELECT {', '.join(select)} FROM interviews i"
+        if conds:
+            sql += " WHERE " + " AND ".join(conds)
+        if by:
+            sql += f" GROUP BY i.{by} ORDER BY i.{by}"
+        df = pd.read_sql_query(sql, self._db, params=args)
+        return df.set_index(by) if by else df
+
+    def timeline(self, interview_id, group=None):
+        """Séries d'un entretien {groupe: {colonne: np.ndarray}} (format de timeline_store.load)."""
+        sql = ("SELECT grp, col, dtype, shape, data FROM timelines JOIN interviews i USING (rid) WHERE i.id = ?")
+        args = [interview_id]
+        if group:
+            sql += " AND grp = ?"
+            args.append(group)
+        out = {}
+        for grp, col, dtype, shape, data in self._db.execute(sql, args):
+            out.setdefault(grp, {})[col] = np.frombuffer(data, dtype=np.dtype(dtype)).reshape(json.loads(shape))
+        return out
+
+    def stats(self):
+        n, cohorts, last = self._db.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT cohort), MAX(ingested) FROM interviews").fetchone()
+        points = self._db.execute("SELECT COUNT(*) FROM timelines").fetchone()[0]
+        return {"path": self.path, "interviews": n, "cohorts": cohorts, "timeline_columns": points,
+                "last_ingest": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(last)) if last else None,
+                "size_mb": round(os.path.getsize(self.path) / 1e6, 2)}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Archive indexée des report.json (requêtes de cohorte, plein texte)")
+    ap.add_argument("--db", default=ARCHIVE_PATH)
+    sub = ap.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("ingest", help="indexe les nouveaux / modifiés sous ROOT")
+    p.add_argument("root", help="dossier contenant des */report.json (ex: outputs/batch)")
+    p.add_argument("--prune", action="store_true", help="retire les reports disparus")
+    p.add_argument("--no-timelines", action="store_true", help="n'indexe pas les séries de timelines.npz")
+    p.add_argument("--watch", type=float, default=None, metavar="SEC", help="repasse toutes les SEC secondes")
+    p = sub.add_parser("query", help="filtre / classe les entretiens")
+    p.add_argument("--where", action="append", default=[], metavar="EXPR", help='ex. "wpm > 170" (répétable, ET)')
+    p.add_argument("--match", default=None, help="restreint à une recherche plein texte (syntaxe FTS5)")
+    p.add_argument("--order", default=None, help='colonne (--order=-colonne : décroissant) ou "rank" avec --match')
+    p.add_argument("--limit", type=int, default=100)
+    p.add_argument("--columns", nargs="+", default=None)
+    p = sub.add_parser("search", help="plein texte sur transcripts et résumés")
+    p.add_argument("text")
+    p.add_argument("--where", action="append", default=[], metavar="EXPR")
+    p.add_argument("--limit", type=int, default=20)
+    p = sub.add_parser("agg", help="agrégats par cohorte / colonne")
+    p.add_argument("metrics", nargs="+")
+    p.add_argument("--by", default=None, help="ex. cohort, sentiment_label, dominant_emotion")
+    p.add_argument("--where", action="append", default=[], metavar="EXPR")
+    p = sub.add_parser("timeline", help="séries d'un entretien (CSV)")
+    p.add_argument("id")
+    p.add_argument("group", choices=["emotions", "gaze", "speech"])
+    sub.add_parser("stats")
+    args = ap.parse_args()
+
+    with Archive(args.db) as archive:
+        t0 = time.perf_counter()
+        if args.command == "ingest":
+            kw = {"prune": args.prune, "timelines": not args.no_timelines}
+            if args.watch:
+                for counts in archive.watch(args.root, args.watch, **kw):
+                    print(json.dumps(counts), flush=True)
+            else:
+                print(json.dumps(archive.ingest(args.root, **kw)))
+        elif args.command == "query":
+            print(archive.query(args.where, args.match, args.order, args.limit, args.columns).to_csv())
+        elif args.command == "search":
+            print(archive.search(args.text, args.where, args.limit).to_csv())
+        elif args.command == "agg":
+            print(archive.aggregate(args.metrics, args.by, args.where).to_csv())
+        elif args.command == "timeline":
+            cols = archive.timeline(args.id, args.group).get(args.group)
+            if not cols:
+                sys.exit(f"Pas de timeline {args.group} pour {args.id}")
+            n, table = len(cols["t"]), {}
+            for c, a in cols.items():
+                if len(a) != n:  # constantes (ex. classes)
+                    continue
+                if a.ndim == 2:  # probabilités : une colonne par classe
+                    names = cols.get("classes", range(a.shape[1]))
+                    table.update({f"{c}_{k}": a[:, j] for j, k in enumerate(names)})
+                else:
+                    table[c] = a
+            print(pd.DataFrame(table).to_csv(index=False))
+        else:
+            print(json.dumps(archive.stats(), indent=2))
+        print(f"{(time.perf_counter() - t0) * 1000:.1f} ms", file=sys.stderr)
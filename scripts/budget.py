@@ -0,0 +1,251 @@
+# scripts/budget.py — niveaux de qualité sous contrainte de temps : calibration locale, plan, rétrogradations en cours de run
+import os, json, time, platform
+from model_registry import whisper_name
+
+CALIBRATION_PATH = os.getenv("CALIBRATION_PATH", os.path.join(".cache", "calibration.json"))
+
+# Niveaux, du meilleur au plus rapide : réglages appliqués au run (ils priment sur les options par défaut)
+TIERS = {
+    "max": {"stt_model": "small", "stt_compute": "int8", "stt_beam": 5, "sample_fps": 4, "gaze_sample_fps": None,
+            "emo_max_width": 1280},
+    "high": {"stt_model": "small", "stt_compute": "int8", "stt_beam": 1, "sample_fps": 2, "gaze_sample_fps": None,
+             "emo_max_width": 960},
+    "standard": {"stt_model": "base", "stt_compute": "int8", "stt_beam": 1, "sample_fps": 2, "gaze_sample_fps": 10,
+                 "emo_max_width": 960},
+    "fast": {"stt_model": "base", "stt_compute": "int8", "stt_beam": 1, "sample_fps": 1, "gaze_sample_fps": 5,
+             "emo_max_width": 640},
+    "draft": {"stt_model": "tiny", "stt_compute": "int8", "stt_beam": 1, "sample_fps": 1, "gaze_sample_fps": 3,
+              "emo_max_width": 480},
+}
+SAFETY = 0.9  # un plan doit tenir dans 90 % du budget
+
+# coûts relatifs (référence : whisper-base int8 beam 1, frames à 960 px)
+STT_MODEL_COST = {"whisper-tiny": 0.45, "whisper-base": 1.0, "whisper-small": 2.6, "whisper-medium": 6.5,
+                  "whisper-large-v3": 13.0, "whisper-distil-large-v3": 6.0}
+STT_COMPUTE_COST = {"int8": 1.0, "int8_float32": 1.0, "int8_float16": 1.0, "float16": 1.8, "float32": 1.9}
+WORDS_PER_SEC = 2.3  # ~140 mots/min : estimation du transcript avant la transcription
+
+# débits par défaut (CPU 4 cœurs typique) tant que la machine n'est pas calibrée ; en secondes de calcul
+DEFAULT_COEF = {
+    "extract_rtf": 0.01,          # par seconde d'audio
+    "stt_rtf": 0.12,              # par seconde d'audio (référence)
+    "speech_rtf": 0.02,
+    "text_per_word": 0.006,       # sentiment + résumé
+    "decode_per_frame": 0.002,    # par frame vidéo décodée
+    "gaze_per_frame": 0.012,      # par frame analysée, à 960 px
+    "emotions_per_frame": 0.015,
+    "overhead_sec": 1.5,
+}
+DEFAULT_LOAD_SEC = {"whisper-base": 2.0, "text_engine": 10.0, "emotion_session": 0.5, "face_detector": 0.2,
+                    "face_mesh": 0.3}
+
+# --- calibration (fichier local, une par machine) ---
+def load_calibration(path=CALIBRATION_PATH):
+    cal = {"host": platform.node(), "cpus": os.cpu_count(), "runs": 0, "coef": dict(DEFAULT_COEF),
+           "load_sec": dict(DEFAULT_LOAD_SEC), "calibrated": False}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            saved = json.load(f)
+        cal.update({k: v for k, v in saved.items() if k not in ("coef", "load_sec")})
+        cal["coef"].update(saved.get("coef", {}))
+        cal["load_sec"].update(saved.get("load_sec", {}))
+    return cal
+
+def save_calibration(cal, path=CALIBRATION_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cal, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+    return path
+
+def _stt_cost(s):
+    return (STT_MODEL_COST.get(whisper_name(s["stt_model"]), 1.0) * STT_COMPUTE_COST.get(s["stt_compute"], 1.0)
+            * (1.0 + 0.15 * (s["stt_beam"] - 1)))
+
+def _width_cost(width):
+    return 0.35 + 0.65 * ((width or 960) / 960.0) ** 2
+
+def _frames(media, sample_fps):
+    # même règle que FrameAnalyzer.begin : une frame toutes les fps // sample_fps
+    step = max(int(media["fps"] // max(1, sample_fps)), 1) if sample_fps else 1
+    return media["frames"] / step
+
+def observe(cal, report, settings, degraded=(), alpha=0.5):
+    """
+    Met à jour les débits à partir du report["perf"] d'un run : étapes réellement calculées (ni en cache,
+    ni `degraded` — résumé tronqué sous échéance) ; moyenne mobile exponentielle une fois calibré.
+    """
+    stages = report["perf"]["stages"]
+    audio = report["speech"].get("duration_sec") or 0.0
+    frames = report["nonverbal"].get("frames") or {}
+    timing, per = frames.get("timing") or {}, frames.get("per_analyzer") or {}
+    sw = _width_cost(settings["emo_max_width"])
+    obs = {}
+
+    def stage(name):
+        st = stages.get(name)
+        return st["compute_sec"] if st and st["cat"] == "stage" and name not in degraded else None
+    if audio > 0:
+        if stage("audio") is not None:
+            obs["extract_rtf"] = stage("audio") / audio
+        if stage("transcribe") is not None:
+            obs["stt_rtf"] = stage("transcribe") / (audio * _stt_cost(settings))
+        if stage("speech") is not None:
+            obs["speech_rtf"] = stage("speech") / audio
+    words = len((report.get("transcript") or "").split())
+    if stage("text") is not None and words:
+        obs["text_per_word"] = stage("text") / words
+    # visuel : débits par frame, valables même après rétrogradation de cadence
+    if stages.get("visual", {}).get("cat") == "stage" and frames.get("frames_decoded"):
+        obs["decode_per_frame"] = timing.get("decode", 0.0) / frames["frames_decoded"]
+        for name in ("gaze", "emotions"):
+            if per.get(name):
+                obs[f"{name}_per_frame"] = timing.get(name, 0.0) / per[name] / sw
+    if not obs:  # tout en cache : rien à apprendre
+        return obs
+    for k, v in obs.items():
+        cal["coef"][k] = v if not cal["calibrated"] else (1 - alpha) * cal["coef"][k] + alpha * v
+    for name, m in report["perf"]["models"].items():
+        if not m.get("warm"):
+            key = name if not name.startswith("whisper") else whisper_name(settings["stt_model"])
+            cal["load_sec"][key] = m["load_sec"]
+    cal.update(calibrated=True, runs=cal["runs"] + 1, updated=time.strftime("%Y-%m-%dT%H:%M:%S"))
+    return obs
+
+# --- prédiction / plan ---
+def probe_media(video):
+    """Durée, cadence et nombre de frames (OpenCV, sans décoder)."""
+    import cv2
+    cap = cv2.VideoCapture(video)
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Impossible d'ouvrir la vidéo: {video}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    frames = cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0.0
+    cap.release()
+    return {"duration": frames / fps, "fps": fps, "frames": frames}
+
+def predict(settings, media, cal, warm=(), parallel=True):
+    """Temps de calcul prévu par étape et temps mur (branches audio / visuel en parallèle), chargements compris."""
+    c, loads = cal["coef"], cal["load_sec"]
+    audio = media["duration"]
+    sw = _width_cost(settings["emo_max_width"])
+    wname = whisper_name(settings["stt_model"])
+    stages = {
+        "audio": audio * c["extract_rtf"],
+        "transcribe": audio * c["stt_rtf"] * _stt_cost(settings),
+        "speech": audio * c["speech_rtf"],
+        "text": audio * WORDS_PER_SEC * c["text_per_word"],
+        "visual": (media["frames"] * c["decode_per_frame"]
+                   + _frames(media, settings["gaze_sample_fps"]) * c["gaze_per_frame"] * sw
+                   + _frames(media, settings["sample_fps"]) * c["emotions_per_frame"] * sw),
+    }
+    # chargements paresseux à froid, sur la branche qui en a besoin ; warm : {"whisper-base:int8", "text_engine", ...}
+    cold = lambda name: 0.0 if name in warm else loads.get(name, 0.0)
+    if f"{wname}:{settings['stt_compute']}" not in warm:
+        stages["transcribe"] += loads.get(wname, loads["whisper-base"] * STT_MODEL_COST.get(wname, 1.0))
+    stages["text"] += cold("text_engine")
+    stages["visual"] += sum(cold(n) for n in ("emotion_session", "face_detector", "face_mesh"))
+    audio_branch = stages["audio"] + stages["transcribe"] + max(stages["speech"], stages["text"])
+    wall = (max(audio_branch, stages["visual"]) if parallel else sum(stages.values())) + c["overhead_sec"]
+    return {"wall_sec": round(wall, 2), "stages": {k: round(v, 2) for k, v in stages.items()}}
+
+def choose(media, cal, budget_sec=None, tier=None, warm=(), parallel=True):
+    """
+    (niveau, réglages, prédiction, tenable) : le meilleur niveau dont la prédiction tient dans SAFETY × budget ;
+    `tier` imposé : ce niveau tel quel. Aucun niveau ne tient : le plus rapide (tenable = False).
+    """
+    names = [tier] if tier else list(TIERS)
+    for name in names:
+        settings = dict(TIERS[name])
+        pred = predict(settings, media, cal, warm, parallel)
+        ok = budget_sec is None or pred["wall_sec"] <= SAFETY * budget_sec
+        if ok or name == names[-1]:
+            return name, settings, pred, ok
+
+def plan(video, budget_sec=None, tier=None, warm=(), parallel=True, path=CALIBRATION_PATH):
+    """Plan d'un run : durée de la vidéo, calibration de la machine, niveau choisi et prédiction."""
+    if tier is not None and tier not in TIERS:
+        raise ValueError(f"Niveau inconnu: {tier} (choix : {', '.join(TIERS)})")
+    media, cal = probe_media(video), load_calibration(path)
+    name, settings, pred, feasible = choose(media, cal, budget_sec, tier, warm, parallel)
+    return {"tier": name, "forced_tier": tier is not None, "budget_sec": budget_sec, "feasible": feasible,
+            "settings": settings, "predicted": pred, "media": media, "cal": cal}
+
+# --- pendant le run ---
+# rétrogradation de la cadence d'un analyseur visuel : None (toutes les frames) → 10 → 5 → 3 → 2 → 1 img/s (palier inférieur)
+RATE_STEPS = (None, 10, 5, 3, 2, 1)
+
+class Deadline:
+    """
+    Échéance d'un run : `budget_sec` depuis `t0`. Surveille la branche visuelle (débit mesuré par fenêtres
+    de `window_sec`) et abaisse la cadence des analyseurs si la fin projetée dépasse l'échéance ; limite le
+    nombre de morceaux résumés si le texte démarre trop tard. Les étapes dégradées ne sont pas mises en cache.
+    """
+
+    def __init__(self, plan, t0=None, window_sec=5.0):
+        self.budget_sec, self.media, self.cal = plan["budget_sec"], plan["media"], plan["cal"]
+        self.t0 = t0 or time.perf_counter()
+        self.window_sec = window_sec
+        self.downgrades = []
+        self._win = None
+
+    def elapsed(self):
+        return time.perf_counter() - self.t0
+
+    def remaining(self):
+        return self.budget_sec - self.elapsed() - self.cal["coef"]["overhead_sec"]
+
+    def degraded(self, stage):
+        return any(d["stage"] == stage for d in self.downgrades)
+
+    def _log(self, stage, change):
+        self.downgrades.append({"at_sec": round(self.elapsed(), 2), "stage": stage, "change": change})
+
+    # visuel : appelé par run_frames avec le temps vidéo courant
+    def visual_check(self, t, analyzers):
+        now = time.perf_counter()
+        if self._win is None:
+            self._win = (now, t)
+            return
+        w0, v0 = self._win
+        if now - w0 < self.window_sec or t <= v0:
+            return
+        speed = (t - v0) / (now - w0)  # secondes de vidéo par seconde
+        self._win = (now, t)
+        if (self.media["duration"] - t) / speed <= self.remaining():
+            return
+        change = {}
+        for a in analyzers:
+            lower = [r for r in RATE_STEPS[1:] if a.sample_fps is None or r < a.sample_fps]
+            if a.adaptive or not lower:  # adaptatif : cadence décidée par l'AdaptiveSampler
+                continue
+            new = lower[0]
+            change[a.name] = [a.sample_fps, new]
+            a.set_rate(new)
+        if change:
+            self._log("visual", change)
+
+    # texte : nombre de morceaux à résumer (None = tous)
+    def summary_chunks(self, words, chunk_words=600):
+        per_chunk = chunk_words * self.cal["coef"]["text_per_word"]
+        needed = words * self.cal["coef"]["text_per_word"]
+        left = self.remaining()
+        if needed <= left:
+            return None
+        n = max(1, int(left / per_chunk))
+        self._log("text", {"summary_chunks": n, "words": words})
+        return n
+
+def section(plan, perf, deadline=None):
+    """report["budget"] : niveau choisi, réglages, prévu vs réel par étape, rétrogradations."""
+    pred = plan["predicted"]
+    actual = {k: st["wall_sec"] for k, st in perf["stages"].items() if k in pred["stages"]}
+    return {
+        "tier": plan["tier"], "forced_tier": plan["forced_tier"], "budget_sec": plan["budget_sec"],
+        "feasible": plan["feasible"], "media_sec": round(plan["media"]["duration"], 2), "settings": plan["settings"],
+        "calibrated": plan["cal"]["calibrated"], "predicted": pred,
+        "actual": {"wall_sec": perf["wall_sec"], "stages": actual},
+        "met": None if plan["budget_sec"] is None else perf["wall_sec"] <= plan["budget_sec"],
+        "downgrades": deadline.downgrades if deadline else [],
+    }
@@ -0,0 +1,135 @@
+# scripts/cache.py — cache disque des sorties d'étapes, adressé par contenu, éviction LRU par taille
+import os, json, pickle, hashlib, threading
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_DIR = os.getenv("STAGE_CACHE_DIR", ".cache/stages")
+DEFAULT_MAX_MB = int(os.getenv("STAGE_CACHE_MAX_MB", "2048"))
+
+def code_version(*modules):
+    """Empreinte du code source des modules d'une étape (scripts/<module>.py) : change dès que le code change."""
+    h = hashlib.sha1()
+    for m in modules:
+        with open(os.path.join(SCRIPTS_DIR, m + ".py"), "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:12]
+
+class StageCache:
+    """
+    Clé = sha256(étape, hash du fichier d'entrée, paramètres, version du code, clés des dépendances).
+    Valeurs picklées sous <root>/<k[:2]>/<k>.pkl ; un hit rafraîchit le mtime (LRU).
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_mb=DEFAULT_MAX_MB, enabled=True, invalidate=()):
+        self.root = root
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.enabled = enabled
+        self.invalidate = set(invalidate or ())
+        self._lock = threading.Lock()
+        self._hashes_path = os.path.join(root, "file_hashes.json")
+
+    # --- empreintes ---
+    def file_hash(self, path, chunk=1 << 20):
+        """sha256 du fichier, mémorisé par (chemin, taille, mtime) pour éviter de relire la vidéo."""
+        st = os.stat(path)
+        memo_key = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+        memo = self._load_hashes()
+        if memo_key in memo:
+            return memo[memo_key]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(chunk), b""):
+                h.update(block)
+        memo[memo_key] = h.hexdigest()
+        self._save_hashes(memo)
+        return memo[memo_key]
+
+    def _load_hashes(self):
+        try:
+            with open(self._hashes_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_hashes(self, memo):
+        # relu juste avant l'écriture (workers concurrents), entrées dont le fichier a changé ou disparu retirées
+        memo = {k: v for k, v in {**self._load_hashes(), **memo}.items() if self._memo_current(k)}
+        os.makedirs(self.root, exist_ok=True)
+        tmp = f"{self._hashes_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(memo, f)
+            os.replace(tmp, self._hashes_path)
+        except OSError:  # écriture concurrente perdue : le mémo n'est qu'une accélération
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _memo_current(memo_key):
+        path, size, mtime = memo_key.rsplit("|", 2)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        return f"{st.st_size}|{st.st_mtime_ns}" == f"{size}|{mtime}"
+
+    @staticmethod
+    def key(stage, input_hash, params=None, version="", deps=()):
+        payload = json.dumps([stage, input_hash, params or {}, version, list(deps)], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    # --- lecture / écriture ---
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key + ".pkl")
+
+    def get(self, stage, key):
+        """Retourne (hit, valeur)."""
+        if not self.enabled or stage in self.invalidate:
+            return False, None
+        p = self._path(key)
+        try:
+            with open(p, "rb") as f:
+                value = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return False, None
+        try:
+            os.utime(p)  # LRU : dernier accès
+        except OSError:
+            pass
+        return True, value
+
+    def put(self, stage, key, value):
+        if not self.enabled:
+            return
+        p = self._path(key)
+        os.makedirs(os.path.dirname(p), exist_ok=True)
+        tmp = f"{p}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, p)
+        self.evict()
+
+    def evict(self):
+        """Supprime les entrées les moins récemment utilisées tant que la taille dépasse max_bytes."""
+        with self._lock:
+            entries, total = [], 0
+            for d, _, files in os.walk(self.root):
+                for name in files:
+                    if not name.endswith(".pkl"):
+                        continue
+                    p = os.path.join(d, name)
+                    try:
+                        st = os.stat(p)
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, p))
+                    total += st.st_size
+            for _, size, p in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(p)
+                    total -= size
+                except OSError:
+                    pass
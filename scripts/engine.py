@@ -0,0 +1,390 @@
+# scripts/engine.py — moteur in-process : modèles chargés une fois par process, N vidéos ensuite
+import os
+from scheduler import Stage, run_dag, split_threads
+from cache import code_version
+
+# Stabilité OpenMP sous Windows (avant tout import de torch/onnxruntime/ctranslate2)
+os.environ.setdefault("KMP_DUPLICATE_LIB_OK", "TRUE")
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+
+DEFAULT_OPTIONS = {
+    "sample_fps": 2,
+    "smooth_win": 3,
+    "smooth_method": "ma",     # lissage des probabilités FER+ : ma | ema | viterbi | none
+    "emo_max_timeline": 1000,
+    "emo_max_width": 960,
+    "gaze_sample_fps": None,   # None = toutes les frames
+    "emo_batch": 16,           # visages par appel ONNX FER+
+    "frame_budget": None,      # frames/minute : échantillonnage adaptatif (mouvement) ; None = cadence fixe
+    "track_every": None,       # détection visage toutes les K frames + suivi entre deux ; None = détection à chaque frame
+    "stt_beam": 1,
+    "stt_lang": None,
+    "stt_chunk_sec": 30.0,     # taille cible des morceaux (transcription parallèle)
+    "parallel": True,          # branches audio/visuel en parallèle
+    "audio_mmap": False,       # buffer audio memory-mappé dans outdir (très longs enregistrements)
+    "perf_trace": None,        # "chrome" | "jsonl" : trace des étapes écrite dans outdir (trace.json / trace.jsonl)
+    "timelines": "npz",        # "npz" : séries complètes dans timelines.npz (report.json = agrégats) ; "inline" : listes JSON
+    "budget_sec": None,        # échéance (s) : niveau de qualité choisi d'après la calibration, rétrogradations en cours de run
+    "tier": None,              # niveau imposé (cf. budget.TIERS) ; ses réglages priment sur les options ci-dessus
+}
+
+# Étapes cachables : options qui influencent leur sortie + modules dont le code fait la version.
+# "audio" (buffer PCM en mémoire) n'est pas caché : il n'est relancé que si une étape aval doit tourner.
+CACHE_SPECS = {
+    "audio": (("sr",), ("extract_audio",)),
+    "transcribe": (("stt_model", "stt_compute", "device", "stt_beam", "stt_lang", "stt_workers", "stt_chunk_sec"),
+                   ("transcribe",)),
+    "speech": ((), ("speech_metrics",)),
+    "text": (("text_backend",), ("text_analysis",)),
+    "visual": (("emo_model", "sample_fps", "smooth_win", "smooth_method", "emo_max_width", "gaze_sample_fps", "frame_budget", "track_every"),
+               ("frames", "face_emotions_onnx", "gaze_nods", "smoothing")),
+}
+UNCACHED_STAGES = {"audio"}
+
+# Part des cœurs CPU par branche (Whisper est l'étape la plus lourde)
+BRANCH_WEIGHTS = {"audio": 0.6, "visual": 0.4}
+
+class PipelineEngine:
+    """
+    Charge Whisper, les pipelines Transformers, la session FER+ et les graphes MediaPipe
+    une seule fois (paresseusement), puis analyse autant de vidéos que voulu.
+    Les sorties d'étapes circulent en mémoire (dicts Python), sans stdout ni json.loads.
+    """
+
+    def __init__(self, stt_model="base", stt_compute="int8", device="cpu",
+                 stt_workers=0, text_backend="torch", emo_model="ferplus", scorer=None, threads=None, cache=None,
+                 **options):
+        unknown = set(options) - set(DEFAULT_OPTIONS)
+        if unknown:
+            raise TypeError(f"Options inconnues: {sorted(unknown)}")
+        self.stt_model = stt_model
+        self.stt_compute = stt_compute
+        self.device = device
+        self.text_backend = text_backend  # torch | int8 | onnx | onnx-int8
+        self.emo_model = emo_model  # ferplus | ferplus-int8 (cf. model_registry)
+        self.scorer = scorer
+        self.cache = cache  # StageCache ou None
+        self.options = {**DEFAULT_OPTIONS, **options}
+        self._models, self.load_sec = {}, {}
+        self._profiler = None  # Profiler du run en cours (chargements paresseux attribués au run)
+        # budget de threads par branche, pour ne pas sursouscrire les cœurs quand elles tournent ensemble
+        self.threads = threads or os.cpu_count() or 1
+        self.budget = split_threads(self.threads, BRANCH_WEIGHTS)
+        # workers CTranslate2 (morceaux transcrits en parallèle) ; 0 = auto, ~2 threads par worker
+        self.stt_workers = stt_workers or max(1, min(4, self.budget["audio"] // 2))
+
+    # --- modèles (chargés à la première utilisation, puis réutilisés) ---
+    def _get(self, name, loader):
+        if name not in self._models:
+            from perf import Profiler
+            prof = self._profiler or Profiler()  # hors run (warmup) : profiler jetable, juste pour la durée
+            try:
+                with prof.span(name, "model_load") as ev:
+                    self._models[name] = loader()
+            finally:
+                if prof is not self._profiler:
+                    prof.close()
+            self.load_sec[name] = round(ev["wall_sec"], 3)
+        return self._models[name]
+
+    @property
+    def whisper(self):
+        return self.whisper_for(self.stt_model, self.stt_compute)
+
+    def whisper_for(self, model, compute):
+        """Whisper de l'engine ("whisper") ou, pour un run à un autre niveau, "whisper:<modèle>:<compute>"."""
+        from model_registry import whisper_name
+        default = (model, compute) == (self.stt_model, self.stt_compute)
+
+        def load():
+            import transcribe
+            return transcribe.load_model(model, self.device, compute,
+                                         cpu_threads=max(1, self.budget["audio"] // self.stt_workers),
+                                         num_workers=self.stt_workers)
+        return self._get("whisper" if default else f"whisper:{whisper_name(model)}:{compute}", load)
+
+    def warm_models(self):
+        """Modèles déjà chargés, au format de budget.predict (Whisper : "<modèle>:<compute>")."""
+        from model_registry import whisper_name
+        warm = set()
+        for name in self._models:
+            if name == "whisper":
+                name = f"{whisper_name(self.stt_model)}:{self.stt_compute}"
+            warm.add(name.split(":", 1)[1] if name.startswith("whisper:") else name)
+        return warm
+
+    @property
+    def text_engine(self):
+        def load():
+            import torch, text_analysis
+            torch.set_num_threads(self.budget["audio"])  # texte = fin de la branche audio
+            return text_analysis.TextEngine(backend=self.text_backend)
+        return self._get("text_engine", load)
+
+    @property
+    def emotion_session(self):
+        def load():
+            import face_emotions_onnx
+            return face_emotions_onnx.load_session(threads=self.budget["visual"], model=self.emo_model)
+        return self._get("emotion_session", load)
+
+    @property
+    def face_detector(self):
+        def load():
+            import face_emotions_onnx
+            return face_emotions_onnx.make_detector()
+        return self._get("face_detector", load)
+
+    @property
+    def face_mesh(self):
+        def load():
+            import gaze_nods
+            return gaze_nods.make_face_mesh()
+        return self._get("face_mesh", load)
+
+    def warmup(self):
+        """Précharge tous les modèles (à appeler à l'init d'un worker)."""
+        for name in ("whisper", "text_engine", "emotion_session", "face_detector", "face_mesh"):
+            getattr(self, name)
+        return self
+
+    def close(self):
+        for name in ("face_detector", "face_mesh"):
+            m = self._models.pop(name, None)
+            if m is not None:
+                m.close()
+        self._models.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- cache ---
+    def _plan_cache(self, video, stages, opts, deadline=None):
+        """
+        Remplace les étapes en cache par leur résultat et retire celles devenues inutiles
+        (ex. extraction audio si transcription et paraverbal sont en cache). Retourne (stages, cachées).
+        Une étape rétrogradée en cours de run (`deadline`) n'est pas mise en cache.
+        """
+        cache = self.cache
+        if cache is None or not cache.enabled:
+            return stages, []
+
+        from model_registry import whisper_name
+        values = {**opts, "sr": 16000, "stt_model": whisper_name(opts["stt_model"]),  # "base" = "whisper-base"
+                  "device": self.device, "stt_workers": self.stt_workers,
+                  "text_backend": self.text_backend, "emo_model": self.emo_model}
+        src = cache.file_hash(video)
+        by_name = {s.name: s for s in stages}
+        keys, hits = {}, {}
+        stale = set(cache.invalidate)  # étape forcée : tout ce qui en dépend est recalculé aussi
+        for s in stages:  # ordre topologique
+            names, modules = CACHE_SPECS[s.name]
+            keys[s.name] = cache.key(s.name, src, {k: values[k] for k in names}, code_version(*modules),
+                                     [keys[d] for d in s.deps])
+            if any(d in stale for d in s.deps):
+                stale.add(s.name)
+            if s.name not in UNCACHED_STAGES and s.name not in stale:
+                hit, value = cache.get(s.name, keys[s.name])
+                if hit:
+                    hits[s.name] = value
+
+        needed = set()
+        def need(name):
+            if name in needed or name in hits:
+                return
+            needed.add(name)
+            for d in by_name[name].deps:
+                need(d)
+        for s in stages:
+            if s.name not in UNCACHED_STAGES:
+                need(s.name)
+
+        def cached_value(value):
+            return lambda _: value
+
+        def store(s):
+            def run(inp):
+                out = s.fn(inp)
+                if s.name not in UNCACHED_STAGES and not (deadline and deadline.degraded(s.name)):
+                    cache.put(s.name, keys[s.name], out)
+                return out
+            return Stage(s.name, run, s.deps, s.threads)
+
+        planned = []
+        for s in stages:
+            if s.name in hits:
+                planned.append(Stage(s.name, cached_value(hits[s.name]), threads=0))
+            elif s.name in needed:
+                planned.append(store(s))
+        return planned, sorted(hits)
+
+    def frame_analyzers(self, opts):
+        """(analyseurs, sampler, tracker) de la branche visuelle ; gaze d'abord : sa boîte visage FaceMesh sert à FER+."""
+        from frames import AdaptiveSampler
+        from face_emotions_onnx import EmotionAnalyzer
+        from gaze_nods import GazeNodsAnalyzer
+        from tracking import FaceTracker
+        adaptive = bool(opts["frame_budget"])
+        sampler = AdaptiveSampler(budget_per_min=opts["frame_budget"]) if adaptive else None
+        tracker = FaceTracker(self.face_detector, redetect_every=opts["track_every"]) if opts["track_every"] else None
+        return [
+            GazeNodsAnalyzer(self.face_mesh, sample_fps=opts["gaze_sample_fps"], adaptive=adaptive),
+            EmotionAnalyzer(self.emotion_session, self.face_detector, opts["sample_fps"], opts["smooth_win"],
+                            opts["emo_max_timeline"], opts["emo_max_width"], batch_size=opts["emo_batch"],
+                            adaptive=adaptive, smooth=opts["smooth_method"]),
+        ], sampler, tracker
+
+    # --- exécution ---
+    def run(self, video, outdir="outputs", progress=None, **options):
+        """
+        Analyse `video` et renvoie le report (dict) ; écrit transcript.txt et report.json dans `outdir`.
+        `progress` : callback appelé au début et à la fin de chaque étape et chargement de modèle (cf. Profiler).
+        """
+        unknown = set(options) - set(DEFAULT_OPTIONS)
+        if unknown:
+            raise TypeError(f"Options inconnues: {sorted(unknown)}")
+        opts = {**self.options, **options, "stt_model": self.stt_model, "stt_compute": self.stt_compute}
+        os.makedirs(outdir, exist_ok=True)
+        from perf import Profiler
+        prof = self._profiler = Profiler(on_event=progress)
+        try:
+            plan = None
+            if opts["budget_sec"] or opts["tier"]:
+                import budget
+                plan = budget.plan(video, opts["budget_sec"], opts["tier"], self.warm_models(), opts["parallel"])
+                opts.update(plan["settings"])  # Whisper, beam, cadences, résolution du niveau choisi
+            return self._run(video, outdir, opts, prof, plan)
+        finally:
+            prof.close()
+            self._profiler = None
+
+    def _run(self, video, outdir, opts, prof, plan=None):
+        deadline = None
+        if plan and plan["budget_sec"]:
+            import budget
+            deadline = budget.Deadline(plan, t0=prof.t0)
+
+        # imports dans chaque étape : un run entièrement en cache ne charge ni librosa, ni torch, ni MediaPipe
+        def extract(_):
+            # PCM float32 16 kHz décodé par pipe FFmpeg : un seul décodage, partagé par Whisper et le paraverbal
+            import extract_audio
+            mmap_path = os.path.join(outdir, "audio.f32") if opts["audio_mmap"] else None
+            return extract_audio.decode_audio(video, sr=extract_audio.SR, mmap_path=mmap_path)
+
+        def stt(inp):
+            import transcribe
+            return transcribe.transcribe_audio(self.whisper_for(opts["stt_model"], opts["stt_compute"]), inp["audio"], beam=opts["stt_beam"], lang=opts["stt_lang"],
+                                               workers=self.stt_workers, chunk_sec=opts["stt_chunk_sec"])
+
+        def speech(inp):
+            import speech_metrics
+            return speech_metrics.compute_metrics(inp["audio"], 16000, inp["transcribe"]["text"], asr=inp["transcribe"])
+
+        def text(inp):
+            import text_analysis
+            asr = inp["transcribe"]
+            # en retard sur l'échéance : résumé limité aux morceaux que le temps restant permet
+            chunks = deadline.summary_chunks(len(asr["text"].split())) if deadline else None
+            return text_analysis.analyze(asr["text"], self.text_engine, segments=asr["segments"], summary_chunks=chunks)
+
+        def visual(_):
+            from frames import run_frames
+            # un seul décodage vidéo pour gaze/nods + émotions
+            analyzers, sampler, tracker = self.frame_analyzers(opts)
+            return run_frames(video, analyzers, max_width=opts["emo_max_width"], sampler=sampler, tracker=tracker,
+                              deadline=deadline)
+
+        # Graphe : audio → transcribe → {speech, text} ; visual indépendant
+        b = self.budget
+        stages = [
+            Stage("audio", extract, threads=1),
+            Stage("transcribe", stt, deps=["audio"], threads=b["audio"]),
+            Stage("speech", speech, deps=["audio", "transcribe"], threads=1),
+            Stage("text", text, deps=["transcribe"], threads=b["audio"]),
+            Stage("visual", visual, threads=b["visual"]),
+        ]
+        stages, cached = self._plan_cache(video, stages, opts, deadline)
+        stages = [Stage(s.name, prof.wrap(s.name, s.fn, "cached" if s.name in cached else "stage"), s.deps, s.threads)
+                  for s in stages]
+        out, schedule = run_dag(stages, max_workers=None if opts["parallel"] else 1)
+        schedule["cached"] = cached
+        report = self.build_report(out["transcribe"], out["speech"], out["text"], *out["visual"])
+        report["schedule"] = schedule
+        report["perf"] = self.perf_section(prof, report, opts, outdir)
+        if plan:
+            report["budget"] = self.budget_section(plan, report, deadline)
+        return self.write_report(report, outdir, opts["timelines"], opts["emo_max_timeline"])
+
+    def perf_section(self, prof, report, opts, outdir):
+        """report["perf"] : étapes, modèles (chargés pendant le run ou déjà chauds), volumes traités, trace optionnelle."""
+        frames = report["nonverbal"]["frames"]
+        audio_sec = report["speech"].get("duration_sec") or 0.0
+        prof.count(audio_sec=audio_sec, frames_decoded=frames.get("frames_decoded"),
+                   frames_analyzed=frames.get("frames_analyzed"), visual_sec=frames.get("timing"))
+        perf = prof.summary()
+        for name, sec in self.load_sec.items():
+            perf["models"].setdefault(name, {"load_sec": sec, "warm": True})
+        perf["realtime_factor"] = round(audio_sec / perf["wall_sec"], 2) if perf["wall_sec"] > 0 else None
+        if opts["perf_trace"] == "chrome":
+            perf["trace"] = prof.chrome_trace(os.path.join(outdir, "trace.json"))
+        elif opts["perf_trace"] == "jsonl":
+            perf["trace"] = prof.jsonl(os.path.join(outdir, "trace.jsonl"))
+        return perf
+
+    def budget_section(self, plan, report, deadline):
+        """report["budget"] (prévu vs réel) ; les étapes calculées affinent la calibration de la machine."""
+        import budget
+        section = budget.section(plan, report["perf"], deadline)
+        degraded = {d["stage"] for d in section["downgrades"]}
+        if budget.observe(plan["cal"], report, plan["settings"], degraded):
+            budget.save_calibration(plan["cal"])
+        return section
+
+    def build_report(self, asr, speech, text, visual_res, frame_stats):
+        """Report d'agrégats ; les séries temporelles sont mises à part sous report["timelines"] (cf. write_report)."""
+        from timeline_store import split
+        speech, speech_series = split(speech)
+        gaze, gaze_series = split(visual_res["gaze"])
+        emotions, emo_series = split(visual_res["emotions"])
+        report = {
+            "transcript": asr["text"],
+            "asr": {k: v for k, v in asr.items() if k != "text"},  # segments, mots, avg_logprob
+            "speech": speech,
+            "text": text,
+            "nonverbal": {**gaze, "emotions": emotions, "frames": frame_stats},
+            "timelines": {"emotions": emo_series, "gaze": gaze_series, "speech": speech_series},
+        }
+        if self.scorer is not None:
+            report["scores"] = self.scorer(report)
+        return report
+
+    def write_report(self, report, outdir, timelines=None, max_timeline=None):
+        """
+        transcript.txt + report.json (+ sidecar timelines.npz) ; écriture atomique : report.json présent = entretien
+        terminé (reprise des lots). timelines="inline" : listes JSON (timelines émotions et regard bornées à max_timeline).
+        """
+        import json
+        import timeline_store
+        timelines = timelines or self.options["timelines"]
+        series = {k: v for k, v in report.pop("timelines", {}).items() if v is not None}
+        if timelines == "inline":
+            if "speech" in series:
+                report["speech"]["series"] = series["speech"]
+            if "emotions" in series:
+                report["nonverbal"]["emotions"]["timeline"] = timeline_store.emotion_records(
+                    series["emotions"], max_timeline or self.options["emo_max_timeline"])
+            if "gaze" in series:
+                report["nonverbal"]["timeline"] = timeline_store.gaze_records(
+                    series["gaze"], max_timeline or self.options["emo_max_timeline"])
+        elif series:
+            report["timelines"] = timeline_store.save(os.path.join(outdir, timeline_store.SIDECAR), series)
+        with open(os.path.join(outdir, "transcript.txt"), "w", encoding="utf-8") as f:
+            f.write(report["transcript"])
+        out_path = os.path.join(outdir, "report.json")
+        with open(out_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        os.replace(out_path + ".tmp", out_path)
+        return report
@@ -1,9 +1,60 @@
-import os, sys, ffmpeg
+import os, sys, subprocess, tempfile, ffmpeg
+import numpy as np
 
-def extract_audio(video_path, out_wav, sr=16000):
+SR = 16000
+
+def extract_audio(video_path, out_wav, sr=SR):
     ffmpeg.input(video_path).output(out_wav, ac=1, ar=sr).overwrite_output().run()
     return out_wav
 
+def iter_audio(video_path, sr=SR, chunk_sec=30.0):
+    """
+    Décode la piste audio via un pipe FFmpeg (float32 mono `sr` Hz) et la rend par blocs de `chunk_sec`.
+    Mémoire bornée par la taille d'un bloc, quelle que soit la durée de l'enregistrement.
+    """
+    cmd = (ffmpeg.input(video_path)
+           .output("pipe:", format="f32le", acodec="pcm_f32le", ac=1, ar=sr)
+           .global_args("-nostdin", "-loglevel", "error")
+           .compile())
+    nbytes = int(chunk_sec * sr) * 4
+    eof = False
+    with tempfile.TemporaryFile() as err:  # stderr hors console : lu seulement si le décodage échoue
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=err)
+        try:
+            while True:
+                buf = proc.stdout.read(nbytes)
+                if not buf:
+                    eof = True
+                    break
+                yield np.frombuffer(buf[:len(buf) - len(buf) % 4], dtype=np.float32)
+        finally:
+            if not eof:  # générateur fermé avant la fin : FFmpeg arrêté avant de fermer le pipe, sans lever
+                proc.terminate()
+            proc.stdout.close()
+            if proc.wait() != 0 and eof:
+                err.seek(0)
+                msg = err.read().decode("utf-8", "replace").strip()[-1000:]
+                raise RuntimeError(f"FFmpeg n'a pas pu décoder l'audio de {video_path}" + (f" : {msg}" if msg else ""))
+
+def decode_audio(video_path, sr=SR, mmap_path=None, chunk_sec=30.0):
+    """
+    Audio complet en un seul buffer float32, partagé par Whisper et le paraverbal (pas de WAV intermédiaire).
+    mmap_path : écrit les blocs au fil de l'eau dans ce fichier et renvoie un np.memmap (longs enregistrements).
+    """
+    if mmap_path is None:
+        chunks = list(iter_audio(video_path, sr, chunk_sec))
+        return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
+
+    os.makedirs(os.path.dirname(mmap_path) or ".", exist_ok=True)
+    n = 0
+    with open(mmap_path, "wb") as f:
+        for chunk in iter_audio(video_path, sr, chunk_sec):
+            f.write(chunk.tobytes())
+            n += len(chunk)
+    if n == 0:
+        return np.zeros(0, dtype=np.float32)
+    return np.memmap(mmap_path, dtype=np.float32, mode="r", shape=(n,))
+
 if __name__ == "__main__":
     video = sys.argv[1]
     out = sys.argv[2] if len(sys.argv) > 2 else "outputs/sample.wav"
@@ -1,39 +1,86 @@
 # scripts/face_emotions_onnx.py — FER+ (ONNX) + MediaPipe, rapide & lissé
-import os, json, argparse, cv2, numpy as np
+import os, sys, json, time, weakref, argparse, cv2, numpy as np
 import onnxruntime as ort
+from onnxruntime.capi.onnxruntime_pybind11_state import InvalidArgument
 import mediapipe as mp
-
-DEFAULT_MODEL_DIR = "models"
-DEFAULT_MODEL_FILE = "emotion-ferplus-8.onnx"
-
-def ensure_model(model_dir=DEFAULT_MODEL_DIR, filename=DEFAULT_MODEL_FILE):
-    os.makedirs(model_dir, exist_ok=True)
-    local_path = os.path.join(model_dir, filename)
-    if os.path.exists(local_path):
-        return local_path
-    # Tentative de téléchargement (facultatif)
-    try:
-        from huggingface_hub import hf_hub_download
-        path = hf_hub_download(repo_id="webai-community/models-bk", filename="emotion-ferplus-8.onnx")
-        with open(path, "rb") as src, open(local_path, "wb") as dst:
-            dst.write(src.read())
-        return local_path
-    except Exception as e:
-        raise RuntimeError(
-            f"Modèle introuvable. Place {DEFAULT_MODEL_FILE} dans {DEFAULT_MODEL_DIR}/\nErreur: {e}"
-        )
-
-def softmax(x):
+from frames import Box, FrameAnalyzer, run_frames
+from smoothing import make_smoother
+from model_registry import resolve
+from timeline_store import emotion_records
+
+DEFAULT_MODEL = "ferplus"  # ou "ferplus-int8" (cf. model_registry)
+
+def ensure_model(name=DEFAULT_MODEL):
+    """Chemin local du modèle FER+ (batch symbolique), lu dans le manifeste du registre ou récupéré."""
+    return resolve(name)
+
+def load_session(model_path=None, threads=None, inter_threads=None, optimized_path=None, model=DEFAULT_MODEL):
+    """
+    Session CPU réglée : threads intra/inter-op, optimisations de graphe complètes, exécution séquentielle.
+    model : nom du registre ("ferplus", "ferplus-int8"), ignoré si model_path est donné.
+    optimized_path : modèle optimisé pré-construit (chargé s'il existe, sinon écrit à la 1re création).
+    Le modèle est passé par chemin : ONNX Runtime le lit lui-même, sans copie en mémoire côté Python.
+    """
+    model_path = model_path or ensure_model(model)
+    so = ort.SessionOptions()
+    so.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads:
+        so.intra_op_num_threads = threads
+    so.inter_op_num_threads = inter_threads or 1
+    if optimized_path:
+        if os.path.exists(optimized_path):
+            model_path = optimized_path
+            so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL  # déjà optimisé
+        else:
+            so.optimized_model_filepath = optimized_path
+    return ort.InferenceSession(model_path, sess_options=so, providers=["CPUExecutionProvider"])
+
+def batch_capable(sess):
+    """True si l'entrée accepte un batch > 1 (dimension 0 symbolique)."""
+    dim0 = sess.get_inputs()[0].shape[0]
+    return not isinstance(dim0, int) or dim0 != 1
+
+def make_detector():
+    return mp.solutions.face_detection.FaceDetection(model_selection=1, min_detection_confidence=0.5)
+
+def softmax(x, axis=-1):
     x = np.asarray(x, dtype=np.float32)
-    x = x - np.max(x)
+    x = x - np.max(x, axis=axis, keepdims=True)
     e = np.exp(x)
-    return e / (np.sum(e) + 1e-9)
+    return e / (np.sum(e, axis=axis, keepdims=True) + 1e-9)
+
+def preprocess_faces(faces_bgr):
+    """Liste de crops BGR → tenseur (N,1,64,64) float32 ; une seule conversion/normalisation pour le batch."""
+    batch = np.empty((len(faces_bgr), 1, 64, 64), dtype=np.uint8)
+    for i, face in enumerate(faces_bgr):
+        gray = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
+        batch[i, 0] = cv2.resize(gray, (64, 64), interpolation=cv2.INTER_AREA)
+    return batch.astype(np.float32) * (1.0 / 255.0)  # NCHW
 
 def preprocess_face(face_bgr):
-    gray = cv2.cvtColor(face_bgr, cv2.COLOR_BGR2GRAY)
-    gray = cv2.resize(gray, (64, 64), interpolation=cv2.INTER_AREA)
-    arr = gray.astype(np.float32) / 255.0
-    return arr[None, None, :, :]  # NCHW
+    return preprocess_faces([face_bgr])
+
+_BATCH_FAILED = weakref.WeakSet()  # sessions dont le batch a échoué à l'exécution
+
+def infer(sess, batch, in_name=None, out_name=None):
+    """Logits (N,8) ; un seul sess.run si le modèle accepte un batch, sinon un appel par visage."""
+    in_name = in_name or sess.get_inputs()[0].name
+    out_name = out_name or sess.get_outputs()[0].name
+    if len(batch) == 1:
+        return sess.run([out_name], {in_name: batch})[0].reshape(1, -1)
+    if batch_capable(sess) and sess not in _BATCH_FAILED:
+        try:
+            out = sess.run([out_name], {in_name: batch})[0]
+            if len(out) == len(batch):
+                return out.reshape(len(batch), -1)
+            err = f"{len(out)} sorties pour {len(batch)} visages"
+        except InvalidArgument as e:  # forme incompatible : batch figé dans le graphe malgré l'entrée symbolique
+            err = e
+        _BATCH_FAILED.add(sess)  # un visage par appel pour le reste de la session
+        print(f"[emotions] batch refusé par le modèle, un visage par appel : {err}", file=sys.stderr)
+    return np.concatenate([sess.run([out_name], {in_name: batch[i:i + 1]})[0].reshape(1, -1)
+                           for i in range(len(batch))])
 
 def crop_face(frame_bgr, rbox, margin=0.1):
     H, W = frame_bgr.shape[:2]
@@ -47,99 +94,141 @@ def crop_face(frame_bgr, rbox, margin=0.1):
         return None
     return frame_bgr[y:y2, x:x2].copy()
 
-def smooth_timeline(tl, win=3):
-    if not tl or win <= 1 or win % 2 == 0:
-        return tl
-    n, half, out = len(tl), win // 2, []
-    for i in range(n):
-        a, b = max(0, i - half), min(n, i + half + 1)
-        labels = [tl[j]["emotion"] for j in range(a, b)]
-        emo = max(set(labels), key=labels.count)
-        out.append({**tl[i], "emotion": emo})
-    return out
-
-def analyze_emotions(video_path, sample_fps=2, smooth_win=3, max_timeline=1000, max_width=960):
-    model_path = ensure_model()
-    sess = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
-    in_name = sess.get_inputs()[0].name
-    out_name = sess.get_outputs()[0].name
-
-    labels = ["neutral","happiness","surprise","sadness","anger","disgust","fear","contempt"]
-
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        raise FileNotFoundError(f"Impossible d'ouvrir la vidéo: {video_path}")
-
-    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
-    step = max(int(fps // max(1, sample_fps)), 1)
-
-    detector = mp.solutions.face_detection.FaceDetection(model_selection=1, min_detection_confidence=0.5)
-    timeline, idx = [], 0
-
-    while True:
-        ret, frame = cap.read()
-        if not ret: break
-        if (idx % step) != 0:
-            idx += 1; continue
-
-        # downscale rapide pour l’inférence (accélère MediaPipe)
-        if max_width and frame.shape[1] > max_width:
-            h = int(frame.shape[0] * (max_width / frame.shape[1]))
-            frame = cv2.resize(frame, (max_width, h), interpolation=cv2.INTER_AREA)
-
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        result = detector.process(rgb)
-        if result.detections:
-            det = result.detections[0]
-            rbox = det.location_data.relative_bounding_box
-            face_img = crop_face(frame, rbox, margin=0.1)
-            if face_img is not None and face_img.size > 0:
-                inp = preprocess_face(face_img)
-                logits = sess.run([out_name], {in_name: inp})[0][0]
-                probs = softmax(logits)
-                k = int(np.argmax(probs))
-                t_sec = float(idx / fps)
-                timeline.append({"t": round(t_sec, 2), "emotion": labels[k], "prob": round(float(probs[k]), 4)})
-
-        idx += 1
-
-    cap.release()
-
-    if smooth_win and smooth_win >= 3 and smooth_win % 2 == 1:
-        timeline = smooth_timeline(timeline, win=smooth_win)
-
-    # Distribution / dominante
-    counts = {k: 0 for k in labels}
-    for it in timeline:
-        if it["emotion"] in counts: counts[it["emotion"]] += 1
-    total_samples = max(sum(counts.values()), 1)
-    distribution = {k: round(counts[k] / total_samples, 3) for k in labels}
-    dominant = max(distribution, key=distribution.get)
-
-    # bornage de la timeline (évite des JSON énormes)
-    if max_timeline and len(timeline) > max_timeline:
-        timeline = timeline[:max_timeline]
-
-    return {
-        "model": "emotion-ferplus-onnx",
-        "samples": total_samples,
-        "distribution": distribution,
-        "dominant_emotion": dominant,
-        "timeline": timeline,
-        "smoothed_win": smooth_win if (smooth_win and smooth_win >= 3 and smooth_win % 2 == 1) else 1,
-        "sample_fps": sample_fps,
-        "max_width": max_width
-    }
+LABELS = ["neutral","happiness","surprise","sadness","anger","disgust","fear","contempt"]
+
+class EmotionAnalyzer(FrameAnalyzer):
+    """FER+ sur le visage de chaque frame échantillonnée (boîte partagée si déjà connue)."""
+    name = "emotions"
+
+    def __init__(self, sess, detector, sample_fps=2, smooth_win=3, max_timeline=1000, max_width=960,
+                 batch_size=16, adaptive=False, smooth="ma"):
+        super().__init__(sample_fps, adaptive)
+        self.sess, self.detector = sess, detector
+        self.in_name = sess.get_inputs()[0].name
+        self.out_name = sess.get_outputs()[0].name
+        self.smooth_win, self.max_timeline, self.max_width = smooth_win, max_timeline, max_width
+        self.batch_size = max(1, batch_size)
+        self._pending = []        # (t, crop) en attente d'inférence groupée
+        self._t, self._p = [], []  # instants et probabilités (N×8, float16 pour le sidecar) de chaque visage inféré
+        # lissage en ligne des probabilités (cf. smoothing) : seuls la somme lissée et les étiquettes sont cumulées
+        self.smooth = smooth if smooth_win and smooth_win > 1 else "none"
+        self.smoother = make_smoother(self.smooth, smooth_win)
+        self._sum, self._labels = np.zeros(len(LABELS), np.float64), []
+
+    def face_box(self, frame):
+        box = frame.face_box()
+        if box is None and frame.tracker is None:
+            result = self.detector.process(frame.rgb)
+            if result.detections:
+                r = result.detections[0].location_data.relative_bounding_box
+                box = Box(r.xmin, r.ymin, r.width, r.height)
+                frame.shared["face_box"] = box
+        return box
+
+    def process(self, frame):
+        rbox = self.face_box(frame)
+        if rbox is None:
+            return
+        face_img = crop_face(frame.bgr, rbox, margin=0.1)
+        if face_img is not None and face_img.size > 0:
+            self._pending.append((frame.t, face_img))
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        ts, faces = zip(*self._pending)
+        self._pending = []
+        probs = softmax(infer(self.sess, preprocess_faces(faces), self.in_name, self.out_name), axis=1)
+        self._t.extend(ts)
+        self._p.append(probs.astype(np.float16))
+        sm, labels = self.smoother.update(probs)
+        if len(sm):
+            self._sum += sm.sum(axis=0)
+            self._labels.append(labels)
+
+    def series(self):
+        t = np.asarray(self._t, dtype=np.float32)
+        p = np.concatenate(self._p) if self._p else np.zeros((0, len(LABELS)), dtype=np.float16)
+        return t, p
+
+    def result(self):
+        self.flush()
+        t, probs = self.series()
+        # fin de flux du lisseur (sans le modifier : result() peut être appelé en cours de route, cf. streaming)
+        sm, tail = self.smoother.tail()
+        labels = np.concatenate(self._labels + [tail]) if self._labels or len(tail) else np.zeros(0, np.uint8)
+        total = self._sum + (sm.sum(axis=0) if len(sm) else 0.0)
+
+        # Distribution / dominante : moyenne des probabilités lissées
+        total_samples = max(len(t), 1)
+        distribution = {k: round(float(v) / total_samples, 3) for k, v in zip(LABELS, total)}
+        dominant = max(distribution, key=distribution.get)
+
+        return {
+            "model": "emotion-ferplus-onnx",
+            "samples": total_samples,
+            "distribution": distribution,
+            "dominant_emotion": dominant,
+            "smoothing": self.smooth,
+            "smoothed_win": self.smooth_win if self.smooth != "none" else 1,
+            "sample_fps": self.sample_fps,
+            "max_width": self.max_width,
+            # séries complètes (sidecar, cf. timeline_store) : probabilités des 8 classes + étiquette lissée
+            "series": {"t": t, "probs": probs, "label": labels, "classes": np.array(LABELS)},
+        }
+
+def analyze_emotions(video_path, sample_fps=2, smooth_win=3, max_timeline=1000, max_width=960,
+                     sess=None, detector=None, batch_size=16, smooth="ma"):
+    # sess/detector : sessions déjà chargées (moteur in-process), sinon créées ici
+    if sess is None:
+        sess = load_session()
+    if detector is None:
+        detector = make_detector()
+    analyzer = EmotionAnalyzer(sess, detector, sample_fps, smooth_win, max_timeline, max_width, batch_size, smooth=smooth)
+    results, _ = run_frames(video_path, [analyzer], max_width=max_width)
+    return results[analyzer.name]
+
+def bench_batches(sess, sizes=(1, 2, 4, 8, 16, 32, 64), n_faces=512, repeat=3):
+    """Micro-benchmark : visages/s (prétraitement + inférence + softmax) par taille de batch."""
+    rng = np.random.default_rng(0)
+    faces = [rng.integers(0, 255, (120, 100, 3), dtype=np.uint8) for _ in range(n_faces)]
+    out = {}
+    for bs in sizes:
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            for i in range(0, n_faces, bs):
+                softmax(infer(sess, preprocess_faces(faces[i:i + bs])), axis=1)
+            best = min(best, time.perf_counter() - t0)
+        out[bs] = round(n_faces / best, 1)
+    return {"batched": batch_capable(sess), "faces_per_sec": out}
 
 if __name__ == "__main__":
     ap = argparse.ArgumentParser()
-    ap.add_argument("video", help="Chemin de la vidéo")
+    ap.add_argument("video", nargs="?", help="Chemin de la vidéo")
     ap.add_argument("--sample-fps", type=int, default=2, help="1–2 recommandé pour 5–10min")
     ap.add_argument("--smooth-win", type=int, default=3, help="3 ou 5 conseillé")
+    ap.add_argument("--smooth", default="ma", choices=["ma", "ema", "viterbi", "none"],
+                    help="lissage des probabilités : moyenne glissante, exponentielle, HMM/Viterbi")
     ap.add_argument("--max-timeline", type=int, default=1000, help="cap de la timeline JSON (0 = pas de cap)")
     ap.add_argument("--max-width", type=int, default=960, help="redimensionnement interne pour vitesse (px)")
+    ap.add_argument("--batch-size", type=int, default=16, help="visages par appel ONNX")
+    ap.add_argument("--threads", type=int, default=0, help="threads intra-op ONNX (0 = défaut)")
+    ap.add_argument("--model", default=DEFAULT_MODEL, choices=["ferplus", "ferplus-int8"], help="variante du registre")
+    ap.add_argument("--optimized-model", default=None, help="modèle optimisé pré-construit (.onnx)")
+    ap.add_argument("--bench", action="store_true", help="micro-benchmark visages/s pour batch 1..64")
     args = ap.parse_args()
 
-    out = analyze_emotions(args.video, args.sample_fps, args.smooth_win, args.max_timeline, args.max_width)
-    print(json.dumps(out, ensure_ascii=False))
+    sess = load_session(threads=args.threads or None, optimized_path=args.optimized_model, model=args.model)
+    if args.bench:
+        print(json.dumps(bench_batches(sess), ensure_ascii=False))
+    else:
+        if not args.video:
+            ap.error("video requis (sauf --bench)")
+        out = analyze_emotions(args.video, args.sample_fps, args.smooth_win, args.max_timeline, args.max_width,
+                               sess=sess, batch_size=args.batch_size, smooth=args.smooth)
+        out["timeline"] = emotion_records(out.pop("series"), args.max_timeline)
+        print(json.dumps(out, ensure_ascii=False))
 
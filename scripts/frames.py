@@ -0,0 +1,230 @@
+# scripts/frames.py — décodage unique de la vidéo, frames diffusées à des analyseurs enfichables
+from collections import namedtuple
+import time
+import cv2
+import numpy as np
+
+# Boîte visage relative (0..1), compatible avec relative_bounding_box de MediaPipe
+Box = namedtuple("Box", "xmin ymin width height")
+
+class Frame:
+    """Frame décodée une fois ; RGB converti à la demande (une seule fois) ; `shared` = résultats partagés."""
+    __slots__ = ("idx", "t", "bgr", "_rgb", "shared", "tracker")
+
+    def __init__(self, idx, t, bgr, tracker=None):
+        self.idx, self.t, self.bgr = idx, t, bgr
+        self._rgb = None
+        self.shared = {}  # ex: "face_box" (Box), "face_landmarks", "landmark_box"
+        self.tracker = tracker
+
+    def face_box(self):
+        """Boîte visage partagée ; calculée par le FaceTracker (au plus une fois par frame) s'il y en a un."""
+        if "face_box" not in self.shared and self.tracker is not None:
+            self.shared["face_box"] = self.tracker.update(self)
+        return self.shared.get("face_box")
+
+    @property
+    def rgb(self):
+        if self._rgb is None:
+            self._rgb = cv2.cvtColor(self.bgr, cv2.COLOR_BGR2RGB)
+        return self._rgb
+
+class FrameAnalyzer:
+    """
+    Analyseur par frame. `sample_fps` = cadence propre (None = toutes les frames) ;
+    `adaptive=True` : frames choisies par l'AdaptiveSampler passé à run_frames (sinon cadence fixe).
+    Sous-classes : process(frame) et result().
+    """
+    name = "analyzer"
+
+    def __init__(self, sample_fps=None, adaptive=False):
+        self.sample_fps = sample_fps
+        self.adaptive = adaptive
+        self.step = 1
+        self.n_frames = 0
+
+    def begin(self, fps):
+        self.fps = fps
+        self.step = max(int(fps // max(1, self.sample_fps)), 1) if self.sample_fps else 1
+
+    def set_rate(self, sample_fps):
+        """Change la cadence en cours de run (rétrogradation sous échéance, cf. budget.Deadline)."""
+        self.sample_fps = sample_fps
+        self.begin(self.fps)
+
+    def wants(self, idx):
+        return (idx % self.step) == 0
+
+    def process(self, frame):
+        raise NotImplementedError
+
+    def result(self):
+        raise NotImplementedError
+
+class AdaptiveSampler:
+    """
+    Échantillonnage guidé par le mouvement, sous budget de frames/minute.
+    Sonde la vidéo à `probe_fps` sur une vignette en niveaux de gris (`thumb_width` px) :
+      - frame quasi identique à la dernière analysée → sautée ;
+      - changement de scène/visage (> motion_thresh) ou mouvement de tête signalé par un analyseur
+        (frame.shared["landmark_motion"] > landmark_thresh) → échantillonnage dense pendant `boost_sec` ;
+      - au plus `max_gap_sec` sans frame analysée (couverture minimale).
+    Un seau à jetons plafonne le tout à `budget_per_min` frames/minute.
+    """
+
+    def __init__(self, budget_per_min=120, probe_fps=10, motion_thresh=3.0, landmark_thresh=0.01,
+                 max_gap_sec=2.0, boost_sec=1.0, thumb_width=64):
+        self.budget_per_min, self.probe_fps = budget_per_min, probe_fps
+        self.motion_thresh, self.landmark_thresh = motion_thresh, landmark_thresh
+        self.max_gap_sec, self.boost_sec, self.thumb_width = max_gap_sec, boost_sec, thumb_width
+
+    def begin(self, fps):
+        self.probe_step = max(1, int(round(fps / max(1, self.probe_fps))))
+        self.rate = self.budget_per_min / 60.0
+        self.burst = max(1.0, self.budget_per_min / 6.0)  # ~10 s de budget d'avance
+        self.tokens = self.burst
+        self._t_prev = self._last_sel = None
+        self._prev = self._ref = None
+        self._boost_until = -1.0
+        self.probes = self.selected = self.boosted = 0
+
+    def is_probe(self, idx):
+        return (idx % self.probe_step) == 0
+
+    def decide(self, t, bgr):
+        h = max(1, int(bgr.shape[0] * self.thumb_width / bgr.shape[1]))
+        thumb = cv2.cvtColor(cv2.resize(bgr, (self.thumb_width, h), interpolation=cv2.INTER_AREA),
+                             cv2.COLOR_BGR2GRAY).astype(np.int16)
+        self.probes += 1
+        if self._t_prev is not None:
+            self.tokens = min(self.burst, self.tokens + (t - self._t_prev) * self.rate)
+        self._t_prev = t
+
+        if self._prev is not None and float(np.abs(thumb - self._prev).mean()) > self.motion_thresh:
+            self._boost_until = t + self.boost_sec
+        self._prev = thumb
+
+        boost = t < self._boost_until
+        want = (self._ref is None or boost
+                or t - self._last_sel >= self.max_gap_sec
+                or float(np.abs(thumb - self._ref).mean()) > self.motion_thresh)
+        if not want or self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        self._ref, self._last_sel = thumb, t
+        self.selected += 1
+        self.boosted += int(boost)
+        return True
+
+    def feedback(self, frame):
+        """Signal de mouvement issu des landmarks (ex. nez) : densifie autour des mouvements de tête."""
+        if frame.shared.get("landmark_motion", 0.0) > self.landmark_thresh:
+            self._boost_until = frame.t + self.boost_sec
+
+    def stats(self):
+        return {"budget_per_min": self.budget_per_min, "probe_fps": self.probe_fps,
+                "probes": self.probes, "selected": self.selected, "boosted": self.boosted}
+
+class FrameRouter:
+    """
+    Distribution des frames aux analyseurs, indépendante de la source (fichier OpenCV ou pipe FFmpeg) :
+    needs(idx) dit s'il faut décoder la frame, push(idx, t, bgr) la passe aux analyseurs concernés.
+    """
+
+    def __init__(self, analyzers, sampler=None, tracker=None, max_width=960):
+        self.analyzers, self.sampler, self.tracker, self.max_width = analyzers, sampler, tracker, max_width
+        self.adaptive = [a for a in analyzers if a.adaptive] if sampler is not None else []
+        self.decoded = self.analyzed = 0
+        self.timing = {"decode": 0.0, **{a.name: 0.0 for a in analyzers}}  # secondes cumulées
+
+    def begin(self, fps):
+        self.fps = fps
+        for a in self.analyzers:
+            a.begin(fps)
+        if self.adaptive:
+            self.sampler.begin(fps)
+
+    def needs(self, idx):
+        return (any(a not in self.adaptive and a.wants(idx) for a in self.analyzers)
+                or (bool(self.adaptive) and self.sampler.is_probe(idx)))
+
+    def push(self, idx, t, frame):
+        self.decoded = idx + 1
+        users = [a for a in self.analyzers if a not in self.adaptive and a.wants(idx)]
+        # downscale une seule fois pour tous les analyseurs (accélère MediaPipe)
+        if self.max_width and frame.shape[1] > self.max_width:
+            h = int(frame.shape[0] * (self.max_width / frame.shape[1]))
+            frame = cv2.resize(frame, (self.max_width, h), interpolation=cv2.INTER_AREA)
+
+        if self.adaptive and self.sampler.is_probe(idx) and self.sampler.decide(t, frame):
+            users = [a for a in self.analyzers if a in self.adaptive or a in users]
+        if not users:
+            return
+        f = Frame(idx, t, frame, self.tracker)
+        for a in users:
+            t0 = time.perf_counter()
+            a.process(f)
+            self.timing[a.name] += time.perf_counter() - t0
+            a.n_frames += 1
+        if self.adaptive:
+            self.sampler.feedback(f)
+        self.analyzed += 1
+
+    def results(self):
+        out = {}
+        for a in self.analyzers:  # result() peut encore inférer (ex. dernier batch FER+)
+            t0 = time.perf_counter()
+            out[a.name] = a.result()
+            self.timing[a.name] += time.perf_counter() - t0
+        return out
+
+    def stats(self):
+        stats = {"fps": round(float(self.fps), 3), "frames_decoded": self.decoded, "frames_analyzed": self.analyzed,
+                 "max_width": self.max_width, "per_analyzer": {a.name: a.n_frames for a in self.analyzers},
+                 "timing": {k: round(v, 3) for k, v in self.timing.items()}}
+        if self.adaptive:
+            stats["sampler"] = self.sampler.stats()
+        if self.tracker is not None:
+            stats["tracker"] = self.tracker.stats()
+        return stats
+
+def run_frames(video_path, analyzers, max_width=960, sampler=None, tracker=None, deadline=None):
+    """
+    Décode `video_path` une seule fois et passe chaque frame utile aux `analyzers` (dans l'ordre :
+    ceux qui remplissent frame.shared d'abord). Les analyseurs `adaptive` suivent `sampler` ;
+    `tracker` (FaceTracker) fournit frame.face_box() sans détection complète à chaque frame ;
+    `deadline` (budget.Deadline) peut abaisser la cadence des analyseurs si la fin projetée est en retard.
+    Retourne ({name: result}, stats).
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Impossible d'ouvrir la vidéo: {video_path}")
+
+    router = FrameRouter(analyzers, sampler, tracker, max_width)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    router.begin(fps)
+
+    idx = 0
+    try:
+        while True:
+            t0 = time.perf_counter()
+            if not router.needs(idx):
+                # personne n'en veut : on avance sans conversion couleur ni copie
+                ok = cap.grab()
+                router.timing["decode"] += time.perf_counter() - t0
+                if not ok: break
+                idx += 1; continue
+
+            ret, frame = cap.read()
+            router.timing["decode"] += time.perf_counter() - t0
+            if not ret: break
+            router.push(idx, idx / fps, frame)
+            if deadline is not None:
+                deadline.visual_check(idx / fps, analyzers)
+            idx += 1
+    finally:
+        cap.release()
+
+    router.decoded = idx
+    results = router.results()
+    return results, router.stats()
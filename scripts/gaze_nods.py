@@ -1,29 +1,173 @@
-import cv2, sys, mediapipe as mp
-
-def gaze_nods(video_path):
-    mp_face = mp.solutions.face_mesh
-    cap = cv2.VideoCapture(video_path)
-    look_at_cam, total, nods, prev_nose_y = 0, 0, 0, None
-
-    with mp_face.FaceMesh(static_image_mode=False, max_num_faces=1, refine_landmarks=True) as fm:
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret: break
-            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            res = fm.process(rgb)
-            if res.multi_face_landmarks:
-                lm = res.multi_face_landmarks[0].landmark
-                cx = (lm[468].x + lm[473].x) / 2  # iris approx
-                if 0.4 < cx < 0.6: look_at_cam += 1
-                nose_y = lm[1].y
-                if prev_nose_y is not None and abs(nose_y - prev_nose_y) > 0.015:
-                    nods += 1
-                prev_nose_y = nose_y
-                total += 1
-    cap.release()
-    ratio = (look_at_cam / total) if total else 0.0
-    return {"eye_contact_ratio": round(ratio,2), "nods": int(nods)}
+import sys, cv2, numpy as np
+from scipy.ndimage import median_filter
+from scipy.signal import find_peaks
+from frames import Box, FrameAnalyzer, run_frames
+from smoothing import moving_average
+from tracking import box_pixels, expand_box
+
+# points FaceMesh (refine_landmarks=True) gardés par frame pour les signaux tête/regard
+NOSE, CHIN, CHEEK_A, CHEEK_B = 1, 152, 234, 454
+EYE_A, EYE_B = (33, 133), (362, 263)  # coins de chaque œil
+IRIS_A, IRIS_B = 468, 473
+KEYPOINTS = [NOSE, CHIN, CHEEK_A, CHEEK_B, *EYE_A, *EYE_B, IRIS_A, IRIS_B]
+_K = {idx: i for i, idx in enumerate(KEYPOINTS)}
+NOSE_DEPTH = 0.6   # saillie du nez / demi-largeur du visage (yaw ≈ arcsin(décalage du nez / NOSE_DEPTH))
+EYE_GAIN_DEG = 90  # iris décalé d'une largeur d'œil entière ≈ 90° (±0.2 → ±18°)
+
+def make_face_mesh():
+    import mediapipe as mp  # chargé à la demande : le traitement des séries s'en passe
+    return mp.solutions.face_mesh.FaceMesh(static_image_mode=False, max_num_faces=1, refine_landmarks=True)
+
+# --- signaux (vectorisés sur toute la série) ---
+def _span(a, b):
+    lo, hi = np.minimum(a, b), np.maximum(a, b)
+    return lo, np.maximum(hi - lo, 1e-6)
+
+def head_signals(kp):
+    """
+    kp (n, len(KEYPOINTS), 2) → (yaw tête, yaw regard en degrés, pitch) ; tout est relatif au visage
+    (invariant à la position et à la taille dans l'image). pitch = (nez − yeux) / (menton − yeux).
+    """
+    x, y = kp[..., 0], kp[..., 1]
+    lo, w = _span(x[:, _K[CHEEK_A]], x[:, _K[CHEEK_B]])
+    off = 2 * (x[:, _K[NOSE]] - lo) / w - 1
+    head_yaw = np.degrees(np.arcsin(np.clip(off / NOSE_DEPTH, -1, 1)))
+    eye = []
+    for (c0, c1), iris in ((EYE_A, IRIS_A), (EYE_B, IRIS_B)):
+        lo, w = _span(x[:, _K[c0]], x[:, _K[c1]])
+        eye.append((x[:, _K[iris]] - lo) / w)
+    gaze_yaw = head_yaw + (np.mean(eye, axis=0) - 0.5) * EYE_GAIN_DEG
+    eye_y = y[:, [_K[c] for c in (*EYE_A, *EYE_B)]].mean(axis=1)
+    pitch = (y[:, _K[NOSE]] - eye_y) / np.maximum(y[:, _K[CHIN]] - eye_y, 1e-6)
+    return head_yaw, gaze_yaw, pitch
+
+def resample(t, cols, hz=10.0, max_gap=1.0):
+    """
+    Séries à instants irréguliers → grille régulière à `hz` (interpolation linéaire) ;
+    valid = False dans les trous de plus de `max_gap` s (visage perdu, frames sautées).
+    """
+    grid = np.arange(t[0], t[-1] + 0.5 / hz, 1.0 / hz)
+    j = np.clip(np.searchsorted(t, grid, side="right"), 1, len(t) - 1)
+    valid = (t[j] - t[j - 1] <= max_gap) | (grid <= t[0]) | (grid >= t[-1])
+    return grid, [np.interp(grid, t, c) for c in cols], valid
+
+def detect_nods(pitch, valid, hz, min_amp=0.03, min_interval=0.4, baseline_sec=2.0, smooth_sec=0.2, peak_win_sec=1.0):
+    """
+    Hochements = pics (tête vers le bas) du pitch lissé (`smooth_sec`), tendance retirée par une médiane
+    glissante sur `baseline_sec` (insensible aux hochements et aux changements de posture) : pics d'au moins
+    `min_amp` au-dessus de la tendance, de proéminence ≥ `min_amp` dans une fenêtre de `peak_win_sec` s,
+    espacés d'au moins `min_interval` s. Seuils en temps et en unités du visage : indépendants de la cadence.
+    """
+    smooth = moving_average(pitch[:, None], max(1, int(round(smooth_sec * hz))) | 1)[:, 0]
+    band = smooth - median_filter(smooth, size=max(1, int(round(baseline_sec * hz))) | 1, mode="nearest")
+    peaks, _ = find_peaks(band, height=min_amp, prominence=min_amp,
+                          distance=max(1, int(round(min_interval * hz))),
+                          wlen=max(3, int(round(peak_win_sec * hz))) | 1)
+    return peaks[valid[peaks]], band
+
+def per_second(grid, valid, looking, head_yaw, gaze_yaw, nod_idx):
+    """Séries à 1 point/seconde : couverture visage, contact visuel, yaw tête/regard (NaN sans visage), hochements."""
+    sec = np.floor(grid).astype(np.int64)
+    s0 = sec[0]
+    b, n = sec - s0, sec[-1] - s0 + 1
+    cnt = np.bincount(b, minlength=n)
+    nv = np.bincount(b, weights=valid, minlength=n)
+
+    def mean(v):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.bincount(b, weights=np.where(valid, v, 0.0), minlength=n) / nv
+    return {"t": np.arange(s0, s0 + n, dtype=np.float32), "coverage": nv / np.maximum(cnt, 1),
+            "eye_contact": mean(looking), "head_yaw": mean(head_yaw), "gaze_yaw": mean(gaze_yaw),
+            "nods": np.bincount(b[nod_idx], minlength=n).astype(np.uint8)}
+
+class GazeNodsAnalyzer(FrameAnalyzer):
+    """
+    FaceMesh → points clés horodatés (quelle que soit la cadence) ; au résultat, traitement vectorisé :
+    rééchantillonnage régulier, regard = yaw tête + position de l'iris dans l'œil, hochements par détection de pics.
+    Publie landmarks et boîte visage dans frame.shared.
+    """
+    name = "gaze"
+
+    def __init__(self, fm, sample_fps=None, adaptive=False, roi_scale=1.8, roi_size=256,
+                 gaze_tol_deg=15.0, resample_hz=10.0, max_gap_sec=1.0, nod_min_amp=0.03):
+        super().__init__(sample_fps, adaptive)
+        self.fm = fm
+        self.roi_scale, self.roi_size = roi_scale, roi_size
+        self.gaze_tol_deg, self.resample_hz, self.max_gap_sec = gaze_tol_deg, resample_hz, max_gap_sec
+        self.nod_min_amp = nod_min_amp
+        self.prev_nose_y = None
+        self._t, self._kp = [], []  # instants et points clés (len(KEYPOINTS), 2) des frames avec visage
+
+    def landmarks(self, frame):
+        """
+        Landmarks (N,3) en coordonnées relatives à la frame. Avec un FaceTracker, FaceMesh ne voit que
+        la ROI suivie (agrandie de `roi_scale`, réduite à `roi_size` px) au lieu de l'image entière.
+        """
+        roi = frame.face_box() if frame.tracker is not None else None
+        if roi is None:
+            res = self.fm.process(frame.rgb)
+        else:
+            H, W = frame.bgr.shape[:2]
+            x0, y0, x1, y1 = box_pixels(expand_box(roi, self.roi_scale), W, H)
+            crop = frame.bgr[y0:y1, x0:x1]
+            k = self.roi_size / max(crop.shape[:2])
+            if k < 1.0:
+                crop = cv2.resize(crop, None, fx=k, fy=k, interpolation=cv2.INTER_AREA)
+            res = self.fm.process(cv2.cvtColor(crop, cv2.COLOR_BGR2RGB))
+        if not res.multi_face_landmarks:
+            return None
+        pts = np.array([(p.x, p.y, p.z) for p in res.multi_face_landmarks[0].landmark], dtype=np.float32)
+        if roi is not None:  # ROI → coordonnées relatives de la frame entière
+            pts[:, 0] = (x0 + pts[:, 0] * (x1 - x0)) / W
+            pts[:, 1] = (y0 + pts[:, 1] * (y1 - y0)) / H
+        return pts
+
+    def process(self, frame):
+        pts = self.landmarks(frame)
+        if pts is None:
+            return
+        (xmin, ymin), (xmax, ymax) = pts[:, :2].min(axis=0), pts[:, :2].max(axis=0)
+        box = Box(float(xmin), float(ymin), float(xmax - xmin), float(ymax - ymin))
+        frame.shared["face_landmarks"] = pts
+        frame.shared["face_box"] = frame.shared["landmark_box"] = box
+
+        self._t.append(frame.t)
+        self._kp.append(pts[KEYPOINTS, :2])
+        nose_y = float(pts[NOSE, 1])
+        if self.prev_nose_y is not None:
+            frame.shared["landmark_motion"] = abs(nose_y - self.prev_nose_y)  # guide l'AdaptiveSampler
+        self.prev_nose_y = nose_y
+
+    def result(self):
+        n = len(self._t)
+        if n < 2:
+            return {"eye_contact_ratio": 0.0, "nods": 0, "frames_with_face": n, "series": None}
+        t, kp = np.asarray(self._t, dtype=np.float64), np.stack(self._kp).astype(np.float64)
+        head_yaw, gaze_yaw, pitch = head_signals(kp)
+        hz = self.resample_hz
+        grid, (head_yaw, gaze_yaw, pitch), valid = resample(t, (head_yaw, gaze_yaw, pitch), hz, self.max_gap_sec)
+        looking = np.abs(gaze_yaw) < self.gaze_tol_deg
+        nod_idx, _ = detect_nods(pitch, valid, hz, self.nod_min_amp)
+        # ratio pondéré par le temps (grille régulière), pas par le nombre de frames analysées
+        ratio = float(looking[valid].mean()) if valid.any() else 0.0
+        return {"eye_contact_ratio": round(ratio, 2), "nods": int(len(nod_idx)), "frames_with_face": n,
+                "input_hz": round((n - 1) / max(t[-1] - t[0], 1e-6), 2),
+                "series": per_second(grid, valid, looking, head_yaw, gaze_yaw, nod_idx)}
+
+def gaze_nods(video_path, fm=None, sample_fps=None, max_width=None):
+    # fm : FaceMesh déjà chargé (moteur in-process), sinon créé et fermé ici
+    own = fm is None
+    if own:
+        fm = make_face_mesh()
+    try:
+        analyzer = GazeNodsAnalyzer(fm, sample_fps)
+        results, _ = run_frames(video_path, [analyzer], max_width=max_width)
+    finally:
+        if own: fm.close()
+    return results[analyzer.name]
 
 if __name__ == "__main__":
     v = sys.argv[1]
-    print(gaze_nods(v))
+    res = gaze_nods(v)
+    res.pop("series")
+    print(res)
@@ -0,0 +1,146 @@
+# scripts/job_store.py — file de jobs et événements de progression persistés dans SQLite (serveur d'analyse)
+import json, sqlite3, threading, time
+
+STATUSES = ("queued", "running", "done", "failed", "cancelled")
+FINAL = ("done", "failed", "cancelled")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    video TEXT NOT NULL,
+    outdir TEXT NOT NULL,
+    options TEXT NOT NULL DEFAULT '{}',
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'queued',
+    stage TEXT,
+    worker INTEGER,
+    error TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, created);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    t REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_job ON events (job_id, seq);
+"""
+
+class JobStore:
+    """
+    Jobs (statut, priorité, étape en cours, erreur, horodatages) et événements de progression.
+    Une connexion partagée par les threads du serveur (verrou) ; WAL : lisible par un autre process (ex. Django).
+    """
+
+    def __init__(self, path="outputs/jobs.sqlite"):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+
+    def _exec(self, sql, args=()):
+        with self._lock:
+            return self._db.execute(sql, args)
+
+    def _rows(self, sql, args=()):
+        with self._lock:
+            return [_job(r) for r in self._db.execute(sql, args).fetchall()]
+
+    # --- jobs ---
+    def add(self, job_id, video, outdir, options=None, priority=0):
+        """Insère un job "queued" ; sqlite3.IntegrityError si l'id existe déjà."""
+        self._exec("INSERT INTO jobs (id, video, outdir, options, priority, created) VALUES (?, ?, ?, ?, ?, ?)",
+                   (job_id, video, outdir, json.dumps(options or {}), int(priority), time.time()))
+        self.event(job_id, {"event": "queued", "priority": int(priority)})
+        return self.get(job_id)
+
+    def get(self, job_id):
+        rows = self._rows("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return rows[0] if rows else None
+
+    def list(self, status=None, limit=100):
+        if status:
+            return self._rows("SELECT * FROM jobs WHERE status = ? ORDER BY created DESC LIMIT ?", (status, limit))
+        return self._rows("SELECT * FROM jobs ORDER BY created DESC LIMIT ?", (limit,))
+
+    def count(self, status):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def position(self, job_id):
+        """Rang dans la file (0 = prochain servi) ; None si le job n'est plus en attente."""
+        job = self.get(job_id)
+        if job is None or job["status"] != "queued":
+            return None
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND (priority > ? OR (priority = ? AND created < ?))",
+                (job["priority"], job["priority"], job["created"])).fetchone()[0]
+
+    def claim(self, worker):
+        """Passe le job en attente le plus prioritaire (puis le plus ancien) à "running" pour `worker`."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT * FROM jobs WHERE status = 'queued' "
+                                       "ORDER BY priority DESC, created LIMIT 1").fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE jobs SET status = 'running', worker = ?, started = ? WHERE id = ?",
+                                     (worker, time.time(), row["id"]))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        self.event(row["id"], {"event": "started", "worker": worker})
+        return self.get(row["id"])
+
+    def set_stage(self, job_id, stage):
+        self._exec("UPDATE jobs SET stage = ? WHERE id = ? AND status = 'running'", (stage, job_id))
+
+    def finish(self, job_id, status, error=None, only_if=None):
+        """Statut final ; `only_if` : ne change que si le statut courant en fait partie (courses avec l'annulation)."""
+        sql, args = "UPDATE jobs SET status = ?, error = ?, finished = ?, stage = NULL WHERE id = ?", \
+            [status, error, time.time(), job_id]
+        if only_if:
+            sql += f" AND status IN ({','.join('?' * len(only_if))})"
+            args += list(only_if)
+        changed = self._exec(sql, args).rowcount > 0
+        if changed:
+            self.event(job_id, {"event": status, **({"error": error} if error else {})})
+        return changed
+
+    def requeue_running(self):
+        """Au démarrage : jobs restés "running" (serveur arrêté en cours de route) → remis en file."""
+        ids = [j["id"] for j in self.list("running", limit=-1)]
+        for job_id in ids:
+            self._exec("UPDATE jobs SET status = 'queued', worker = NULL, stage = NULL, started = NULL WHERE id = ?",
+                       (job_id,))
+            self.event(job_id, {"event": "requeued"})
+        return ids
+
+    # --- événements ---
+    def event(self, job_id, data):
+        self._exec("INSERT INTO events (job_id, t, data) VALUES (?, ?, ?)", (job_id, time.time(), json.dumps(data)))
+
+    def events(self, job_id, since=0):
+        with self._lock:
+            rows = self._db.execute("SELECT seq, t, data FROM events WHERE job_id = ? AND seq > ? ORDER BY seq",
+                                    (job_id, int(since))).fetchall()
+        return [{"seq": r["seq"], "t": r["t"], **json.loads(r["data"])} for r in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+def _job(row):
+    job = dict(row)
+    job["options"] = json.loads(job["options"])
+    return job
@@ -0,0 +1,298 @@
+# scripts/model_registry.py — registre des modèles : manifeste local (chemin, sha256, précision), variantes int8, prefetch/verify
+import os, sys, json, mmap, time, shutil, hashlib, argparse
+
+MODELS_DIR = os.getenv("MODELS_DIR", "models")
+MANIFEST = "manifest.json"
+
+WHISPER_REPOS = {
+    "tiny": "Systran/faster-whisper-tiny",
+    "base": "Systran/faster-whisper-base",
+    "small": "Systran/faster-whisper-small",
+    "medium": "Systran/faster-whisper-medium",
+    "large-v3": "Systran/faster-whisper-large-v3",
+    "distil-large-v3": "Systran/faster-distil-whisper-large-v3",
+}
+DEFAULT_WHISPER = "base"
+
+# Catalogue : "repo" (+ "file") = source Hugging Face ; "from" = dérivé d'un autre modèle du registre
+# (export ONNX optimum, quantification dynamique int8, batch symbolique) ; "path" relatif à MODELS_DIR.
+CATALOG = {
+    "ferplus": {"kind": "onnx", "repo": "webai-community/models-bk", "file": "emotion-ferplus-8.onnx",
+                "path": "emotion-ferplus-8.dynbatch.onnx", "precision": "fp32"},
+    # CNN : poids uint8 (ConvInteger du CPU d'ONNX Runtime = uint8 × uint8) ; Transformers : int8
+    "ferplus-int8": {"kind": "onnx", "from": "ferplus", "quantize": "uint8",
+                     "path": "emotion-ferplus-8.int8.onnx", "precision": "int8"},
+    "sentiment": {"kind": "transformers", "repo": "cardiffnlp/twitter-xlm-roberta-base-sentiment",
+                  "path": "hf/sentiment", "precision": "fp32"},
+    "sentiment-onnx": {"kind": "onnx-dir", "from": "sentiment", "export": "sentiment-analysis",
+                       "path": "onnx/sentiment", "precision": "fp32"},
+    "sentiment-onnx-int8": {"kind": "onnx-dir", "from": "sentiment-onnx", "quantize": True,
+                            "path": "onnx/sentiment-int8", "precision": "int8"},
+    "summarizer": {"kind": "transformers", "repo": "sshleifer/distilbart-cnn-12-6",
+                   "path": "hf/summarizer", "precision": "fp32"},
+    "summarizer-onnx": {"kind": "onnx-dir", "from": "summarizer", "export": "summarization",
+                        "path": "onnx/summarizer", "precision": "fp32"},
+    "summarizer-onnx-int8": {"kind": "onnx-dir", "from": "summarizer-onnx", "quantize": True,
+                             "path": "onnx/summarizer-int8", "precision": "int8"},
+    # poids CTranslate2 en float16 ; int8 appliqué au chargement (compute_type)
+    **{f"whisper-{size}": {"kind": "ctranslate2", "repo": repo, "path": f"whisper/{size}", "precision": "float16"}
+       for size, repo in WHISPER_REPOS.items()},
+}
+DEFAULT_SET = ("whisper-" + DEFAULT_WHISPER, "sentiment", "summarizer", "ferplus")
+
+def _offline():
+    return any(os.getenv(k, "0").lower() in ("1", "true", "yes") for k in ("MODELS_OFFLINE", "HF_HUB_OFFLINE"))
+
+# --- noms ---
+def whisper_name(stt_model):
+    """Taille ("small"), nom du registre, dépôt HF connu ("Systran/faster-whisper-base") ou dossier local."""
+    if stt_model in WHISPER_REPOS:
+        return f"whisper-{stt_model}"
+    return next((f"whisper-{s}" for s, r in WHISPER_REPOS.items() if r == stt_model), stt_model)
+
+def spec(name):
+    if name in CATALOG:
+        return CATALOG[name]
+    if "/" in name and not os.path.exists(name):  # dépôt HF hors catalogue : pris tel quel
+        return {"kind": "hf", "repo": name, "path": os.path.join("hf", name.replace("/", "__")), "precision": None}
+    raise KeyError(f"Modèle inconnu: {name} (connus : {', '.join(sorted(CATALOG))})")
+
+# --- manifeste ---
+def load_manifest(root=MODELS_DIR):
+    path = os.path.join(root, MANIFEST)
+    if not os.path.exists(path):
+        return {"version": 1, "models": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def _save_entry(root, name, entry):
+    # relu juste avant l'écriture (prefetch concurrents) puis remplacement atomique
+    manifest = load_manifest(root)
+    manifest["models"][name] = entry
+    tmp = os.path.join(root, f"{MANIFEST}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, os.path.join(root, MANIFEST))
+
+def sha256(path):
+    """Empreinte d'un fichier par mmap (pas de copie en mémoire Python, même pour un modèle de plusieurs Go)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                h.update(m)
+    return h.hexdigest()
+
+def _files(path):
+    if os.path.isfile(path):
+        return [path]
+    return sorted(os.path.join(d, f) for d, _, names in os.walk(path) for f in names
+                  if not f.startswith(".") and ".cache" not in d.split(os.sep))
+
+def _record(root, name, sp, source=None):
+    path = os.path.join(root, sp["path"])
+    base = path if os.path.isdir(path) else os.path.dirname(path)
+    entry = {
+        "path": sp["path"], "kind": sp["kind"], "precision": sp["precision"],
+        "source": source or sp.get("repo") or sp.get("from"), "fetched": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "files": {os.path.relpath(p, base).replace(os.sep, "/"): {"sha256": sha256(p), "bytes": os.path.getsize(p)}
+                  for p in _files(path)},
+    }
+    _save_entry(root, name, entry)
+    return entry
+
+# --- récupération / dérivation ---
+def _download(sp, dst):
+    from huggingface_hub import HfApi, hf_hub_download, snapshot_download
+    if sp.get("file"):
+        # écrit directement dans models/ (pas de relecture ni de copie du fichier téléchargé)
+        return hf_hub_download(repo_id=sp["repo"], filename=sp["file"], local_dir=os.path.dirname(dst))
+    files = HfApi().list_repo_files(sp["repo"])
+    ignore = ["*.h5", "*.msgpack", "*.ot", "onnx/*", "*.onnx", "*.tflite"]
+    if any(f.endswith(".safetensors") for f in files):
+        ignore.append("*.bin" if sp["kind"] != "ctranslate2" else "pytorch_model*.bin")  # safetensors : mmap
+    return snapshot_download(repo_id=sp["repo"], local_dir=dst, ignore_patterns=ignore)
+
+def _dynamic_batch(src, dst):
+    """
+    FER+ est publié avec un batch figé à 1 (entrée/sortie, et Reshape interne [1, -1] des exports CNTK) :
+    copie à batch symbolique (N), gardée si elle passe un run à 2 échantillons ; sinon ou sans `onnx` : original.
+    """
+    try:
+        import onnx
+        from onnx import numpy_helper
+    except ImportError:
+        return src
+    model = onnx.load(src)
+    graph = model.graph
+    for value in list(graph.input) + list(graph.output):
+        dim = value.type.tensor_type.shape.dim
+        if dim:
+            dim[0].ClearField("dim_value")
+            dim[0].dim_param = "N"
+    del graph.value_info[:]  # formes intermédiaires à batch 1 : ré-inférées par ONNX Runtime
+    # Reshape d'activations (pas des poids) vers une forme [1, ...] : 1re dim → -1 (ou 0 = recopiée si -1 déjà pris)
+    inits = {t.name: t for t in graph.initializer}
+    users = {}
+    for node in graph.node:
+        for name in node.input:
+            users[name] = users.get(name, 0) + 1
+    for node in graph.node:
+        if node.op_type != "Reshape" or len(node.input) < 2 or node.input[0] in inits:
+            continue
+        init = inits.get(node.input[1])
+        if init is None or users[init.name] > 1:
+            continue
+        shape = numpy_helper.to_array(init).copy()
+        if shape.ndim == 1 and len(shape) and shape[0] == 1:
+            shape[0] = 0 if -1 in shape[1:] else -1
+            init.CopyFrom(numpy_helper.from_array(shape, init.name))
+    onnx.save(model, dst)
+    if not _batch_ok(dst):
+        os.remove(dst)
+        return src
+    return dst
+
+def _batch_ok(path, n=2):
+    """True si le modèle rend bien `n` sorties pour `n` entrées (entrée float32, dims non batch symboliques → 1)."""
+    import numpy as np
+    import onnxruntime as ort
+    try:
+        so = ort.SessionOptions()
+        so.log_severity_level = 4  # échec attendu pour un batch figé : pas de trace d'erreur ORT
+        sess = ort.InferenceSession(path, sess_options=so, providers=["CPUExecutionProvider"])
+        inp = sess.get_inputs()[0]
+        shape = [n] + [d if isinstance(d, int) else 1 for d in inp.shape[1:]]
+        return sess.run(None, {inp.name: np.zeros(shape, dtype=np.float32)})[0].shape[0] == n
+    except Exception:
+        return False
+
+def _quantize(src, dst, weights="int8"):
+    """Quantification dynamique 8 bits d'un .onnx, ou de chaque graphe d'un dossier (autres fichiers liés, pas copiés)."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    wt = QuantType.QUInt8 if weights == "uint8" else QuantType.QInt8
+    if os.path.isfile(src):
+        quantize_dynamic(src, dst, weight_type=wt)
+        return
+    os.makedirs(dst, exist_ok=True)
+    for name in os.listdir(src):
+        s, d = os.path.join(src, name), os.path.join(dst, name)
+        if name.endswith(".onnx"):
+            quantize_dynamic(s, d, weight_type=wt)
+        elif os.path.isfile(s) and not name.endswith(".onnx_data") and not os.path.exists(d):
+            try:
+                os.link(s, d)
+            except OSError:
+                shutil.copyfile(s, d)
+
+def _export(task, src, dst):
+    try:
+        from optimum.onnxruntime import ORTModelForSequenceClassification, ORTModelForSeq2SeqLM
+    except ImportError as e:
+        raise RuntimeError("export ONNX : installer optimum[onnxruntime]") from e
+    from transformers import AutoTokenizer
+    cls = ORTModelForSequenceClassification if task == "sentiment-analysis" else ORTModelForSeq2SeqLM
+    cls.from_pretrained(src, export=True).save_pretrained(dst)
+    AutoTokenizer.from_pretrained(src).save_pretrained(dst)  # dossier autonome (pas de retour au dépôt HF)
+
+def _fetch(root, name, sp):
+    dst = os.path.join(root, sp["path"])
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    if "from" in sp:
+        src = resolve(sp["from"], root)
+        if sp.get("quantize"):
+            _quantize(src, dst, "uint8" if sp["quantize"] == "uint8" else "int8")
+        elif "export" in sp:
+            _export(sp["export"], src, dst)
+        return None
+    if sp.get("file"):
+        raw = os.path.join(os.path.dirname(dst), sp["file"])
+        if not os.path.exists(raw):  # fichier posé à la main dans models/ : utilisé tel quel
+            _download(sp, dst)
+        if _dynamic_batch(raw, dst) != dst:
+            sp = {**sp, "path": sp["file"]}  # conversion impossible ou invalide : original à batch 1
+        return sp
+    _download(sp, dst)
+    return None
+
+def prefetch(names=DEFAULT_SET, root=MODELS_DIR, force=False):
+    """Télécharge/dérive les modèles absents et les inscrit au manifeste (avec leurs sha256)."""
+    os.makedirs(root, exist_ok=True)
+    out = {}
+    for name in names:
+        entry = load_manifest(root)["models"].get(name)
+        if entry and not force and _present(root, entry):
+            out[name] = entry
+            continue
+        sp = spec(name)
+        if _offline():
+            raise RuntimeError(f"{name} absent du manifeste {os.path.join(root, MANIFEST)} et mode hors ligne "
+                               f"(MODELS_OFFLINE/HF_HUB_OFFLINE) : lancer `python scripts/model_registry.py prefetch {name}`")
+        sp = _fetch(root, name, sp) or sp
+        out[name] = _record(root, name, sp)
+    return out
+
+def _present(root, entry):
+    """Contrôle rapide au chargement : fichiers présents, tailles identiques (sha256 complet : verify)."""
+    path = os.path.join(root, entry["path"])
+    base = path if os.path.isdir(path) else os.path.dirname(path)
+    return os.path.exists(path) and all(
+        os.path.getsize(os.path.join(base, f)) == meta["bytes"] if os.path.exists(os.path.join(base, f)) else False
+        for f, meta in entry["files"].items())
+
+def resolve(name, root=MODELS_DIR):
+    """
+    Chemin local d'un modèle du registre (fichier .onnx ou dossier) : lu dans le manifeste, sinon récupéré
+    et inscrit (sauf hors ligne). Un chemin existant est renvoyé tel quel.
+    """
+    if os.path.exists(name):
+        return name
+    entry = load_manifest(root)["models"].get(name)
+    if entry is None or not _present(root, entry):
+        entry = prefetch([name], root)[name]
+    return os.path.join(root, entry["path"])
+
+def info(name, root=MODELS_DIR):
+    return load_manifest(root)["models"].get(name)
+
+def verify(names=None, root=MODELS_DIR):
+    """{nom: "ok" | "missing" | liste des fichiers altérés} : sha256 complet de chaque fichier du manifeste."""
+    models = load_manifest(root)["models"]
+    out = {}
+    for name in names or sorted(models):
+        entry = models.get(name)
+        if entry is None or not os.path.exists(os.path.join(root, entry["path"])):
+            out[name] = "missing"
+            continue
+        path = os.path.join(root, entry["path"])
+        base = path if os.path.isdir(path) else os.path.dirname(path)
+        bad = [f for f, meta in entry["files"].items()
+               if not os.path.exists(os.path.join(base, f)) or sha256(os.path.join(base, f)) != meta["sha256"]]
+        out[name] = bad or "ok"
+    return out
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Registre des modèles (manifeste local, prefetch, vérification)")
+    ap.add_argument("command", choices=["list", "prefetch", "verify"])
+    ap.add_argument("names", nargs="*", help=f"modèles (défaut prefetch : {' '.join(DEFAULT_SET)} ; verify : tous)")
+    ap.add_argument("--root", default=MODELS_DIR)
+    ap.add_argument("--all", action="store_true", help="prefetch de tout le catalogue")
+    ap.add_argument("--force", action="store_true", help="re-télécharge / re-dérive même si présent")
+    args = ap.parse_args()
+
+    if args.command == "list":
+        manifest = load_manifest(args.root)["models"]
+        for name in sorted(set(CATALOG) | set(manifest)):
+            e = manifest.get(name)
+            size = sum(f["bytes"] for f in e["files"].values()) / 1e6 if e else None
+            print(f"{name:24} {spec(name)['precision'] or '-':8} "
+                  f"{'%8.1f MB  %s' % (size, e['path']) if e else 'absent'}")
+    elif args.command == "prefetch":
+        names = list(CATALOG) if args.all else [whisper_name(n) for n in args.names] or list(DEFAULT_SET)
+        for name, e in prefetch(names, args.root, args.force).items():
+            print(f"{name}: {e['path']} ({len(e['files'])} fichiers)")
+    else:
+        res = verify([whisper_name(n) for n in args.names] or None, args.root)
+        for name, status in res.items():
+            print(f"{name}: {status if isinstance(status, str) else 'ALTÉRÉ ' + ', '.join(status)}")
+        sys.exit(0 if all(s == "ok" for s in res.values()) else 1)
@@ -0,0 +1,139 @@
+# scripts/perf.py — instrumentation : temps mur/CPU par étape, RSS, chargement des modèles vs inférence
+import json, os, sys, threading, time
+from contextlib import contextmanager
+
+def rss_mb():
+    """RSS courant du process (Mo) ; psutil si installé, sinon /proc (Linux) ; None si indisponible."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def peak_rss_mb():
+    """Pic de RSS du process depuis son démarrage (Mo)."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 1024  # octets sous macOS, Ko sous Linux
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 2**20  # Windows
+    except (ImportError, AttributeError):
+        return None
+
+class Profiler:
+    """
+    Enregistre des spans (nom, catégorie, début, durée mur, CPU du thread, CPU du process, RSS max pendant le span)
+    et des compteurs. Un thread échantillonne le RSS toutes les `interval` s tant qu'un span est ouvert.
+    Export : summary() pour report["perf"], chrome_trace() (chrome://tracing, Perfetto) et jsonl().
+    `on_event` (optionnel) reçoit {"event": "start"|"end", "name", "cat", "t"(, "wall_sec")} à chaque span : progression.
+    Le CPU du thread ne compte pas les threads natifs (CTranslate2, ONNX Runtime) : process_cpu_sec les inclut,
+    mais mélange les étapes qui tournent en parallèle.
+    """
+
+    def __init__(self, interval=0.05, on_event=None):
+        self.interval, self.on_event = interval, on_event
+        self.t0 = time.perf_counter()
+        self.events, self.counters = [], {}
+        self._open, self._lock = {}, threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            rss = rss_mb()
+            if rss is None:
+                return
+            with self._lock:
+                for ev in self._open.values():
+                    ev["peak_rss_mb"] = max(ev["peak_rss_mb"] or 0.0, rss)
+
+    @contextmanager
+    def span(self, name, cat="stage", **args):
+        ev = {"name": name, "cat": cat, "tid": threading.get_ident(), "args": args,
+              "start": time.perf_counter() - self.t0, "peak_rss_mb": rss_mb()}
+        cpu0, pcpu0 = time.thread_time(), time.process_time()
+        with self._lock:
+            self._open[id(ev)] = ev
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample, daemon=True)
+                self._sampler.start()
+        if self.on_event is not None:
+            self.on_event({"event": "start", "name": name, "cat": cat, "t": round(ev["start"], 3)})
+        try:
+            yield ev
+        finally:
+            ev["wall_sec"] = time.perf_counter() - self.t0 - ev["start"]
+            ev["cpu_sec"] = time.thread_time() - cpu0
+            ev["process_cpu_sec"] = time.process_time() - pcpu0
+            rss = rss_mb()
+            with self._lock:
+                del self._open[id(ev)]
+                if rss is not None:
+                    ev["peak_rss_mb"] = max(ev["peak_rss_mb"] or 0.0, rss)
+                self.events.append(ev)
+            if self.on_event is not None:
+                self.on_event({"event": "end", "name": name, "cat": cat, "t": round(ev["start"] + ev["wall_sec"], 3),
+                               "wall_sec": round(ev["wall_sec"], 3)})
+
+    def wrap(self, name, fn, cat="stage"):
+        def run(*a, **kw):
+            with self.span(name, cat):
+                return fn(*a, **kw)
+        return run
+
+    def count(self, **values):
+        self.counters.update(values)
+
+    def close(self):
+        self._stop.set()
+
+    def summary(self):
+        """Section report["perf"] : étapes (dont chargement des modèles imbriqué), modèles, compteurs, totaux."""
+        stages, models = {}, {}
+        loads = [e for e in self.events if e["cat"] == "model_load"]
+        for e in self.events:
+            if e["cat"] == "model_load":
+                models[e["name"]] = {"load_sec": round(e["wall_sec"], 3), "peak_rss_mb": _r(e["peak_rss_mb"])}
+                continue
+            # chargements paresseux faits dans l'étape (même thread, pendant l'étape)
+            load = sum(l["wall_sec"] for l in loads if l["tid"] == e["tid"]
+                       and e["start"] <= l["start"] <= e["start"] + e["wall_sec"])
+            stages[e["name"]] = {
+                "cat": e["cat"], "start_sec": round(e["start"], 3), "wall_sec": round(e["wall_sec"], 3),
+                "cpu_sec": round(e["cpu_sec"], 3), "process_cpu_sec": round(e["process_cpu_sec"], 3),
+                "model_load_sec": round(load, 3), "compute_sec": round(e["wall_sec"] - load, 3),
+                "peak_rss_mb": _r(e["peak_rss_mb"]), **e["args"],
+            }
+        wall = time.perf_counter() - self.t0
+        return {"wall_sec": round(wall, 3), "cpu_sec": round(time.process_time(), 3),
+                "rss_mb": _r(rss_mb()), "peak_rss_mb": _r(peak_rss_mb()),
+                "stages": stages, "models": models, "counters": self.counters}
+
+    def chrome_trace(self, path):
+        """Trace au format Chrome (Trace Event, événements complets "X", en µs)."""
+        pid = os.getpid()
+        trace = [{"name": e["name"], "cat": e["cat"], "ph": "X", "pid": pid, "tid": e["tid"],
+                  "ts": round(e["start"] * 1e6), "dur": round(e["wall_sec"] * 1e6),
+                  "args": {"cpu_sec": round(e["cpu_sec"], 4), "peak_rss_mb": _r(e["peak_rss_mb"]), **e["args"]}}
+                 for e in self.events]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+        return path
+
+    def jsonl(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for e in sorted(self.events, key=lambda e: e["start"]):
+                f.write(json.dumps({k: (round(v, 4) if isinstance(v, float) else v) for k, v in e.items()}) + "\n")
+        return path
+
+def _r(x, nd=1):
+    return round(x, nd) if x is not None else None
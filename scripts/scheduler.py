@@ -0,0 +1,71 @@
+# scripts/scheduler.py — exécution DAG des étapes : branches indépendantes en parallèle
+import os, time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+class Stage:
+    """
+    Étape du pipeline. `fn(inputs)` reçoit {dep: résultat} de ses dépendances.
+    `threads` = budget CPU indicatif de l'étape (documenté dans le rapport de planification).
+    """
+    def __init__(self, name, fn, deps=(), threads=1):
+        self.name, self.fn, self.deps, self.threads = name, fn, tuple(deps), threads
+
+def split_threads(total=None, weights=None):
+    """Répartit `total` threads CPU entre branches au prorata de `weights` (>= 1 chacune)."""
+    total = total or os.cpu_count() or 1
+    weights = weights or {"main": 1.0}
+    s = float(sum(weights.values())) or 1.0
+    return {k: max(1, int(total * w / s)) for k, w in weights.items()}
+
+def _timed_call(fn, inputs):
+    t0 = time.perf_counter()
+    out = fn(inputs)
+    return out, time.perf_counter() - t0
+
+def _check(stages):
+    names = {s.name for s in stages}
+    if len(names) != len(stages):
+        raise ValueError("Noms d'étapes dupliqués")
+    for s in stages:
+        missing = set(s.deps) - names
+        if missing:
+            raise ValueError(f"Étape {s.name}: dépendances inconnues {sorted(missing)}")
+
+def run_dag(stages, max_workers=None, executor="thread"):
+    """
+    Lance chaque étape dès que ses dépendances sont prêtes.
+    executor="thread" (modèles partagés en mémoire) ou "process" (fn/inputs picklables).
+    Retourne (résultats {name: sortie}, timings).
+    """
+    _check(stages)
+    pending = {s.name: s for s in stages}
+    results, timings = {}, {}
+    pool_cls = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+    t_start = time.perf_counter()
+
+    with pool_cls(max_workers=max_workers or len(stages)) as pool:
+        running = {}
+        while pending or running:
+            for name, s in list(pending.items()):
+                if all(d in results for d in s.deps):
+                    fut = pool.submit(_timed_call, s.fn, {d: results[d] for d in s.deps})
+                    running[fut] = (s, time.perf_counter() - t_start)
+                    del pending[name]
+            if not running:
+                raise RuntimeError(f"Dépendances cycliques: {sorted(pending)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                s, started = running.pop(fut)
+                results[s.name], dur = fut.result()  # propage l'exception de l'étape
+                timings[s.name] = {"start_sec": round(started, 3), "wall_sec": round(dur, 3), "threads": s.threads}
+
+    wall = time.perf_counter() - t_start
+    serial = sum(t["wall_sec"] for t in timings.values())
+    return results, {
+        "executor": executor,
+        "stages": timings,
+        "wall_sec": round(wall, 3),
+        "serial_sec": round(serial, 3),          # durée si tout avait tourné à la suite
+        "saved_sec": round(max(0.0, serial - wall), 3),
+    }
@@ -1,149 +1,225 @@
-# scripts/scoring.py
+# scripts/scoring.py — scoring vectorisé (NumPy/pandas) à profils déclaratifs et versionnés
 from __future__ import annotations
-import math
-
-WEIGHTS = {
-    "verbal": 40,
-    "paraverbal": 20,
-    "nonverbal": 40,
+import argparse, glob, json, os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+CATEGORIES = ("verbal", "paraverbal", "nonverbal")
+EMOTION_LABELS = ["neutral", "happiness", "surprise", "sadness", "anger", "disgust", "fear", "contempt"]
+
+# Un profil = pondérations + composantes. Composante : courbe linéaire par morceaux [[x, points], …]
+# (constante au-delà des extrémités) appliquée à une feature ; "fill" = x utilisé si la feature manque
+# (sinon 0 point) ; "by"/"curves"/"default" = une courbe par valeur d'une feature catégorielle ;
+# "env" = composante active seulement si cette variable d'environnement vaut 1/true/yes.
+# "overrides" : la catégorie vaut directement cette feature quand elle est présente.
+PROFILES = {
+    # courbes historiques de run_all.py (score écrit dans report.json)
+    "pipeline-v1": {
+        "version": 1,
+        "weights": {"verbal": 40.0, "paraverbal": 20.0, "nonverbal": 40.0},
+        "components": [
+            {"name": "wpm", "category": "paraverbal", "feature": "wpm",
+             "curve": [[80, 0], [120, 12], [160, 12], [200, 0]]},
+            {"name": "silence", "category": "paraverbal", "feature": "silence_ratio", "curve": [[0.1, 5], [0.5, 0]]},
+            {"name": "fillers", "category": "paraverbal", "feature": "fillers_per_min", "curve": [[1, 3], [8, 0]]},
+            {"name": "eye_contact", "category": "nonverbal", "feature": "eye_contact_ratio", "curve": [[0, 0], [1, 20]]},
+            {"name": "nods", "category": "nonverbal", "feature": "nods_per_min",
+             "curve": [[0, 0], [2, 5], [8, 10], [16, 5], [24, 0]]},
+            {"name": "emotion_variability", "category": "nonverbal", "feature": "emotion_entropy",
+             "curve": [[0, 0], [1, 10]], "env": "EMOTIONS_IN_SCORE"},
+            {"name": "length", "category": "verbal", "feature": "word_count", "curve": [[50, 0], [250, 40]]},
+        ],
+        "overrides": {"verbal": "verbal_from_qa"},
+    },
+    # courbes de l'ancien scripts/scoring.py (résumé + sentiment pour le verbal)
+    "scripts-v1": {
+        "version": 1,
+        "weights": {"verbal": 40.0, "paraverbal": 20.0, "nonverbal": 40.0},
+        "components": [
+            {"name": "wpm", "category": "paraverbal", "feature": "wpm", "fill": 0,
+             "curve": [[70, 0], [110, 12], [170, 12], [230, 0]]},
+            {"name": "silence", "category": "paraverbal", "feature": "silence_ratio", "fill": 0,
+             "curve": [[0.15, 6], [0.40, 0]]},
+            {"name": "fillers", "category": "paraverbal", "feature": "fillers_per_min", "fill": 0,
+             "curve": [[2, 2], [10, 0]]},
+            {"name": "eye_contact", "category": "nonverbal", "feature": "eye_contact_ratio", "fill": 0,
+             "curve": [[0, 0], [0.8, 30]]},
+            {"name": "nods", "category": "nonverbal", "feature": "nods_per_min", "fill": 0,
+             "curve": [[0, 0], [9, 10], [18, 0]]},
+            {"name": "summary", "category": "verbal", "feature": "summary_len", "curve": [[0, 0], [300, 28]]},
+            {"name": "sentiment", "category": "verbal", "feature": "sentiment_score", "fill": 0,
+             "by": "sentiment_label", "default": 6.0,
+             "curves": {"positive": [[0, 0], [1, 12]], "neutral": [[0, 3], [1, 12]], "negative": [[0, 9], [1, 3]]}},
+        ],
+    },
 }
-
-def _clamp(x, lo, hi):
-    return max(lo, min(hi, x))
-
-def _safe_div(a, b, default=0.0):
-    return a / b if b else default
-
-def _score_wpm(wpm: float) -> float:
-    """
-    12 points.
-    Zone idéale: 110–170 WPM -> 12 pts.
-    Tolérance: chute linéaire jusqu'à 0 pt à 70 et 230 WPM.
-    """
-    ideal_min, ideal_max = 110, 170
-    hard_min, hard_max = 70, 230
-    if ideal_min <= wpm <= ideal_max:
-        return 12.0
-    if wpm < ideal_min:
-        return 12.0 * _clamp((wpm - hard_min) / (ideal_min - hard_min), 0.0, 1.0)
-    else:
-        return 12.0 * _clamp((hard_max - wpm) / (hard_max - ideal_max), 0.0, 1.0)
-
-def _score_silence(silence_sec: float, duration_sec: float) -> float:
-    """
-    6 points.
-    <=15% de silences -> 6 pts.
-    >=40% -> 0 pt. Linéaire entre les deux.
-    """
-    r = _safe_div(silence_sec, duration_sec)
-    if r <= 0.15:
-        return 6.0
-    if r >= 0.40:
-        return 0.0
-    # map 0.15..0.40 -> 6..0
-    return 6.0 * (0.40 - r) / (0.40 - 0.15)
-
-def _score_fillers(fillers: int, duration_sec: float) -> float:
-    """
-    2 points.
-    <=2 fillers/min -> 2 pts.
-    >=10 fillers/min -> 0 pt. Linéaire entre.
-    """
-    fpm = _safe_div(fillers, duration_sec / 60.0)
-    if fpm <= 2.0:
-        return 2.0
-    if fpm >= 10.0:
-        return 0.0
-    return 2.0 * (10.0 - fpm) / (10.0 - 2.0)
-
-def _score_eye_contact(eye_contact_ratio: float) -> float:
-    """
-    30 points.
-    Saturation à 0.8 (80% de regard).
-    """
-    return 30.0 * _clamp(eye_contact_ratio / 0.8, 0.0, 1.0)
-
-def _score_nods(nods: int, duration_sec: float) -> float:
-    """
-    10 points.
-    Pic à ~9 hochements/min; 0 pt à 0 et 18 h/min (triangulaire).
-    """
-    npm = _safe_div(nods, duration_sec / 60.0)
-    return 10.0 * _clamp(1.0 - abs(npm - 9.0) / 9.0, 0.0, 1.0)
-
-def _score_summary(summary: str) -> float:
-    """
-    28 points.
-    Proxie très simple: longueur utile du résumé (0..300+ chars).
-    """
-    n = len((summary or "").strip())
-    return _clamp(28.0 * (n / 300.0), 0.0, 28.0)
-
-def _score_sentiment(label: str, conf: float) -> float:
-    """
-    12 points.
-    positive: de 0..12 pts (∝ confiance)
-    neutral : ~3..12 pts
-    negative: ~3..9 pts (plus la négativité est forte, plus ça baisse)
-    """
-    label = (label or "").lower()
-    conf = _clamp(conf or 0.0, 0.0, 1.0)
-    if label == "positive":
-        base = 12.0 * conf
-    elif label == "neutral":
-        base = 3.0 + 9.0 * conf
-    elif label == "negative":
-        base = 3.0 + 6.0 * (1.0 - conf)
-    else:
-        base = 6.0  # inconnu
-    return _clamp(base, 0.0, 12.0)
-
-def compute_scores(report: dict) -> dict:
+# compute_scores importé seul : courbes historiques de ce module ; run_all / re-scoring des reports : SCORE_PROFILE
+DEFAULT_PROFILE = "scripts-v1"
+PIPELINE_PROFILE = os.getenv("SCORE_PROFILE", "pipeline-v1")
+
+def load_profile(profile):
+    """Nom d'un profil intégré, chemin d'un profil JSON, ou dict déjà chargé."""
+    if isinstance(profile, dict):
+        return profile
+    if profile in PROFILES:
+        return {"name": profile, **PROFILES[profile]}
+    with open(profile, encoding="utf-8") as f:
+        spec = json.load(f)
+    spec.setdefault("name", os.path.splitext(os.path.basename(profile))[0])
+    return spec
+
+# --- features ---
+def _per_min(count, duration):
+    return np.where(duration > 0, count / np.where(duration > 0, duration, 1.0) * 60.0, np.nan)
+
+def features(reports, index=None):
+    """DataFrame des features de scoring, une ligne par report (dict report.json)."""
+    rows, dists = [], []
+    for r in reports:
+        speech = r.get("speech") or {}
+        nonv = r.get("nonverbal") or {}
+        text = r.get("text") or {}
+        sent = text.get("sentiment") or {}
+        qa = r.get("qa") or {}
+        rows.append((speech.get("duration_sec"), speech.get("wpm"), speech.get("silence_sec"), speech.get("fillers"),
+                     nonv.get("eye_contact_ratio"), nonv.get("nods"), len((text.get("summary") or "").strip()),
+                     len((r.get("transcript") or "").split()), (sent.get("label") or "").lower(), sent.get("score"),
+                     qa.get("verbal_from_qa")))
+        dist = (nonv.get("emotions") or {}).get("distribution") or {}
+        dists.append([dist.get(k, np.nan) if dist else np.nan for k in EMOTION_LABELS])
+
+    df = pd.DataFrame.from_records(rows, index=index, columns=[
+        "duration_sec", "wpm", "silence_sec", "fillers", "eye_contact_ratio", "nods", "summary_len", "word_count",
+        "sentiment_label", "sentiment_score", "verbal_from_qa"])
+    num = [c for c in df.columns if c != "sentiment_label"]
+    df[num] = df[num].apply(pd.to_numeric, errors="coerce")
+
+    dur = df["duration_sec"].to_numpy(dtype=float)
+    df["silence_ratio"] = np.where(dur > 0, df["silence_sec"] / np.where(dur > 0, dur, 1.0), np.nan)
+    df["fillers_per_min"] = _per_min(df["fillers"].to_numpy(dtype=float), dur)
+    df["nods_per_min"] = _per_min(df["nods"].to_numpy(dtype=float), dur)
+
+    # entropie normalisée de la distribution des émotions (0 = une seule émotion, 1 = uniforme)
+    d = np.asarray(dists, dtype=float).reshape(len(rows), len(EMOTION_LABELS))
+    p = np.maximum(np.nan_to_num(d, nan=0.0), 1e-9)
+    p = p / p.sum(axis=1, keepdims=True)
+    h = -(p * np.log(p)).sum(axis=1) / np.log(len(EMOTION_LABELS))
+    df["emotion_entropy"] = np.where(np.isnan(d).all(axis=1), np.nan, h)
+    return df
+
+# --- scoring ---
+def _curve(x, curve):
+    xs, ys = zip(*curve)
+    return np.interp(x, xs, ys)
+
+def _enabled(comp):
+    return not comp.get("env") or os.getenv(comp["env"], "0").lower() in ("1", "true", "yes")
+
+def score_frame(df, profile=DEFAULT_PROFILE):
+    """Scores de toutes les lignes de `df` (cf. features) : une colonne par composante, catégorie et total."""
+    spec = load_profile(profile)
+    out = pd.DataFrame(index=df.index)
+    for comp in spec["components"]:
+        if not _enabled(comp):
+            continue
+        x = df[comp["feature"]].to_numpy(dtype=float)
+        if "fill" in comp:
+            x = np.where(np.isnan(x), comp["fill"], x)
+        if "by" in comp:
+            keys = df[comp["by"]].to_numpy()
+            pts = np.full(len(df), float(comp.get("default", 0.0)))
+            for key, curve in comp["curves"].items():
+                m = keys == key
+                pts[m] = _curve(x[m], curve)
+        else:
+            pts = _curve(x, comp["curve"])
+        out[comp["name"]] = np.nan_to_num(pts, nan=0.0)
+
+    total = np.zeros(len(df))
+    for cat in CATEGORIES:
+        names = [c["name"] for c in spec["components"] if c["category"] == cat and _enabled(c)]
+        val = out[names].sum(axis=1).to_numpy() if names else np.zeros(len(df))
+        over = spec.get("overrides", {}).get(cat)
+        if over:
+            o = df[over].to_numpy(dtype=float)
+            val = np.where(np.isnan(o), val, o)
+        val = np.clip(val, 0.0, spec["weights"][cat])
+        total += val
+        out[cat] = val.round(1)
+    out["total"] = total.round(1)
+    out["profile"] = f"{spec['name']}@{spec.get('version', 1)}"
+    return out
+
+def score_reports(reports, profile=DEFAULT_PROFILE, index=None):
+    return score_frame(features(reports, index), profile)
+
+def compute_scores(report: dict, profile=DEFAULT_PROFILE) -> dict:
     """
     Calcule verbal / paraverbal / nonverbal / total (sur 100)
-    à partir du report brut produit par le pipeline.
-    """
-    speech = report.get("speech", {})
-    text = report.get("text", {})
-    nonv = report.get("nonverbal", {})
-
-    duration = float(speech.get("duration_sec") or 0.0)
-    wpm = float(speech.get("wpm") or 0.0)
-    silence = float(speech.get("silence_sec") or 0.0)
-    fillers = int(speech.get("fillers") or 0)
-
-    eye = float(nonv.get("eye_contact_ratio") or 0.0)
-    nods = int(nonv.get("nods") or 0)
-
-    sent = text.get("sentiment", {}) or {}
-    sent_label = sent.get("label") or ""
-    sent_score = float(sent.get("score") or 0.0)
-    summary = (text.get("summary") or "").strip()
-
-    # Sous-scores
-    paraverbal = _score_wpm(wpm) + _score_silence(silence, duration) + _score_fillers(fillers, duration)
-    nonverbal  = _score_eye_contact(eye) + _score_nods(nods, duration)
-    verbal     = _score_summary(summary) + _score_sentiment(sent_label, sent_score)
-
-    # Normalisation aux pondérations
-    verbal = _clamp(verbal, 0.0, WEIGHTS["verbal"])
-    paraverbal = _clamp(paraverbal, 0.0, WEIGHTS["paraverbal"])
-    nonverbal = _clamp(nonverbal, 0.0, WEIGHTS["nonverbal"])
-
-    total = verbal + paraverbal + nonverbal
-    return {
-        "verbal": round(verbal, 1),
-        "paraverbal": round(paraverbal, 1),
-        "nonverbal": round(nonverbal, 1),
-        "total": round(total, 1),
-        "details": {
-            "wpm": _score_wpm(wpm),
-            "silence": _score_silence(silence, duration),
-            "fillers": _score_fillers(fillers, duration),
-            "eye_contact": _score_eye_contact(eye),
-            "nods": _score_nods(nods, duration),
-            "summary_len": len(summary),
-            "sentiment_label": sent_label,
-            "sentiment_conf": sent_score,
-        }
-    }
+    à partir du report brut produit par le pipeline (+ points de chaque composante dans "details").
+    """
+    return _entry(score_reports([report], profile).iloc[0])
+
+def _entry(row):
+    # report["scores"] d'une ligne de score_frame (même forme pour le pipeline et le re-scoring)
+    res = {k: float(row[k]) for k in (*CATEGORIES, "total")}
+    res["profile"] = row["profile"]
+    res["details"] = {k: round(float(v), 2) for k, v in row.items() if k not in (*CATEGORIES, "total", "profile")}
+    return res
+
+def percentiles(scores, columns=(*CATEGORIES, "total"), by=None):
+    """Rang percentile (0–100) de chaque candidat dans sa cohorte (tout le tableau, ou par valeur de `by`)."""
+    cols = list(columns)
+    ranked = scores.groupby(by)[cols].rank(pct=True) if by is not None else scores[cols].rank(pct=True)
+    return (ranked * 100).round(1).add_suffix("_pct")
+
+# --- re-scoring en masse d'une archive de reports ---
+def load_reports(root, workers=8):
+    """(ids, reports) pour chaque report.json sous `root` (id = dossier relatif) ; lecture en parallèle."""
+    paths = sorted(glob.glob(os.path.join(root, "**", "report.json"), recursive=True))
+
+    def read(p):
+        with open(p, encoding="utf-8") as f:
+            return json.load(f)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        reports = list(pool.map(read, paths))
+    return [os.path.relpath(os.path.dirname(p), root) for p in paths], reports, paths
+
+def rescore(root, profile=PIPELINE_PROFILE, write=False, cohort=None):
+    ids, reports, paths = load_reports(root)
+    df = features(reports, index=pd.Index(ids, name="id"))
+    scores = base = score_frame(df, profile)
+    if cohort == "all":
+        scores = scores.join(percentiles(scores))
+    elif cohort:
+        scores = scores.assign(cohort=[_cohort(i, cohort) for i in ids])
+        scores = scores.join(percentiles(scores, by="cohort"))
+    if write:
+        for p, r, (_, row) in zip(paths, reports, base.iterrows()):
+            r["scores"] = _entry(row)
+            with open(p + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(r, f, ensure_ascii=False, indent=2)
+            os.replace(p + ".tmp", p)
+    return scores
+
+def _cohort(report_id, depth):
+    # cohorte = premiers niveaux du chemin relatif (ex. "poste-x/cand-42" → "poste-x" pour depth=1)
+    parts = report_id.replace("\\", "/").split("/")
+    return "/".join(parts[:int(depth)]) if len(parts) > int(depth) else "."
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Re-scoring en masse des report.json d'un dossier")
+    ap.add_argument("root", help="dossier contenant des */report.json (ex: outputs/batch)")
+    ap.add_argument("--profile", default=PIPELINE_PROFILE, help=f"{sorted(PROFILES)} ou chemin d'un profil JSON")
+    ap.add_argument("--out", default=None, help="CSV des scores (défaut : stdout)")
+    ap.add_argument("--percentiles", default=None, metavar="all|DEPTH",
+                    help="rangs percentiles : sur tout le dossier, ou par cohorte = DEPTH premiers sous-dossiers")
+    ap.add_argument("--write", action="store_true", help="met à jour report['scores'] dans chaque report.json")
+    args = ap.parse_args()
+
+    scores = rescore(args.root, args.profile, write=args.write, cohort=args.percentiles)
+    if args.out:
+        scores.to_csv(args.out)
+    else:
+        print(scores.to_csv())
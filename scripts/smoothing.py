@@ -0,0 +1,130 @@
+# scripts/smoothing.py — lissage temporel des probabilités par classe, en O(n), par lots ou en ligne
+import numpy as np
+
+# --- versions vectorisées (tableau complet (n, k)) ---
+def moving_average(p, win=3):
+    """Moyenne glissante centrée sur `win` points (fenêtres tronquées aux bords), par sommes cumulées."""
+    p = np.asarray(p, dtype=np.float32)
+    n, half = len(p), win // 2
+    if n == 0 or win <= 1:
+        return p
+    c = np.concatenate([np.zeros((1, p.shape[1])), np.cumsum(p, axis=0, dtype=np.float64)])
+    i = np.arange(n)
+    lo, hi = np.maximum(i - half, 0), np.minimum(i + half + 1, n)
+    return ((c[hi] - c[lo]) / (hi - lo)[:, None]).astype(np.float32)
+
+def ema(p, alpha=0.5, state=None):
+    """Moyenne mobile exponentielle (causale) ; `state` = dernière valeur lissée (reprise d'un flux)."""
+    p = np.asarray(p, dtype=np.float32)
+    out = np.empty_like(p)
+    s = state
+    for i, row in enumerate(p):
+        s = row if s is None else alpha * row + (1.0 - alpha) * s
+        out[i] = s
+    return out
+
+def transitions(k, stay=0.9):
+    """Log-matrice de transition : rester sur la même émotion avec la probabilité `stay`, sinon changement uniforme."""
+    t = np.full((k, k), (1.0 - stay) / max(1, k - 1))
+    np.fill_diagonal(t, stay)
+    return np.log(t)
+
+def viterbi(p, stay=0.9):
+    """Chemin d'étiquettes le plus probable (HMM : émissions = probabilités FER+, transitions collantes)."""
+    v = ViterbiSmoother(stay)
+    v.update(p)
+    return v.tail()[1]
+
+# --- versions en ligne : update(lot) → (probas lissées, étiquettes) prêtes ; tail() → reste, sans rien modifier ---
+class MovingAverageSmoother:
+    """Moyenne centrée en ligne : un point sort dès que ses `win // 2` voisins de droite sont arrivés."""
+
+    def __init__(self, win=3):
+        self.win, self.half = win, win // 2
+        self._buf, self._start = None, 0  # points [_start, n_in) encore utiles
+        self.n_in = self.n_out = 0
+
+    def update(self, p):
+        p = np.asarray(p, dtype=np.float32)
+        self._buf = p if self._buf is None else np.concatenate([self._buf, p])
+        self.n_in += len(p)
+        sm = moving_average(self._buf, self.win)
+        ready = max(0, self.n_in - self.half - self.n_out)
+        off = self.n_out - self._start
+        out = sm[off:off + ready]
+        self.n_out += ready
+        drop = max(0, self.n_out - self.half - self._start)  # garde la fenêtre gauche des prochains points
+        self._buf, self._start = self._buf[drop:], self._start + drop
+        return out, out.argmax(axis=1).astype(np.uint8)
+
+    def tail(self):
+        if self._buf is None or self.n_out == self.n_in:
+            return np.zeros((0, 0), np.float32), np.zeros(0, np.uint8)
+        out = moving_average(self._buf, self.win)[self.n_out - self._start:]
+        return out, out.argmax(axis=1).astype(np.uint8)
+
+class EMASmoother:
+    def __init__(self, alpha=0.5):
+        self.alpha, self._s = alpha, None
+
+    def update(self, p):
+        out = ema(p, self.alpha, self._s)
+        if len(out):
+            self._s = out[-1]
+        return out, out.argmax(axis=1).astype(np.uint8)
+
+    def tail(self):
+        return np.zeros((0, 0), np.float32), np.zeros(0, np.uint8)
+
+class ViterbiSmoother:
+    """
+    Viterbi en ligne : un pas de récursion par point ; seuls les pointeurs arrière (uint8, k par point) sont gardés.
+    Les étiquettes ne sont connues qu'au backtracking (tail) ; probas lissées = étiquettes en one-hot.
+    """
+
+    def __init__(self, stay=0.9):
+        self.stay = stay
+        self._delta, self._back, self._logt = None, [], None
+
+    def update(self, p):
+        p = np.asarray(p, dtype=np.float64)
+        if len(p) == 0:
+            return np.zeros((0, 0), np.float32), np.zeros(0, np.uint8)
+        if self._logt is None:
+            self._logt = transitions(p.shape[1], self.stay)
+        logp = np.log(p + 1e-9)
+        start = 0
+        if self._delta is None:
+            self._delta, start = logp[0], 1
+            self._back.append(np.zeros(p.shape[1], np.uint8))
+        for row in logp[start:]:
+            scores = self._delta[:, None] + self._logt
+            best = scores.argmax(axis=0)
+            self._back.append(best.astype(np.uint8))
+            self._delta = scores[best, np.arange(len(best))] + row
+        return np.zeros((0, p.shape[1]), np.float32), np.zeros(0, np.uint8)
+
+    def tail(self):
+        if self._delta is None:
+            return np.zeros((0, 0), np.float32), np.zeros(0, np.uint8)
+        path = np.empty(len(self._back), np.uint8)
+        path[-1] = self._delta.argmax()
+        for i in range(len(self._back) - 1, 0, -1):
+            path[i - 1] = self._back[i][path[i]]
+        return np.eye(len(self._delta), dtype=np.float32)[path], path
+
+class NoSmoother(EMASmoother):
+    def __init__(self):
+        super().__init__(alpha=1.0)
+
+def make_smoother(method="ma", win=3, stay=0.9):
+    """"ma" (moyenne centrée sur win), "ema" (alpha = 2/(win+1)), "viterbi" (HMM), "none" ; win <= 1 = pas de lissage."""
+    if method == "none" or not win or win <= 1:
+        return NoSmoother()
+    if method == "ma":
+        return MovingAverageSmoother(win)
+    if method == "ema":
+        return EMASmoother(2.0 / (win + 1))
+    if method == "viterbi":
+        return ViterbiSmoother(stay)
+    raise ValueError(f"Lissage inconnu: {method}")
@@ -1,19 +1,160 @@
-import sys, json, re, librosa
+import sys, json, re
 from pathlib import Path
+import numpy as np
+
+FILLERS_RE = re.compile(r"\b(euh+|heu+|mmm+|bah|ben)\b")
+WORD_RE = re.compile(r"\w+")
+
+FRAME_SEC = 0.02                     # trames RMS/VAD (20 ms, sans recouvrement)
+PITCH_FRAMES = 2                     # 2 trames = 40 ms par estimation de F0
+F0_MIN, F0_MAX = 70.0, 400.0
+TOP_DB = 30.0                        # comme librosa.effects.split(top_db=30)
+PAUSE_MIN_SEC = 0.25
+PAUSE_BINS = [0.25, 0.5, 1.0, 2.0, 4.0, np.inf]
+
+class ParaverbalMetrics:
+    """
+    Accumulateur paraverbal en une passe : update(bloc) calcule RMS et autocorrélation (F0) par trame,
+    vectorisé NumPy, sans garder l'audio. Convient au buffer complet comme à un flux par blocs.
+    """
+
+    def __init__(self, sr=16000):
+        self.sr = sr
+        self.frame = int(round(FRAME_SEC * sr))
+        self.n_samples = 0
+        self._rest = np.zeros(0, dtype=np.float32)
+        self._rms, self._f0, self._voicing = [], [], []
+        self._win = np.hanning(self.frame * PITCH_FRAMES).astype(np.float32)
+        self._lags = (int(sr / F0_MAX), int(sr / F0_MIN) + 1)
+
+    def update(self, y, block_sec=60.0):
+        y = np.asarray(y, dtype=np.float32)
+        self.n_samples += len(y)
+        step = int(block_sec * self.sr) // (self.frame * PITCH_FRAMES) * (self.frame * PITCH_FRAMES)
+        for i in range(0, len(y), step):  # blocs bornés : mémoire FFT constante même sur 1 h
+            self._consume(y[i:i + step])
+
+    def _consume(self, y):
+        y = np.concatenate([self._rest, y]) if len(self._rest) else y
+        unit = self.frame * PITCH_FRAMES
+        n_units = len(y) // unit
+        self._rest = y[n_units * unit:].copy()
+        if n_units == 0:
+            return
+        x = y[:n_units * unit]
+
+        frames = x.reshape(-1, self.frame)
+        self._rms.append(np.sqrt(np.mean(frames * frames, axis=1)))
+
+        # F0 par autocorrélation (Wiener–Khinchine) sur toutes les trames de 40 ms à la fois
+        seg = x.reshape(n_units, unit) * self._win
+        spec = np.fft.rfft(seg, n=2 * unit, axis=1)
+        ac = np.fft.irfft(spec.real ** 2 + spec.imag ** 2, axis=1)[:, :unit]
+        lo, hi = self._lags
+        norm = np.maximum(ac[:, :1], 1e-12)
+        band = ac[:, lo:hi] / norm
+        k = np.argmax(band, axis=1)
+        self._voicing.append(band[np.arange(n_units), k])
+        self._f0.append(self.sr / (k + lo))
+
+    def result(self, text="", asr=None, window_sec=10.0):
+        """Scalaires historiques (duration_sec, wpm, silence_sec, fillers) + pauses, prosodie et séries."""
+        sr, hop = self.sr, FRAME_SEC
+        duration_sec = self.n_samples / sr
+        rms = np.concatenate(self._rms) if self._rms else np.zeros(0, np.float32)
+        f0 = np.concatenate(self._f0) if self._f0 else np.zeros(0, np.float32)
+        voicing = np.concatenate(self._voicing) if self._voicing else np.zeros(0, np.float32)
+
+        # VAD énergie : trame parlée si à moins de TOP_DB du maximum
+        db = 20.0 * np.log10(np.maximum(rms, 1e-10))
+        speech = db > (db.max() - TOP_DB) if len(db) else np.zeros(0, bool)
+        silence = max(0.0, duration_sec - float(speech.sum()) * hop)
+
+        # pauses = runs de trames non parlées
+        edges = np.diff(np.concatenate([[0], (~speech).astype(np.int8), [0]]))
+        starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+        pause_dur = (ends - starts) * hop
+        keep = pause_dur >= PAUSE_MIN_SEC
+        pause_start, pause_dur = starts[keep] * hop, pause_dur[keep]
+        hist, _ = np.histogram(pause_dur, bins=PAUSE_BINS)
+        top = np.argsort(pause_dur)[::-1][:5]
+
+        # mots : horodatages ASR si disponibles, sinon texte brut
+        segments = (asr or {}).get("segments") or []
+        words = [w for s in segments for w in s.get("words", [])]
+        text = text or " ".join(s.get("text", "") for s in segments)
+        n_words = len(WORD_RE.findall(text))
+        wpm = n_words / (duration_sec / 60) if duration_sec > 0 else 0.0
+        fillers = len(FILLERS_RE.findall(text.lower()))
+        filler_t = [w["start"] for w in words if FILLERS_RE.fullmatch(w["word"].lower().strip(" .,;:!?…"))]
+
+        # prosodie : F0 sur les trames de 40 ms voisées et parlées
+        sp_pitch = speech[:len(f0) * PITCH_FRAMES].reshape(-1, PITCH_FRAMES).all(axis=1) if len(f0) else speech[:0]
+        voiced = sp_pitch & (voicing > 0.4)
+        f0v = f0[voiced]
+        f0_med = float(np.median(f0v)) if len(f0v) else None
+        semitones = 12.0 * np.log2(f0v / f0_med) if len(f0v) else np.zeros(0)
+        db_speech = db[speech]
+
+        # séries par fenêtre de `window_sec`
+        n_win = max(1, int(np.ceil(duration_sec / window_sec)))
+        win_edges = np.arange(n_win + 1) * window_sec
+        t_frames = np.arange(len(rms)) * hop
+        w_idx = np.minimum((t_frames // window_sec).astype(int), n_win - 1)
+        speech_ratio = (np.bincount(w_idx, weights=speech.astype(np.float64), minlength=n_win)
+                        / np.maximum(np.bincount(w_idx, minlength=n_win), 1))
+        w_words = np.histogram([w["start"] for w in words], bins=win_edges)[0] * (60.0 / window_sec) if words else None
+        t_pitch = np.arange(len(f0)) * hop * PITCH_FRAMES
+        p_idx = np.minimum((t_pitch[voiced] // window_sec).astype(int), n_win - 1)
+        cnt = np.bincount(p_idx, minlength=n_win)
+        s1 = np.bincount(p_idx, weights=semitones, minlength=n_win)
+        s2 = np.bincount(p_idx, weights=semitones ** 2, minlength=n_win)
+        pitch_std = np.sqrt(np.maximum(s2 / np.maximum(cnt, 1) - (s1 / np.maximum(cnt, 1)) ** 2, 0.0))
+
+        seg_wpm = [round(len(s.get("words") or WORD_RE.findall(s.get("text", ""))) / ((s["end"] - s["start"]) / 60.0), 1)
+                   for s in segments if s["end"] - s["start"] > 0.5]
+
+        return {
+            "duration_sec": round(duration_sec, 2),
+            "wpm": round(wpm, 1),
+            "silence_sec": round(silence, 2),
+            "fillers": fillers,
+            "filler_times": [round(t, 2) for t in filler_t],
+            "pauses": {
+                "count": int(len(pause_dur)),
+                "total_sec": round(float(pause_dur.sum()), 2),
+                "histogram": {"bins_sec": [b for b in PAUSE_BINS[:-1]], "counts": hist.tolist()},
+                "longest": [{"t": round(float(pause_start[i]), 2), "sec": round(float(pause_dur[i]), 2)} for i in top],
+            },
+            "segment_wpm": {
+                "median": round(float(np.median(seg_wpm)), 1) if seg_wpm else None,
+                "p10": round(float(np.percentile(seg_wpm, 10)), 1) if seg_wpm else None,
+                "p90": round(float(np.percentile(seg_wpm, 90)), 1) if seg_wpm else None,
+            },
+            "pitch": {
+                "median_hz": round(f0_med, 1) if f0_med else None,
+                "std_semitones": round(float(semitones.std()), 2) if len(semitones) else None,
+            },
+            "energy": {"std_db": round(float(db_speech.std()), 2) if len(db_speech) else None},
+            "series": {
+                "window_sec": window_sec,
+                "t": win_edges[:-1].tolist(),
+                "wpm": np.round(w_words, 1).tolist() if w_words is not None else None,
+                "speech_ratio": np.round(speech_ratio, 3).tolist(),
+                "pitch_std_semitones": np.round(pitch_std, 2).tolist(),
+            },
+        }
+
+def compute_metrics(y, sr, text, asr=None, window_sec=10.0):
+    m = ParaverbalMetrics(sr)
+    m.update(y)
+    return m.result(text, asr, window_sec)
 
 def speech_metrics(audio_path, transcript_path):
+    import librosa
     y, sr = librosa.load(audio_path, sr=16000)
-    duration_sec = len(y) / sr
-    # Silences (approx) : durée non-parlée
-    intervals = librosa.effects.split(y, top_db=30)  # segments parlés
-    speech = sum((e - s) for s, e in intervals) / sr
-    silence = max(0.0, duration_sec - speech)
-
     text = Path(transcript_path).read_text(encoding="utf-8")
-    words = len(re.findall(r"\w+", text))
-    wpm = words / (duration_sec / 60) if duration_sec > 0 else 0.0
-    fillers = len(re.findall(r"\b(euh+|heu+|mmm+|bah|ben)\b", text.lower()))
-    return {"duration_sec": round(duration_sec,2), "wpm": round(wpm,1), "silence_sec": round(silence,2), "fillers": fillers}
+    return compute_metrics(y, sr, text)
 
 if __name__ == "__main__":
     audio, transcript = sys.argv[1], sys.argv[2]
@@ -0,0 +1,242 @@
+# scripts/streaming.py — analyse incrémentale d'une vidéo en cours d'upload (fichier qui grossit ou stdin)
+import json, os, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+import ffmpeg
+import numpy as np
+from extract_audio import SR
+from frames import FrameRouter
+from timeline_store import split, to_lists
+
+def spool_stdin(path, block=1 << 20):
+    """Copie stdin dans `path` au fil de l'eau (FFmpeg suit ce fichier, fin de flux détectée par son `idle_timeout`)."""
+    src = sys.stdin.buffer
+    with open(path, "wb") as f:
+        while True:
+            buf = src.read1(block) if hasattr(src, "read1") else src.read(block)
+            if not buf:
+                break
+            f.write(buf)
+            f.flush()
+
+def follow_input(path, idle_timeout):
+    # -follow 1 : FFmpeg relit en fin de fichier tant que des octets arrivent ; fin après `idle_timeout` s sans données
+    return ffmpeg.input(path, follow=1, rw_timeout=int(idle_timeout * 1e6))
+
+def wait_probe(path, timeout):
+    """ffprobe du fichier en cours d'écriture : réessaie tant que l'en-tête n'est pas lisible."""
+    deadline = time.time() + timeout
+    while True:
+        try:
+            if os.path.exists(path) and os.path.getsize(path) > 0:
+                return ffmpeg.probe(path)
+        except ffmpeg.Error:
+            pass
+        if time.time() > deadline:
+            raise RuntimeError(f"Flux illisible (conteneur non streamable ?) : {path}")
+        time.sleep(0.5)
+
+class StreamingSession:
+    """
+    Analyse d'un enregistrement pendant son écriture, avec les modèles chauds d'un PipelineEngine :
+      - audio : pipe FFmpeg float32 → ParaverbalMetrics.update() bloc par bloc ; morceaux coupés aux silences
+        transcrits au fil de l'eau (un worker, langue fixée par le premier morceau) ;
+      - vidéo : pipe FFmpeg rawvideo (BGR, `video_fps`, largeur emo_max_width) → mêmes analyseurs que run_frames ;
+      - toutes les `emit_sec` s : une ligne JSON de rapport partiel dans outdir/partial.jsonl (et `on_partial`).
+    À la fin du flux : texte (sentiment/résumé) sur le transcript complet, puis report.json comme engine.run.
+    Le conteneur doit être lisible en cours d'écriture (WebM/MKV/MPEG-TS, MP4 fragmenté ; pas un MP4 classique).
+    """
+
+    def __init__(self, engine, source, outdir="outputs", emit_sec=5.0, idle_timeout=5.0, video_fps=10,
+                 on_partial=None, **options):
+        unknown = set(options) - set(engine.options)
+        if unknown:
+            raise TypeError(f"Options inconnues: {sorted(unknown)}")
+        self.engine, self.outdir = engine, outdir
+        self.opts = {**engine.options, **options}
+        self.emit_sec, self.idle_timeout, self.video_fps = emit_sec, idle_timeout, video_fps
+        self.on_partial = on_partial
+        os.makedirs(outdir, exist_ok=True)
+
+        if source == "-":
+            ext = os.getenv("STREAM_SPOOL_EXT", "webm")
+            source = os.path.join(outdir, f"upload.{ext}")
+            threading.Thread(target=spool_stdin, args=(source,), daemon=True).start()
+        self.source = source
+
+        from speech_metrics import ParaverbalMetrics
+        self.lock = threading.Lock()
+        self.para = ParaverbalMetrics(SR)
+        self.segments, self.language = [], self.opts["stt_lang"]
+        self.audio_sec = self.transcribed_sec = 0.0
+        self.router = None
+        self.errors = []
+        self._seq, self._sent, self._last_t = 0, 0, {}
+        self._stt = ThreadPoolExecutor(max_workers=1)
+
+    # --- audio ---
+    def _transcribe(self, audio, offset):
+        import transcribe
+        res = transcribe.transcribe_audio(self.engine.whisper, audio, beam=self.opts["stt_beam"], lang=self.language,
+                                          offset=offset)
+        with self.lock:
+            self.language = self.language or res["language"]
+            self.segments.extend(res["segments"])
+            self.transcribed_sec = offset + len(audio) / SR
+
+    def _submit(self, audio, offset):
+        fut = self._stt.submit(self._transcribe, audio, offset)
+        fut.add_done_callback(lambda f: f.exception() and self.errors.append(f.exception()))  # remonté par run()
+
+    def _audio(self):
+        from transcribe import split_on_silences
+        proc = (follow_input(self.source, self.idle_timeout)
+                .output("pipe:", format="f32le", acodec="pcm_f32le", ac=1, ar=SR)
+                .global_args("-nostdin", "-loglevel", "error")
+                .run_async(pipe_stdout=True))
+        chunk = int(self.opts["stt_chunk_sec"] * SR)
+        pending, n, offset, next_cut = [], 0, 0.0, 2 * chunk
+        try:
+            while True:
+                buf = proc.stdout.read(SR * 4)  # blocs d'1 s
+                if not buf:
+                    break
+                y = np.frombuffer(buf[:len(buf) - len(buf) % 4], dtype=np.float32)
+                with self.lock:
+                    self.para.update(y)
+                    self.audio_sec += len(y) / SR
+                pending.append(y)
+                n += len(y)
+                if n < next_cut:
+                    continue
+                # au moins 2 morceaux en attente : on transcrit jusqu'au dernier silence, le reste attend la suite
+                audio = np.concatenate(pending)
+                keep = split_on_silences(audio, SR, self.opts["stt_chunk_sec"])[-1][0]
+                if keep > 0:
+                    self._submit(audio[:keep], offset)
+                    offset += keep / SR
+                pending, n = [audio[keep:]], len(audio) - keep
+                next_cut = n + chunk
+        finally:
+            proc.stdout.close()
+            proc.wait()
+        if n:
+            self._submit(np.concatenate(pending), offset)
+
+    # --- vidéo ---
+    def _video(self, stream):
+        w, h = int(stream["width"]), int(stream["height"])
+        max_w = self.opts["emo_max_width"]
+        if max_w and w > max_w:
+            w, h = max_w, int(h * max_w / w)
+        w, h = w - w % 2, h - h % 2
+        proc = (follow_input(self.source, self.idle_timeout).video
+                .filter("fps", fps=self.video_fps).filter("scale", w, h)
+                .output("pipe:", format="rawvideo", pix_fmt="bgr24")
+                .global_args("-nostdin", "-loglevel", "error")
+                .run_async(pipe_stdout=True))
+        size, idx = w * h * 3, 0
+        try:
+            while True:
+                buf = proc.stdout.read(size)
+                if len(buf) < size:
+                    break
+                if self.router.needs(idx):
+                    with self.lock:
+                        self.router.push(idx, idx / self.video_fps, np.frombuffer(buf, np.uint8).reshape(h, w, 3))
+                idx += 1
+        finally:
+            proc.stdout.close()
+            proc.wait()
+        with self.lock:
+            self.router.decoded = idx
+
+    def _guard(self, fn, *args):
+        def run():
+            try:
+                fn(*args)
+            except Exception as e:  # remonté par run()
+                self.errors.append(e)
+        return threading.Thread(target=run, daemon=True)
+
+    # --- rapports ---
+    def _visual(self):
+        if self.router is None:
+            return {"gaze": {"eye_contact_ratio": 0.0, "nods": 0}, "emotions": {}}, {}
+        return self.router.results(), self.router.stats()
+
+    def partial(self, final=False):
+        """Rapport partiel (segments nouveaux depuis la ligne précédente + état courant des métriques)."""
+        with self.lock:
+            new, self._sent = self.segments[self._sent:], len(self.segments)
+            asr = {"segments": self.segments}
+            speech, speech_series = split(self.para.result(" ".join(s["text"] for s in self.segments), asr))
+            visual_res, frame_stats = self._visual()
+            gaze, gaze_series = split(visual_res["gaze"])
+            emotions, emo_series = split(visual_res["emotions"])
+            # timelines : points nouveaux depuis la ligne précédente (émotions, regard), fenêtres paraverbales complètes
+            timelines = to_lists({"speech": speech_series})
+            for group, series in (("emotions", emo_series), ("gaze", gaze_series)):
+                if series is not None:
+                    timelines.update(to_lists({group: series}, since=self._last_t.get(group)))
+                    if len(series["t"]):
+                        self._last_t[group] = float(series["t"][-1])
+            line = {
+                "seq": self._seq, "final": final, "elapsed_sec": round(time.time() - self.t0, 2),
+                "audio_sec": round(self.audio_sec, 2), "transcribed_sec": round(self.transcribed_sec, 2),
+                "segments": new, "speech": speech,
+                "nonverbal": {**gaze, "emotions": emotions, "frames": frame_stats},
+                "timelines": timelines,
+            }
+        self._seq += 1
+        with open(os.path.join(self.outdir, "partial.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+        if self.on_partial is not None:
+            self.on_partial(line)
+        return line
+
+    def run(self):
+        self.t0 = time.time()
+        open(os.path.join(self.outdir, "partial.jsonl"), "w").close()
+        info = wait_probe(self.source, max(self.idle_timeout, 30.0))
+        video = next((s for s in info["streams"] if s["codec_type"] == "video"), None)
+        has_audio = any(s["codec_type"] == "audio" for s in info["streams"])
+
+        workers = []
+        if has_audio:
+            workers.append(self._guard(self._audio))
+        if video is not None:
+            analyzers, sampler, tracker = self.engine.frame_analyzers(self.opts)
+            self.router = FrameRouter(analyzers, sampler, tracker, self.opts["emo_max_width"])
+            self.router.begin(self.video_fps)
+            workers.append(self._guard(self._video, video))
+        for t in workers:
+            t.start()
+
+        while any(t.is_alive() for t in workers):
+            for t in workers:
+                t.join(timeout=self.emit_sec / len(workers))
+            if self.errors:
+                break
+            self.partial()
+        self._stt.shutdown(wait=True)
+        if self.errors:
+            raise self.errors[0]
+        t_end = time.time()
+
+        # fin du flux : texte sur le transcript complet puis report.json (même forme que engine.run)
+        import text_analysis
+        text = " ".join(s["text"] for s in self.segments).strip()
+        asr = {"text": text, "language": self.language, "duration": self.audio_sec, "segments": self.segments,
+               "beam": self.opts["stt_beam"], "vad": True}
+        speech = self.para.result(text, asr)
+        visual_res, frame_stats = self._visual()
+        report = self.engine.build_report(asr, speech, text_analysis.analyze(text, self.engine.text_engine, self.segments),
+                                          visual_res, frame_stats)
+        report["streaming"] = {"partials": self._seq, "video_fps": self.video_fps,
+                               "finalize_sec": round(time.time() - t_end, 2)}
+        self.partial(final=True)
+        return self.engine.write_report(report, self.outdir, self.opts["timelines"], self.opts["emo_max_timeline"])
+
+def stream(engine, source, outdir="outputs", **kwargs):
+    """Analyse `source` (chemin d'un fichier en cours d'écriture, ou "-" pour stdin) pendant l'upload."""
+    return StreamingSession(engine, source, outdir, **kwargs).run()
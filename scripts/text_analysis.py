@@ -1,19 +1,137 @@
-import sys, json
+import re, sys, json, bisect
 from transformers import pipeline
 
-# modèles légers pour CPU
-SENT_MODEL = "cardiffnlp/twitter-xlm-roberta-base-sentiment"
-SUM_MODEL = "sshleifer/distilbart-cnn-12-6"
+# modèles légers pour CPU (noms du registre, cf. model_registry : variantes "-onnx" et "-onnx-int8")
+SENT_MODEL = "sentiment"
+SUM_MODEL = "summarizer"
 
-def analyze_text(text_path):
-    text = open(text_path, "r", encoding="utf-8").read()
-    sent_pipe = pipeline("sentiment-analysis", model=SENT_MODEL, truncation=True)
-    sum_pipe  = pipeline("summarization", model=SUM_MODEL)
+SENTENCE_RE = re.compile(r"[^.!?…]+[.!?…]*\s*")
+
+def _pipeline(task, model, backend):
+    """Pipeline sur le dossier local résolu par le registre (safetensors : poids mappés en mémoire, pas copiés)."""
+    from model_registry import resolve
+    if backend in ("onnx", "onnx-int8"):
+        from transformers import AutoTokenizer
+        try:
+            from optimum.onnxruntime import ORTModelForSequenceClassification, ORTModelForSeq2SeqLM
+        except ImportError as e:
+            raise RuntimeError("backend ONNX : installer optimum[onnxruntime]") from e
+        cls = ORTModelForSequenceClassification if task == "sentiment-analysis" else ORTModelForSeq2SeqLM
+        path = resolve(f"{model}-{backend}")  # export (et quantification int8) faits une fois, au prefetch
+        return pipeline(task, model=cls.from_pretrained(path), tokenizer=AutoTokenizer.from_pretrained(path))
+    path = resolve(model)
+    pipe = pipeline(task, model=path, tokenizer=path)
+    if backend == "int8":  # quantification dynamique PyTorch des couches Linear
+        import torch
+        pipe.model = torch.quantization.quantize_dynamic(pipe.model, {torch.nn.Linear}, dtype=torch.qint8)
+    return pipe
+
+class TextEngine:
+    """
+    Sentiment + résumé sur tout le transcript : découpage en morceaux selon les tokens, sentiment par
+    batch sur tous les morceaux (agrégé + score par morceau dans le temps), résumé map-reduce.
+    Pipelines chargés une fois. backend : "torch" | "int8" | "onnx" | "onnx-int8".
+    """
+
+    def __init__(self, backend="torch", batch_size=8, sent_tokens=256, sum_tokens=900):
+        self.backend, self.batch_size = backend, batch_size
+        self.sent_pipe = _pipeline("sentiment-analysis", SENT_MODEL, backend)
+        self.sum_pipe = _pipeline("summarization", SUM_MODEL, backend)
+        self.sent_tokens, self.sum_tokens = sent_tokens, sum_tokens
+
+    def chunks(self, text, tokenizer, max_tokens):
+        """Morceaux [(début_car, texte)] de <= max_tokens, coupés aux fins de phrase (phrases trop longues : aux mots)."""
+        sents = [(m.start(), m.group()) for m in SENTENCE_RE.finditer(text) if m.group().strip()]
+        if not sents:
+            return []
+        lengths = [len(ids) for ids in tokenizer([s for _, s in sents], add_special_tokens=False)["input_ids"]]
+        pieces = []
+        for (start, sent), n in zip(sents, lengths):
+            if n <= max_tokens:
+                pieces.append((start, sent, n))
+                continue
+            words = sent.split(" ")
+            step = max(1, int(len(words) * max_tokens / n))
+            for i in range(0, len(words), step):
+                part = " ".join(words[i:i + step])
+                pieces.append((start + len(" ".join(words[:i])) + (1 if i else 0), part, max_tokens))
+
+        out, cur, cur_start, cur_n = [], [], None, 0
+        for start, part, n in pieces:
+            if cur and cur_n + n > max_tokens:
+                out.append((cur_start, "".join(cur).strip()))
+                cur, cur_n = [], 0
+            if not cur:
+                cur_start = start
+            cur.append(part if part.endswith((" ", "\n")) else part + " ")
+            cur_n += n
+        if cur:
+            out.append((cur_start, "".join(cur).strip()))
+        return out
+
+    def sentiment(self, text, segments=None):
+        chunks = self.chunks(text, self.sent_pipe.tokenizer, self.sent_tokens)
+        if not chunks:
+            return {}, []
+        scores = self.sent_pipe([c for _, c in chunks], batch_size=self.batch_size, truncation=True, top_k=None)
+        times = _chunk_times([s for s, _ in chunks], segments)
 
-    sentiment = sent_pipe(text[:2000])[0] if text else {}
-    summary = sum_pipe(text[:2500], max_length=120, min_length=50, do_sample=False)[0]["summary_text"] if text else ""
-    return {"sentiment": sentiment, "summary": summary}
+        agg, total = {}, 0.0
+        timeline = []
+        for (start, chunk), per_label, t in zip(chunks, scores, times):
+            w = float(len(chunk))  # pondération par longueur
+            total += w
+            for d in per_label:
+                agg[d["label"]] = agg.get(d["label"], 0.0) + w * d["score"]
+            best = max(per_label, key=lambda d: d["score"])
+            timeline.append({"t": t, "char": start, "label": best["label"], "score": round(float(best["score"]), 4)})
+        label = max(agg, key=agg.get)
+        return {"label": label, "score": round(agg[label] / total, 4)}, timeline
+
+    def summarize(self, text, max_length=120, min_length=50, max_chunks=None):
+        chunks = [c for _, c in self.chunks(text, self.sum_pipe.tokenizer, self.sum_tokens)]
+        if not chunks:
+            return ""
+        if max_chunks and len(chunks) > max_chunks:  # sous échéance : morceaux répartis sur tout l'entretien
+            chunks = [chunks[i * len(chunks) // max_chunks] for i in range(max_chunks)]
+        # map : un résumé par morceau (batch) ; reduce : résumé des résumés, récursif si encore trop long
+        while len(chunks) > 1:
+            partial = self.sum_pipe(chunks, batch_size=self.batch_size, truncation=True,
+                                    max_length=max_length, min_length=min(30, max_length // 2), do_sample=False)
+            joined = " ".join(p["summary_text"] for p in partial)
+            chunks = [c for _, c in self.chunks(joined, self.sum_pipe.tokenizer, self.sum_tokens)]
+        n_tokens = len(self.sum_pipe.tokenizer(chunks[0], add_special_tokens=False)["input_ids"])
+        return self.sum_pipe(chunks[0], truncation=True, max_length=max_length,
+                             min_length=min(min_length, max(5, n_tokens // 2)), do_sample=False)[0]["summary_text"]
+
+    def analyze(self, text, segments=None, summary_chunks=None):
+        if not text:
+            return {"sentiment": {}, "summary": ""}
+        sentiment, timeline = self.sentiment(text, segments)
+        out = {"sentiment": sentiment, "summary": self.summarize(text, max_chunks=summary_chunks),
+               "sentiment_timeline": timeline, "backend": self.backend}
+        if summary_chunks:
+            out["summary_chunks"] = summary_chunks
+        return out
+
+def _chunk_times(char_starts, segments):
+    """Temps (s) du début de chaque morceau, via les segments ASR (texte = segments joints par des espaces)."""
+    if not segments:
+        return [None] * len(char_starts)
+    offsets, pos = [], 0
+    for s in segments:
+        offsets.append(pos)
+        pos += len(s["text"]) + 1
+    return [segments[max(0, bisect.bisect_right(offsets, c) - 1)]["start"] for c in char_starts]
+
+def analyze(text, engine=None, segments=None, summary_chunks=None):
+    return (engine or TextEngine()).analyze(text, segments, summary_chunks)
+
+def analyze_text(text_path, backend="torch"):
+    text = open(text_path, "r", encoding="utf-8").read()
+    return TextEngine(backend).analyze(text)
 
 if __name__ == "__main__":
     p = sys.argv[1]
-    print(json.dumps(analyze_text(p), ensure_ascii=False))
+    backend = sys.argv[2] if len(sys.argv) > 2 else "torch"
+    print(json.dumps(analyze_text(p, backend), ensure_ascii=False))
@@ -0,0 +1,101 @@
+# scripts/timeline_store.py — timelines en colonnes typées (sidecar .npz), référencées par report.json
+import json, os
+import numpy as np
+
+SIDECAR = "timelines.npz"
+
+# types compacts par colonne (float32 par défaut) : probabilités/ratios en float16, étiquettes en uint8
+DTYPES = {
+    "t": np.float32,
+    "probs": np.float16, "label": np.uint8,
+    "coverage": np.float16, "eye_contact": np.float16, "head_yaw": np.float16, "gaze_yaw": np.float16,
+    "nods": np.uint8,
+    "wpm": np.float16, "speech_ratio": np.float16, "pitch_std_semitones": np.float16,
+}
+
+def split(result):
+    """(résultat sans "series", series) : les séries partent dans le sidecar, le report garde les agrégats."""
+    if not isinstance(result, dict) or "series" not in result:
+        return result, None
+    rest = {k: v for k, v in result.items() if k != "series"}
+    return rest, result["series"]
+
+def compact(series):
+    """{groupe: {colonne: valeur}} → tableaux typés ; scalaires (ex. window_sec) et None laissés de côté."""
+    out = {}
+    for group, cols in series.items():
+        if not cols:
+            continue
+        arrays = {}
+        for name, v in cols.items():
+            if v is None or np.isscalar(v):
+                continue
+            a = np.asarray(v)
+            arrays[name] = a.astype(DTYPES.get(name, np.float32)) if a.dtype.kind in "biuf" else a
+        out[group] = arrays
+    return out
+
+def save(path, series):
+    """
+    Écrit le sidecar .npz (clés "groupe/colonne", compressé) ; retourne la référence à mettre dans report.json :
+    fichier, colonnes (dtype, forme), nombre de points et métadonnées scalaires par groupe (ex. window_sec).
+    """
+    arrays = compact(series)
+    np.savez_compressed(path, **{f"{g}/{c}": a for g, cols in arrays.items() for c, a in cols.items()})
+    groups = {g: {**{k: v for k, v in series[g].items() if v is not None and np.isscalar(v)},
+                  "n": int(len(cols["t"])) if "t" in cols else None}
+              for g, cols in arrays.items()}
+    return {
+        "file": os.path.basename(path), "format": "npz",
+        "columns": {f"{g}/{c}": [str(a.dtype), list(a.shape)] for g, cols in arrays.items() for c, a in cols.items()},
+        "groups": groups,
+    }
+
+def load(path):
+    """Sidecar → {groupe: {colonne: np.ndarray}} (chargement paresseux des colonnes par NumPy)."""
+    out = {}
+    with np.load(path) as z:
+        for key in z.files:
+            group, col = key.split("/", 1)
+            out.setdefault(group, {})[col] = z[key]
+    return out
+
+def load_report(report_path):
+    """(report, timelines) : report.json et les séries de son sidecar (None s'il n'en a pas)."""
+    with open(report_path, encoding="utf-8") as f:
+        report = json.load(f)
+    ref = report.get("timelines")
+    if not ref or ref.get("format") != "npz":
+        return report, None
+    return report, load(os.path.join(os.path.dirname(report_path), ref["file"]))
+
+def to_lists(series, since=None, decimals=3):
+    """Séries en listes JSON (rapports partiels, mode inline) ; `since` : seulement les points t > since."""
+    out = {}
+    for group, cols in compact(series).items():
+        t = cols.get("t")
+        keep = (t > since) if since is not None and t is not None else slice(None)
+        out[group] = {}
+        for c, a in cols.items():
+            if t is not None and len(a) == len(t):  # colonnes par point (pas les constantes, ex. classes)
+                a = a[keep]
+            out[group][c] = np.round(a.astype(np.float64), decimals).tolist() if a.dtype.kind == "f" else a.tolist()
+    return out
+
+def emotion_records(series, max_n=None):
+    """Ancienne timeline JSON [{"t", "emotion", "prob"}] (mode inline), bornée à `max_n` points."""
+    t, probs, labels, classes = series["t"], series["probs"], series["label"], series["classes"]
+    n = min(len(t), max_n) if max_n else len(t)
+    return [{"t": round(float(t[i]), 2), "emotion": str(classes[labels[i]]), "prob": round(float(probs[i, labels[i]]), 4)}
+            for i in range(n)]
+
+GAZE_COLUMNS = ("coverage", "eye_contact", "head_yaw", "gaze_yaw", "nods")
+
+def gaze_records(series, max_n=None):
+    """Timeline regard JSON par seconde (mode inline), bornée à `max_n` points ; null là où aucun visage n'a été vu."""
+    t = series["t"]
+    n = min(len(t), max_n) if max_n else len(t)
+    cols = [(c, np.asarray(series[c], dtype=np.float64)) for c in GAZE_COLUMNS if series.get(c) is not None]
+    return [{"t": round(float(t[i]), 2), **{c: None if np.isnan(a[i]) else (int(a[i]) if c == "nods" else round(float(a[i]), 3))
+                                            for c, a in cols}}
+            for i in range(n)]
@@ -0,0 +1,110 @@
+# scripts/tracking.py — détection visage toutes les K frames, suivi léger entre deux
+import cv2
+from frames import Box
+
+def expand_box(box, scale):
+    """Boîte relative agrandie autour de son centre, bornée à l'image."""
+    cx, cy = box.xmin + box.width / 2, box.ymin + box.height / 2
+    w, h = box.width * scale, box.height * scale
+    x0, y0 = max(0.0, cx - w / 2), max(0.0, cy - h / 2)
+    return Box(x0, y0, min(1.0, cx + w / 2) - x0, min(1.0, cy + h / 2) - y0)
+
+def clip_box(xmin, ymin, width, height):
+    """Boîte relative coupée aux bords de l'image (les deux coins), None s'il ne reste aucune surface."""
+    x0, y0 = max(0.0, xmin), max(0.0, ymin)
+    x1, y1 = min(1.0, xmin + width), min(1.0, ymin + height)
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return Box(x0, y0, x1 - x0, y1 - y0)
+
+def box_pixels(box, W, H):
+    x0, y0 = int(box.xmin * W), int(box.ymin * H)
+    return x0, y0, max(x0 + 1, int((box.xmin + box.width) * W)), max(y0 + 1, int((box.ymin + box.height) * H))
+
+class FaceTracker:
+    """
+    Detect-then-track : FaceDetection MediaPipe (sur une image réduite à `detect_width`) toutes les
+    `redetect_every` mises à jour, ou dès que le suivi décroche ; entre deux, la boîte est propagée par
+    template matching (niveaux de gris, fenêtre de recherche `search_scale` × boîte).
+    Si un analyseur a publié une boîte issue des landmarks (frame.shared["landmark_box"]), elle sert
+    de nouvelle référence (ROI landmarks), sans repousser la prochaine détection complète.
+    """
+
+    def __init__(self, detector, redetect_every=10, min_score=0.6, search_scale=1.6,
+                 template_width=48, detect_width=320, max_gap_sec=1.0):
+        self.detector = detector
+        self.redetect_every, self.min_score = redetect_every, min_score
+        self.search_scale, self.template_width = search_scale, template_width
+        self.detect_width, self.max_gap_sec = detect_width, max_gap_sec
+        self.box = self._tmpl = self._last = None
+        self._since = 0
+        self.detections = self.tracked = self.lost = 0
+
+    def _detect(self, frame):
+        rgb = frame.rgb
+        if self.detect_width and rgb.shape[1] > self.detect_width:
+            h = int(rgb.shape[0] * self.detect_width / rgb.shape[1])
+            rgb = cv2.resize(rgb, (self.detect_width, h), interpolation=cv2.INTER_AREA)
+        self.detections += 1
+        result = self.detector.process(rgb)
+        if not result.detections:
+            return None
+        r = result.detections[0].location_data.relative_bounding_box
+        return clip_box(r.xmin, r.ymin, r.width, r.height)
+
+    def _scale(self, box, W):
+        return self.template_width / max(1.0, box.width * W)
+
+    def _seed(self, frame, box, detected=True):
+        H, W = frame.bgr.shape[:2]
+        s = self._scale(box, W)
+        x0, y0, x1, y1 = box_pixels(box, W, H)
+        gray = cv2.cvtColor(frame.bgr[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+        self._tmpl = cv2.resize(gray, None, fx=s, fy=s, interpolation=cv2.INTER_AREA)
+        self.box = box
+        if detected:  # compteur remis à zéro par une vraie détection seulement
+            self._since = 0
+
+    def _track(self, frame):
+        H, W = frame.bgr.shape[:2]
+        s = self._scale(self.box, W)
+        area = expand_box(self.box, self.search_scale)
+        x0, y0, x1, y1 = box_pixels(area, W, H)
+        gray = cv2.cvtColor(frame.bgr[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+        region = cv2.resize(gray, None, fx=s, fy=s, interpolation=cv2.INTER_AREA)
+        th, tw = self._tmpl.shape[:2]
+        if region.shape[0] < th or region.shape[1] < tw:
+            return None
+        res = cv2.matchTemplate(region, self._tmpl, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (mx, my) = cv2.minMaxLoc(res)
+        if score < self.min_score:
+            return None
+        return Box((x0 + mx / s) / W, (y0 + my / s) / H, self.box.width, self.box.height)
+
+    def update(self, frame):
+        """Boîte visage relative de `frame` (ou None)."""
+        last, self._last = self._last, frame
+        if last is not None and last.shared.get("landmark_box") is not None and last.t >= frame.t - self.max_gap_sec:
+            self._seed(last, last.shared["landmark_box"], detected=False)
+
+        box = None
+        stale = last is None or frame.t - last.t > self.max_gap_sec
+        if self.box is not None and not stale and self._since < self.redetect_every:
+            box = self._track(frame)
+            if box is None:
+                self.lost += 1
+        if box is None:
+            box = self._detect(frame)
+            if box is None:
+                self.box = None
+                return None
+            self._seed(frame, box)
+        else:
+            self.box = box
+            self._since += 1
+            self.tracked += 1
+        return box
+
+    def stats(self):
+        return {"redetect_every": self.redetect_every, "detections": self.detections,
+                "tracked": self.tracked, "lost": self.lost}
@@ -1,34 +1,122 @@
 import argparse, json, os
+from concurrent.futures import ThreadPoolExecutor
 from faster_whisper import WhisperModel
+from model_registry import DEFAULT_WHISPER, WHISPER_REPOS, resolve, whisper_name
 
-def transcribe(audio_path, out_txt, model_id="Systran/faster-whisper-base",
-               device="cpu", compute="int8", beam=1, lang=None, vad=True):
-    os.makedirs(os.path.dirname(out_txt) or ".", exist_ok=True)
+SR = 16000  # faster-whisper attend du PCM mono 16 kHz
 
+def load_model(model_id=DEFAULT_WHISPER, device="cpu", compute="int8", cpu_threads=0, num_workers=1):
     # Modèle optimisé CPU (INT8) — très bon compromis vitesse/qualité
-    model = WhisperModel(model_id, device=device, compute_type=compute)
+    # model_id : taille (tiny … large-v3), dépôt HF ou dossier ; résolu en dossier local par le registre
+    # cpu_threads=0 : défaut CTranslate2 (OMP_NUM_THREADS) ; >0 : budget explicite (par worker)
+    # num_workers>1 : autant d'appels transcribe() simultanés possibles depuis des threads Python
+    return WhisperModel(resolve(whisper_name(model_id)), device=device, compute_type=compute, cpu_threads=cpu_threads,
+                        num_workers=num_workers)
+
+def _segment_dict(s, offset=0.0):
+    return {
+        "start": round(s.start + offset, 2),
+        "end": round(s.end + offset, 2),
+        "text": s.text.strip(),
+        "avg_logprob": round(s.avg_logprob, 4),
+        "no_speech_prob": round(s.no_speech_prob, 4),
+        "words": [{"start": round(w.start + offset, 2), "end": round(w.end + offset, 2),
+                   "word": w.word.strip(), "prob": round(w.probability, 3)} for w in (s.words or [])],
+    }
 
+def _run(model, audio, beam, lang, vad, word_timestamps, offset=0.0):
     segments, info = model.transcribe(
-        audio_path,
+        audio,
         language=lang,                    # None = auto
         beam_size=beam,                   # 1 pour vitesse max, >1 pour qualité
         vad_filter=vad,
         vad_parameters={"min_silence_duration_ms": 500},
+        word_timestamps=word_timestamps,
     )
+    return [_segment_dict(s, offset) for s in segments], info  # consomme le générateur ici (dans le thread)
 
-    text = "".join(s.text.strip() + " " for s in segments).strip()
-    with open(out_txt, "w", encoding="utf-8") as f:
-        f.write(text)
+def split_on_silences(audio, sr=SR, chunk_sec=30.0, max_sec=60.0, min_silence_ms=500):
+    """
+    Découpe `audio` (np.ndarray) en morceaux d'environ `chunk_sec`, coupés au milieu des silences détectés
+    par le VAD Silero de faster-whisper ; un tour de parole plus long que `max_sec` est coupé net.
+    Retourne [(début, fin)] en échantillons, couvrant tout le signal.
+    """
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+    speech = get_speech_timestamps(audio, VadOptions(min_silence_duration_ms=min_silence_ms))
+    n, target, hard = len(audio), int(chunk_sec * sr), int(max_sec * sr)
 
-    # Retour d’info utile (STDOUT) si tu veux logger
-    meta = {
-        "language": info.language,
-        "duration": info.duration,
-        "model": model_id,
-        "compute": compute,
+    cuts = [0]
+    for prev, nxt in zip(speech, speech[1:]):
+        cut = (prev["end"] + nxt["start"]) // 2
+        while cut - cuts[-1] > hard:
+            cuts.append(cuts[-1] + hard)
+        if cut - cuts[-1] >= target:
+            cuts.append(cut)
+    while n - cuts[-1] > hard:
+        cuts.append(cuts[-1] + hard)
+    cuts.append(n)
+    return [(a, b) for a, b in zip(cuts, cuts[1:]) if b > a]
+
+def detect_language(model, audio):
+    """Langue de `audio` (~30 s) : transcribe() la détecte avant tout décodage, les segments (générateur) ne sont pas lus."""
+    _, info = model.transcribe(audio[:30 * SR], beam_size=1, vad_filter=False)
+    return info.language
+
+def transcribe_audio(model, audio, beam=1, lang=None, vad=True, word_timestamps=True, workers=1, chunk_sec=30.0,
+                     offset=0.0):
+    """
+    Transcrit `audio` (chemin ou buffer float32 16 kHz) avec un WhisperModel déjà chargé.
+    workers>1 (buffer uniquement) : découpe aux silences et transcrit les morceaux en parallèle
+    (modèle chargé avec num_workers>=workers) ; horodatages segments/mots recalés sur le signal complet.
+    offset : position (s) de `audio` dans l'enregistrement (morceaux d'un flux).
+    """
+    chunks = None
+    if workers > 1 and not isinstance(audio, str) and len(audio) > 2 * chunk_sec * SR:
+        chunks = split_on_silences(audio, SR, chunk_sec)
+
+    if not chunks or len(chunks) == 1:
+        segments, info = _run(model, audio, beam, lang, vad, word_timestamps, offset=offset)
+        language, duration, n_chunks = info.language, info.duration, 1
+    else:
+        # langue fixée d'avance pour tous les morceaux (détection cohérente), puis tous en parallèle
+        language = lang or detect_language(model, audio[chunks[0][0]:chunks[0][1]])
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            parts = pool.map(lambda c: _run(model, audio[c[0]:c[1]], beam, language, vad, word_timestamps,
+                                            offset=offset + c[0] / SR)[0], chunks)
+            segments = [s for part in parts for s in part]
+        duration, n_chunks = len(audio) / SR, len(chunks)
+
+    text = " ".join(s["text"] for s in segments).strip()
+    total = sum(s["end"] - s["start"] for s in segments)
+    avg_logprob = (sum(s["avg_logprob"] * (s["end"] - s["start"]) for s in segments) / total) if total > 0 else None
+    return {
+        "text": text,
+        "language": language,
+        "duration": duration,
+        "avg_logprob": round(avg_logprob, 4) if avg_logprob is not None else None,
+        "segments": segments,
+        "chunks": n_chunks,
         "beam": beam,
         "vad": vad
     }
+
+def transcribe(audio_path, out_txt, model_id=DEFAULT_WHISPER,
+               device="cpu", compute="int8", beam=1, lang=None, vad=True, model=None, out_json=None):
+    os.makedirs(os.path.dirname(out_txt) or ".", exist_ok=True)
+
+    if model is None:
+        model = load_model(model_id, device, compute)
+    res = transcribe_audio(model, audio_path, beam=beam, lang=lang, vad=vad)
+
+    with open(out_txt, "w", encoding="utf-8") as f:
+        f.write(res["text"])
+    if out_json:
+        with open(out_json, "w", encoding="utf-8") as f:
+            json.dump(res, f, ensure_ascii=False, indent=2)
+
+    # Retour d’info utile (STDOUT) si tu veux logger
+    meta = {k: v for k, v in res.items() if k not in ("text", "segments")}
+    meta.update({"model": model_id, "compute": compute})
     print(json.dumps(meta, ensure_ascii=False))
     return out_txt
 
@@ -36,7 +124,8 @@ if __name__ == "__main__":
     ap = argparse.ArgumentParser()
     ap.add_argument("audio", help="Chemin WAV/MP3/M4A…")
     ap.add_argument("out_txt", help="Chemin du transcript .txt")
-    ap.add_argument("--model", default="Systran/faster-whisper-base")
+    ap.add_argument("--json", default=None, help="transcript structuré (segments, mots, avg_logprob)")
+    ap.add_argument("--model", default=DEFAULT_WHISPER, help=f"{' | '.join(WHISPER_REPOS)}, dépôt HF ou dossier")
     ap.add_argument("--device", default="cpu", choices=["cpu","cuda","auto"])
     ap.add_argument("--compute", default="int8", help="int8 | int8_float16 | float16 | float32")
     ap.add_argument("--beam", type=int, default=1)
@@ -51,5 +140,6 @@ if __name__ == "__main__":
         compute=args.compute,
         beam=args.beam,
         lang=args.lang,
-        vad=(not args.no_vad)
+        vad=(not args.no_vad),
+        out_json=args.json
     )
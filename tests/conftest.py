@@ -0,0 +1,4 @@
+# tests/conftest.py — les modules de scripts/ s'importent par leur nom (comme entre eux)
+import os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
@@ -0,0 +1,36 @@
+import json, os, multiprocessing
+
+from cache import StageCache
+
+def _hash_many(root, folder, w, n=100):
+    c = StageCache(root)
+    for i in range(n):
+        p = os.path.join(folder, f"{w}-{i}.bin")
+        with open(p, "wb") as f:
+            f.write(b"x" * 10)
+        c.file_hash(p)
+
+def test_file_hash_memo_survives_concurrent_workers(tmp_path):
+    root = str(tmp_path / "cache")
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_hash_many, args=(root, str(tmp_path), w)) for w in range(6)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    assert [p.exitcode for p in procs] == [0] * 6
+    assert os.listdir(root) == ["file_hashes.json"]
+
+def test_file_hash_memo_drops_stale_entries(tmp_path):
+    c = StageCache(str(tmp_path / "cache"))
+    gone, changed, kept = (tmp_path / n for n in ("gone.bin", "changed.bin", "kept.bin"))
+    for p in (gone, changed, kept):
+        p.write_bytes(b"a")
+        c.file_hash(str(p))
+    gone.unlink()
+    changed.write_bytes(b"bb")
+    c.file_hash(str(changed))
+    with open(c._hashes_path, encoding="utf-8") as f:
+        memo = json.load(f)
+    assert sorted(k.rsplit("|", 2)[0] for k in memo) == sorted([str(changed), str(kept)])
+    assert c.file_hash(str(changed)) == memo[next(k for k in memo if k.startswith(str(changed)))]
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("scipy")
+from gaze_nods import detect_nods
+
+NODS = (3, 6, 16, 20)  # instants (s) des 4 hochements synthétiques
+
+def _pitch(hz, posture_step=0.0, jitter=0.0, seed=0):
+    """24 s de pitch : dérive lente, tête baissée (lecture de notes) de 8,5 à 13 s, 4 hochements de 0,06."""
+    t = np.arange(0, 24, 1.0 / hz)
+    pitch = 0.45 + 0.01 * np.sin(2 * np.pi * t / 9) + posture_step * ((t >= 8.5) & (t < 13))
+    for c in NODS:
+        pitch += 0.06 * np.exp(-0.5 * ((t - c) / 0.15) ** 2)
+    if jitter:
+        pitch += np.random.default_rng(seed).normal(0, jitter, len(t))
+    return t, pitch
+
+@pytest.mark.parametrize("hz", [5.0, 10.0, 30.0])
+@pytest.mark.parametrize("jitter", [0.0, 0.002])
+@pytest.mark.parametrize("posture_step", [0.0, 0.08])
+def test_detect_nods_counts_each_nod_once(hz, jitter, posture_step):
+    t, pitch = _pitch(hz, posture_step, jitter)
+    nods, _ = detect_nods(pitch, np.ones(len(t), bool), hz)
+    assert len(nods) == len(NODS)
+    assert np.allclose(t[nods], NODS, atol=0.25)
+
+def test_detect_nods_ignores_invalid_samples():
+    hz = 10.0
+    t, pitch = _pitch(hz)
+    valid = np.ones(len(t), bool)
+    valid[(t > 15) & (t < 17)] = False  # visage perdu autour du 3e hochement
+    nods, _ = detect_nods(pitch, valid, hz)
+    assert np.allclose(t[nods], [3, 6, 20], atol=0.25)
@@ -0,0 +1,56 @@
+import os, shutil
+import numpy as np
+import pytest
+
+onnx = pytest.importorskip("onnx")
+ort = pytest.importorskip("onnxruntime")
+from onnx import TensorProto, helper, numpy_helper
+
+import model_registry
+
+FERPLUS_FILE = model_registry.CATALOG["ferplus"]["file"]
+
+def _ferplus_like(path):
+    """Graphe construit comme l'export CNTK de FER+ : batch 1 en entrée/sortie et Reshape interne [1, -1]."""
+    rng = np.random.default_rng(0)
+    inits = [numpy_helper.from_array(rng.normal(0, 0.1, (4, 1, 4, 4)).astype(np.float32), "W0"),
+             numpy_helper.from_array(np.array([1, -1], np.int64), "flat_shape"),
+             numpy_helper.from_array(rng.normal(0, 0.1, (1024, 8)).astype(np.float32), "W1"),
+             numpy_helper.from_array(rng.normal(0, 0.1, (8,)).astype(np.float32), "B1"),
+             numpy_helper.from_array(np.array([1, 8], np.int64), "bias_shape")]
+    nodes = [helper.make_node("Conv", ["Input3", "W0"], ["conv"], strides=[4, 4]),
+             helper.make_node("Reshape", ["conv", "flat_shape"], ["flat"]),
+             helper.make_node("MatMul", ["flat", "W1"], ["times"]),
+             helper.make_node("Reshape", ["B1", "bias_shape"], ["bias"]),  # Reshape de poids : laissé tel quel
+             helper.make_node("Add", ["times", "bias"], ["Plus692_Output_0"])]
+    graph = helper.make_graph(nodes, "ferplus-like",
+                              [helper.make_tensor_value_info("Input3", TensorProto.FLOAT, [1, 1, 64, 64])],
+                              [helper.make_tensor_value_info("Plus692_Output_0", TensorProto.FLOAT, [1, 8])], inits)
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 8)])
+    model.ir_version = 8
+    onnx.save(model, path)
+
+def _sources():
+    yield "synthetic"
+    if os.path.exists(os.path.join(model_registry.MODELS_DIR, FERPLUS_FILE)):
+        yield "published"
+
+@pytest.fixture(params=list(_sources()))
+def models_root(request, tmp_path):
+    # fichier posé à la main dans models/ : pas de téléchargement, seule la dérivation est exercée
+    raw = tmp_path / FERPLUS_FILE
+    if request.param == "synthetic":
+        _ferplus_like(str(raw))
+    else:
+        shutil.copyfile(os.path.join(model_registry.MODELS_DIR, FERPLUS_FILE), raw)
+    return str(tmp_path)
+
+@pytest.mark.parametrize("name", ["ferplus", "ferplus-int8"])
+def test_ferplus_runs_a_batch_in_one_call(models_root, name):
+    path = model_registry.resolve(name, models_root)
+    assert os.path.basename(path) == model_registry.CATALOG[name]["path"]
+    sess = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+    inp = sess.get_inputs()[0]
+    assert not isinstance(inp.shape[0], int)
+    out = sess.run(None, {inp.name: np.random.default_rng(1).random((4, 1, 64, 64), dtype=np.float32)})[0]
+    assert out.shape == (4, 8)
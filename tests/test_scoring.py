@@ -0,0 +1,23 @@
+import json
+
+import scoring
+
+REPORT = {
+    "transcript": "mot " * 200,
+    "speech": {"duration_sec": 300, "wpm": 130, "silence_sec": 40, "fillers": 10},
+    "nonverbal": {"eye_contact_ratio": 0.6, "nods": 12},
+    "text": {"summary": "x" * 200, "sentiment": {"label": "positive", "score": 0.8}},
+}
+
+def test_compute_scores_keeps_scripts_v1_default():
+    assert scoring.compute_scores(REPORT)["profile"] == "scripts-v1@1"
+
+def test_rescore_writes_the_pipeline_schema(tmp_path):
+    expected = scoring.compute_scores(REPORT, "pipeline-v1")
+    for cand in ("poste/c1", "poste/c2"):
+        (tmp_path / cand).mkdir(parents=True)
+        (tmp_path / cand / "report.json").write_text(json.dumps({**REPORT, "scores": {"total": 0}}), encoding="utf-8")
+    scoring.rescore(str(tmp_path), "pipeline-v1", write=True, cohort="1")
+    for cand in ("poste/c1", "poste/c2"):
+        written = json.loads((tmp_path / cand / "report.json").read_text(encoding="utf-8"))["scores"]
+        assert written == expected
@@ -0,0 +1,21 @@
+import json
+import numpy as np
+
+import timeline_store
+
+def _gaze_series():
+    t = np.arange(5, dtype=np.float32)
+    nan = np.nan
+    return {"t": t, "coverage": np.array([1, 1, 0.5, 0, 1.0]), "eye_contact": np.array([1, 0, 0.5, nan, 1]),
+            "head_yaw": np.array([2.0, 3, 4, nan, 5]), "gaze_yaw": np.array([1.0, 2, 3, nan, 4]),
+            "nods": np.array([1, 0, 0, 0, 2], np.uint8)}
+
+def test_gaze_records_are_json_and_capped():
+    records = timeline_store.gaze_records(_gaze_series(), max_n=4)
+    assert len(records) == 4
+    assert records[0] == {"t": 0.0, "coverage": 1.0, "eye_contact": 1.0, "head_yaw": 2.0, "gaze_yaw": 1.0, "nods": 1}
+    assert records[3]["eye_contact"] is None and records[3]["coverage"] == 0.0
+    json.dumps(records, allow_nan=False)
+
+def test_gaze_records_uncapped():
+    assert [r["nods"] for r in timeline_store.gaze_records(_gaze_series())] == [1, 0, 0, 0, 2]
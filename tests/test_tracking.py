@@ -0,0 +1,39 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from frames import Box, Frame
+from tracking import FaceTracker, clip_box
+
+class _Detector:
+    """FaceDetection factice : renvoie toujours la même boîte relative (ou aucune)."""
+
+    def __init__(self, box):
+        self.box = box
+
+    def process(self, rgb):
+        if self.box is None:
+            return SimpleNamespace(detections=[])
+        r = SimpleNamespace(xmin=self.box[0], ymin=self.box[1], width=self.box[2], height=self.box[3])
+        return SimpleNamespace(detections=[SimpleNamespace(location_data=SimpleNamespace(relative_bounding_box=r))])
+
+def _frame():
+    return Frame(0, 0.0, np.full((120, 160, 3), 128, np.uint8))
+
+@pytest.mark.parametrize("raw, expected", [
+    ((-0.1, 0.2, 0.3, 0.3), (0.0, 0.2, 0.2, 0.3)),   # déborde à gauche : bord droit inchangé
+    ((0.8, -0.2, 0.3, 0.4), (0.8, 0.0, 0.2, 0.2)),   # déborde en haut et à droite
+    ((0.1, 0.1, 0.5, 0.5), (0.1, 0.1, 0.5, 0.5)),
+])
+def test_detection_is_clipped_on_both_corners(raw, expected):
+    box = FaceTracker(_Detector(raw), detect_width=None).update(_frame())
+    assert np.allclose(box, expected)
+
+@pytest.mark.parametrize("raw", [(-0.5, 0.1, 0.4, 0.3), (1.1, 0.1, 0.2, 0.2), None])
+def test_detection_without_area_is_no_face(raw):
+    tracker = FaceTracker(_Detector(raw), detect_width=None)
+    assert tracker.update(_frame()) is None and tracker.box is None
+
+def test_clip_box_keeps_inner_boxes():
+    assert np.allclose(clip_box(0.2, 0.3, 0.4, 0.5), Box(0.2, 0.3, 0.4, 0.5))